@@ -1,7 +1,8 @@
 import sqlite3
 import os
 import time
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, Tuple, Iterable, Iterator
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,6 +13,9 @@ class BotDatabase:
             # Store database in the same directory as the bot
             db_path = os.path.join(os.path.dirname(__file__), "bot_data.db")
         self.db_path = db_path
+        # Per-slot solver counts: (date, time_slot) -> (count, last_seen_id)
+        self._solver_counts: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._solver_counts_lock = threading.Lock()
         self.init_database()
     
     def init_database(self):
@@ -181,6 +185,52 @@ class BotDatabase:
                 ON feed_events(created_at DESC)
             """)
             
+            # Active-user filter index (activity counts, iter_users(active_since=...))
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_last_activity
+                ON users(last_activity, user_id)
+            """)
+            
+            # Daily game solve indexes: slot lookups, one solve per user per slot,
+            # and at most one first solver per slot
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_daily_game_solves_slot
+                ON daily_game_solves(date, time_slot)
+            """)
+            has_unique_indexes = conn.execute("""
+                SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'
+                AND name IN ('idx_daily_game_solves_user_slot', 'idx_daily_game_solves_first')
+            """).fetchone()[0] == 2
+            if not has_unique_indexes:
+                # Solves recorded before the indexes existed may repeat: keep the earliest
+                # solve per user and slot, and the earliest first solver per slot
+                cursor = conn.execute("""
+                    DELETE FROM daily_game_solves
+                    WHERE user_id IS NOT NULL AND id NOT IN (
+                        SELECT MIN(id) FROM daily_game_solves
+                        WHERE user_id IS NOT NULL GROUP BY date, time_slot, user_id
+                    )
+                """)
+                if cursor.rowcount:
+                    logger.warning(f"Removed {cursor.rowcount} duplicate daily game solves")
+                cursor = conn.execute("""
+                    UPDATE daily_game_solves SET is_first_solver = 0
+                    WHERE is_first_solver = 1 AND id NOT IN (
+                        SELECT MIN(id) FROM daily_game_solves
+                        WHERE is_first_solver = 1 GROUP BY date, time_slot
+                    )
+                """)
+                if cursor.rowcount:
+                    logger.warning(f"Cleared {cursor.rowcount} duplicate first-solver flags")
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_game_solves_user_slot
+                ON daily_game_solves(date, time_slot, user_id)
+            """)
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_game_solves_first
+                ON daily_game_solves(date, time_slot) WHERE is_first_solver = 1
+            """)
+            
             conn.commit()
             logger.info("Database initialized successfully")
     
@@ -435,15 +485,76 @@ class BotDatabase:
     # Daily Game Methods
     # ========================================
     
+    def _count_slot_solvers(self, conn, date: str, time_slot: str) -> int:
+        """Return the solver count for a slot, reading only rows added since the last call.
+        
+        Solve ids are monotonic, so the cached (count, last_seen_id) pair is advanced by
+        counting rows with a larger id. This stays correct when other processes (the
+        Next.js API) insert solves, and costs one index probe during the release burst.
+        """
+        key = (date, time_slot)
+        with self._solver_counts_lock:
+            count, last_id = self._solver_counts.get(key, (0, 0))
+        cursor = conn.execute("""
+            SELECT COUNT(*), COALESCE(MAX(id), ?) FROM daily_game_solves 
+            WHERE date = ? AND time_slot = ? AND id > ?
+        """, (last_id, date, time_slot, last_id))
+        new_rows, max_id = cursor.fetchone()
+        with self._solver_counts_lock:
+            if max_id >= self._solver_counts.get(key, (0, 0))[1]:
+                self._solver_counts[key] = (count + new_rows, max_id)
+        return count + new_rows
+    
     def get_daily_game_solvers(self, date, time_slot):
         """Get count of solvers for a specific daily game question"""
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT COUNT(*) FROM daily_game_solves 
-                WHERE date = ? AND time_slot = ?
-            """, (str(date), time_slot))
-            return cursor.fetchone()[0]
+            return self._count_slot_solvers(conn, str(date), time_slot)
+    
+    def solve_daily_question(self, user_id: int, date, time_slot: str, answer: str) -> Tuple[bool, bool, int, int]:
+        """Atomically record a correct daily game answer.
+        
+        Returns (already_solved, is_first, rank, total_solvers). The whole check-and-insert
+        runs in one IMMEDIATE transaction, so concurrent solvers are serialized and only one
+        of them can be marked first; the unique indexes back this up across processes.
+        """
+        date = str(date)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.execute("""
+                    SELECT id, is_first_solver FROM daily_game_solves 
+                    WHERE user_id = ? AND date = ? AND time_slot = ?
+                """, (user_id, date, time_slot))
+                existing = cursor.fetchone()
+                
+                if existing:
+                    solve_id, is_first = existing
+                    cursor = conn.execute("""
+                        SELECT COUNT(*) FROM daily_game_solves 
+                        WHERE date = ? AND time_slot = ? AND id <= ?
+                    """, (date, time_slot, solve_id))
+                    rank = cursor.fetchone()[0]
+                    total_solvers = self._count_slot_solvers(conn, date, time_slot)
+                    conn.execute("COMMIT")
+                    return True, bool(is_first), rank, total_solvers
+                
+                rank = self._count_slot_solvers(conn, date, time_slot) + 1
+                is_first = rank == 1
+                conn.execute("""
+                    INSERT INTO daily_game_solves (user_id, date, time_slot, answer, is_first_solver, solved_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (user_id, date, time_slot, answer, is_first, time.time()))
+                total_solvers = self._count_slot_solvers(conn, date, time_slot)
+                conn.execute("COMMIT")
+                return False, is_first, rank, total_solvers
+            except Exception:
+                conn.execute("ROLLBACK")
+                with self._solver_counts_lock:
+                    self._solver_counts.pop((date, time_slot), None)
+                raise
+        finally:
+            conn.close()
     
     def check_user_solved_daily_question(self, user_id, date, time_slot):
         """Check if user already solved today's question"""
@@ -470,7 +581,7 @@ class BotDatabase:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO daily_game_solves (user_id, date, time_slot, answer, is_first_solver, solved_at)
+                INSERT OR IGNORE INTO daily_game_solves (user_id, date, time_slot, answer, is_first_solver, solved_at)
                 VALUES (?, ?, ?, ?, ?, ?)
             """, (user_id, str(date), time_slot, answer, is_first_solver, time.time()))
             conn.commit()
@@ -647,6 +758,66 @@ class BotDatabase:
             logger.error(f"Error getting feed events: {e}")
             return []
     
+    def iter_users(self, active_since: float = None, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Stream users ordered by user_id using keyset pagination.
+        
+        Each batch is a short query resuming after the last user_id seen, so no read
+        transaction is held open while the caller awaits between rows. user_id never
+        changes, so users who become active mid-iteration are neither skipped nor repeated.
+        """
+        last_user_id = 0
+        while True:
+            query = """
+                SELECT user_id, username, first_name, created_at, last_activity 
+                FROM users 
+                WHERE user_id > 0
+            """
+            params = []
+            if active_since is not None:
+                query += " AND last_activity > ?"
+                params.append(active_since)
+            query += " AND user_id > ? ORDER BY user_id LIMIT ?"
+            params.extend([last_user_id, batch_size])
+            
+            try:
+                with sqlite3.connect(self.db_path) as conn:
+                    conn.row_factory = sqlite3.Row
+                    rows = conn.execute(query, params).fetchall()
+            except Exception as e:
+                logger.error(f"Error iterating users: {e}")
+                return
+            
+            for row in rows:
+                yield dict(row)
+            if len(rows) < batch_size:
+                return
+            last_user_id = rows[-1]['user_id']
+    
+    def iter_active_users(self, days: int = 30, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Stream active users from the last N days"""
+        cutoff_time = time.time() - (days * 24 * 60 * 60)
+        return self.iter_users(active_since=cutoff_time, batch_size=batch_size)
+    
+    def count_users(self, days: int = None, user_ids: Iterable[int] = None) -> int:
+        """Count all users, or users active in the last N days, optionally only among user_ids"""
+        query = "SELECT COUNT(*) FROM users WHERE user_id > 0"
+        params = []
+        if days is not None:
+            query += " AND last_activity > ?"
+            params.append(time.time() - (days * 24 * 60 * 60))
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            if not user_ids:
+                return 0
+            query += f" AND user_id IN ({','.join('?' * len(user_ids))})"
+            params.extend(user_ids)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return conn.execute(query, params).fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error counting users: {e}")
+            return 0
+    
     def get_all_users(self) -> list:
         """Get all users for broadcasting"""
         try:
@@ -0,0 +1,301 @@
+"""
+Database Maintenance Module for CollectibleKIT Bot
+Keeps the shared bot_data.db healthy: refreshes planner statistics, reclaims free
+pages, checkpoints the WAL, runs quick integrity checks and reports table sizes.
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# auto_vacuum modes as reported by PRAGMA auto_vacuum
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+# wal_checkpoint modes; PASSIVE never blocks readers or writers, the others wait for them
+CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+
+
+class DatabaseMaintenance:
+    def __init__(self, db_path: str, vacuum_pages: int = 1000, busy_timeout: float = 30.0):
+        """
+        Initialize database maintenance
+
+        Args:
+            db_path: Path to the SQLite database file
+            vacuum_pages: Max free pages reclaimed per incremental_vacuum run
+            busy_timeout: Seconds to wait for locks held by the bot, API or trackers
+        """
+        self.db_path = db_path
+        self.vacuum_pages = vacuum_pages
+        self.busy_timeout = busy_timeout
+        self._maintenance_running = False
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+
+    def optimize(self, full_analyze: bool = False) -> None:
+        """Refresh query planner statistics (PRAGMA optimize, or a full ANALYZE)"""
+        conn = self._connect()
+        try:
+            if full_analyze:
+                conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+
+    def checkpoint(self, mode: str = "PASSIVE") -> Optional[Dict[str, int]]:
+        """
+        Checkpoint the WAL into the main file; returns None when not in WAL mode
+
+        Args:
+            mode: One of CHECKPOINT_MODES. The default PASSIVE copies what it can without
+                waiting on the live bot; TRUNCATE (offline use) also shrinks the WAL file.
+        """
+        mode = mode.upper()
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Unknown checkpoint mode: {mode}")
+        conn = self._connect()
+        try:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            if journal_mode.lower() != "wal":
+                return None
+            busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            return {'busy': busy, 'log_frames': log_frames, 'checkpointed_frames': checkpointed}
+        finally:
+            conn.close()
+
+    def incremental_vacuum(self, enable: bool = False) -> Dict[str, Any]:
+        """
+        Reclaim up to `vacuum_pages` free pages
+
+        Incremental vacuum only works once auto_vacuum is INCREMENTAL. Switching an
+        existing database needs one full VACUUM, which locks it for the duration, so
+        that only happens when `enable` is set.
+        """
+        conn = self._connect()
+        try:
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            freelist_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+            if mode != 2 and enable:
+                logger.info("Enabling incremental auto_vacuum (full VACUUM)...")
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+                mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            elif mode == 2 and freelist_before:
+                conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+
+            freelist_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            return {
+                'auto_vacuum': AUTO_VACUUM_MODES.get(mode, str(mode)),
+                'freelist_before': freelist_before,
+                'freelist_after': freelist_after,
+                'pages_reclaimed': max(freelist_before - freelist_after, 0)
+            }
+        finally:
+            conn.close()
+
+    def quick_check(self) -> List[str]:
+        """Run PRAGMA quick_check; returns an empty list when the database is healthy"""
+        conn = self._connect()
+        try:
+            rows = [row[0] for row in conn.execute("PRAGMA quick_check").fetchall()]
+            return [] if rows == ["ok"] else rows
+        finally:
+            conn.close()
+
+    def size_report(self) -> Dict[str, Any]:
+        """
+        Per-table size and fragmentation report
+
+        Uses the dbstat virtual table when SQLite is built with it; otherwise falls
+        back to row counts only.
+        """
+        conn = self._connect()
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+            tables: Dict[str, Dict[str, Any]] = {}
+            try:
+                cursor = conn.execute("""
+                    SELECT name, COUNT(*), SUM(pgsize), SUM(unused)
+                    FROM dbstat
+                    GROUP BY name
+                    ORDER BY SUM(pgsize) DESC
+                """)
+                for name, pages, size, unused in cursor.fetchall():
+                    tables[name] = {
+                        'pages': pages,
+                        'size_bytes': size or 0,
+                        'unused_bytes': unused or 0,
+                        'fragmentation': round((unused or 0) / size, 3) if size else 0.0
+                    }
+            except sqlite3.OperationalError:
+                logger.debug("dbstat not available, reporting row counts only")
+
+            cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+            for (name,) in cursor.fetchall():
+                rows = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+                tables.setdefault(name, {})['rows'] = rows
+
+            return {
+                'file_size_bytes': os.path.getsize(self.db_path),
+                'page_size': page_size,
+                'page_count': page_count,
+                'freelist_count': freelist_count,
+                'free_ratio': round(freelist_count / page_count, 3) if page_count else 0.0,
+                'tables': tables
+            }
+        finally:
+            conn.close()
+
+    def run(self, full_analyze: bool = False, enable_incremental_vacuum: bool = False,
+            checkpoint_mode: str = "PASSIVE") -> Dict[str, Any]:
+        """
+        Run one full maintenance pass and return its report
+
+        Each step is independent: a failure (e.g. a long-held lock) is logged in the
+        report and the remaining steps still run. Scheduled passes keep the PASSIVE
+        checkpoint; TRUNCATE is for offline runs.
+        """
+        report: Dict[str, Any] = {'started_at': datetime.now().isoformat(), 'errors': {}}
+        start = time.time()
+
+        if not os.path.exists(self.db_path):
+            report['errors']['database'] = f"Database file not found: {self.db_path}"
+            return report
+
+        steps = (
+            ('integrity', self.quick_check),
+            ('optimize', lambda: self.optimize(full_analyze)),
+            ('vacuum', lambda: self.incremental_vacuum(enable_incremental_vacuum)),
+            ('checkpoint', lambda: self.checkpoint(checkpoint_mode)),
+            ('size', self.size_report),
+        )
+        for name, step in steps:
+            try:
+                report[name] = step()
+            except Exception as e:
+                logger.error(f"Maintenance step '{name}' failed: {e}")
+                report['errors'][name] = str(e)
+
+        report['duration_seconds'] = round(time.time() - start, 2)
+        if report.get('integrity'):
+            logger.error(f"Database quick_check reported problems: {report['integrity'][:5]}")
+        logger.info(f"Database maintenance completed in {report['duration_seconds']}s")
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Any], max_tables: int = 10) -> str:
+        """Human-readable summary of a maintenance report"""
+        lines = [f"Database Maintenance ({report.get('started_at', '')})"]
+
+        integrity = report.get('integrity')
+        if integrity is not None:
+            lines.append("Integrity: ok" if not integrity else f"Integrity: {len(integrity)} problem(s)")
+
+        vacuum = report.get('vacuum')
+        if vacuum:
+            lines.append(
+                f"Vacuum ({vacuum['auto_vacuum']}): reclaimed {vacuum['pages_reclaimed']} pages, "
+                f"{vacuum['freelist_after']} free pages left"
+            )
+
+        checkpoint = report.get('checkpoint')
+        if checkpoint:
+            lines.append(f"WAL checkpoint: {checkpoint['checkpointed_frames']}/{checkpoint['log_frames']} frames")
+
+        size = report.get('size')
+        if size:
+            lines.append(
+                f"File size: {size['file_size_bytes']:,} bytes, "
+                f"free pages: {size['freelist_count']} ({size['free_ratio']:.1%})"
+            )
+            for name, info in list(size['tables'].items())[:max_tables]:
+                details = []
+                if 'rows' in info:
+                    details.append(f"{info['rows']:,} rows")
+                if 'size_bytes' in info:
+                    details.append(f"{info['size_bytes']:,} bytes, {info['fragmentation']:.1%} unused")
+                lines.append(f"  {name}: {', '.join(details)}")
+
+        for name, error in report.get('errors', {}).items():
+            lines.append(f"Error in {name}: {error}")
+
+        if 'duration_seconds' in report:
+            lines.append(f"Duration: {report['duration_seconds']}s")
+        return "\n".join(lines)
+
+    async def run_async(self, **kwargs) -> Dict[str, Any]:
+        """Run maintenance in a worker thread so the event loop keeps serving updates"""
+        return await asyncio.to_thread(self.run, **kwargs)
+
+    async def start_scheduled_maintenance(self, interval: int = 6 * 3600, full_analyze_every: int = 4):
+        """
+        Start the maintenance scheduler
+
+        Args:
+            interval: Seconds between maintenance passes (default: 6 hours)
+            full_analyze_every: Run a full ANALYZE on every Nth pass
+        """
+        if self._maintenance_running:
+            logger.warning("Maintenance scheduler already running")
+            return
+
+        self._maintenance_running = True
+        logger.info("Starting database maintenance scheduler...")
+
+        try:
+            passes = 0
+            while self._maintenance_running:
+                report = await self.run_async(full_analyze=(passes % full_analyze_every == 0))
+                logger.info(self.format_report(report))
+                passes += 1
+
+                await asyncio.sleep(interval)
+
+        except asyncio.CancelledError:
+            logger.info("Maintenance scheduler cancelled")
+        except Exception as e:
+            logger.error(f"Maintenance scheduler error: {e}")
+        finally:
+            self._maintenance_running = False
+
+    def stop_maintenance(self):
+        """Stop the maintenance scheduler"""
+        self._maintenance_running = False
+        logger.info("Maintenance scheduler stopped")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+        level=logging.INFO,
+    )
+
+    parser = argparse.ArgumentParser(description="Run database maintenance on bot_data.db")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(__file__), "bot_data.db"),
+                        help="Path to the SQLite database")
+    parser.add_argument("--analyze", action="store_true", help="Run a full ANALYZE")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Switch auto_vacuum to INCREMENTAL (runs one full VACUUM)")
+    parser.add_argument("--truncate-wal", action="store_true",
+                        help="TRUNCATE checkpoint: waits for readers and writers, then empties the WAL "
+                             "(run while the bot is stopped)")
+    args = parser.parse_args()
+
+    maintenance = DatabaseMaintenance(args.db)
+    print(DatabaseMaintenance.format_report(
+        maintenance.run(full_analyze=args.analyze, enable_incremental_vacuum=args.enable_incremental_vacuum,
+                        checkpoint_mode="TRUNCATE" if args.truncate_wal else "PASSIVE")
+    ))
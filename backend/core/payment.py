@@ -8,6 +8,7 @@ import logging
 
 import requests
 from .database import BotDatabase
+from utils import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -39,22 +40,22 @@ class PaymentManager:
         """Generate Tonkeeper payment link"""
         return f"https://app.tonkeeper.com/transfer/{recv_addr}?amount={amount_nano}&text={quote(memo)}"
     
-    def verify_payment(self, memo: str, recv_addr: str) -> bool:
+    async def verify_payment(self, memo: str, recv_addr: str) -> bool:
         """Verify payment by checking TON Center API"""
         payment = self.db.get_payment_by_memo(memo)
         if not payment or payment['status'] != 'pending':
             return False
         
         try:
-            response = requests.get(TONCENTER_URL, params={
+            response = await http_client.get(TONCENTER_URL, params={
                 'address': recv_addr,
                 'limit': 50,
                 'to_lt': 0,
-                'archival': True
+                'archival': 'true'
             }, timeout=10)
             
-            if response.status_code != 200:
-                logger.error(f"TON Center API error: {response.status_code}")
+            if response.status != 200:
+                logger.error(f"TON Center API error: {response.status}")
                 return False
             
             data = response.json()
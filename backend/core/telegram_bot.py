@@ -10,6 +10,7 @@ import logging
 import os
 import time
 import io
+import itertools
 from io import BytesIO
 from typing import List, Optional
 
@@ -20,8 +21,10 @@ from telegram.ext import Application, CommandHandler, MessageHandler, ContextTyp
 from .config import BOT_TOKEN
 from .processing import cut_into_4x3_and_prepare_story_pieces
 from .database import BotDatabase
+from .user_export import EXPORT_FORMATS, write_users_export
 from .payment import PaymentManager
 from .backup import DatabaseBackup
+from .db_maintenance import DatabaseMaintenance
 
 # Configure logging
 logging.basicConfig(
@@ -41,6 +44,9 @@ backup_system = DatabaseBackup(
     backup_chat_id=-4944651195
 )
 
+# Initialize database maintenance (ANALYZE, incremental vacuum, WAL checkpoints, integrity checks)
+maintenance_system = DatabaseMaintenance(db_path=db.db_path)
+
 # Constants
 FREE_LIMIT = 3
 WATERMARK_TEXT = "@CollectibleKITbot"
@@ -294,19 +300,16 @@ async def test_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         return
     
     # Get user counts
-    all_users = db.get_all_users()
-    active_users = db.get_active_users(30)
-    
     message = f"""
 📊 **Database User Test**
 
-**All Users:** {len(all_users)}
-**Active Users (30 days):** {len(active_users)}
+**All Users:** {db.count_users()}
+**Active Users (30 days):** {db.count_users(30)}
 
 **First 5 users:**
 """
     
-    for i, user in enumerate(all_users[:5]):
+    for i, user in enumerate(itertools.islice(db.iter_users(batch_size=5), 5)):
         message += f"{i+1}. ID: {user['user_id']}, Username: {user.get('username', 'None')}, Name: {user.get('first_name', 'None')}\n"
     
     await update.message.reply_text(message)
@@ -424,16 +427,12 @@ async def test_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Store test content
     context.user_data['broadcast_content'] = test_content
     
-    # Get users
-    users = db.get_all_users()
-    logger.info(f"Test broadcast: Found {len(users)} users")
-    
-    if not users:
+    # Test with first user only
+    test_user = next(db.iter_users(batch_size=1), None)
+    if not test_user:
         await update.message.reply_text("❌ No users found in database.")
         return
     
-    # Test with first user only
-    test_user = users[0]
     logger.info(f"Testing broadcast with user: {test_user}")
     
     try:
@@ -467,95 +466,69 @@ async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Record admin command
     db.record_interaction(user_id, "admin_command")
     
+    # Optional export format: /admin [sqlite|csv|ndjson]
+    export_format = context.args[0].lower() if context.args else "sqlite"
+    if export_format not in EXPORT_FORMATS:
+        await update.message.reply_text(f"❌ Unknown export format. Use one of: {', '.join(EXPORT_FORMATS)}")
+        return
+    
     try:
-        # Get all users for database display
-        all_users = db.get_all_users()
-        active_users = db.get_active_users(30)
-        
         # Create simple Mini App statistics
         stats_message = f"""Mini App Statistics:
 
-• Total Users: {len(all_users)}
-• Active Users (30 days): {len(active_users)}
-• VIP Users: {len([u for u in all_users if u['user_id'] in VIP_USERS])}"""
+• Total Users: {db.count_users()}
+• Active Users (30 days): {db.count_users(30)}
+• VIP Users: {db.count_users(user_ids=VIP_USERS)}"""
         
         # Send statistics summary
         await update.message.reply_text(stats_message, parse_mode="Markdown")
         
-        # Export users to SQLite file
-        await _export_users_to_sqlite(update, all_users)
+        # Export users to file
+        await _export_users(update, export_format)
         
     except Exception as e:
         logger.exception("Admin command error: %s", e)
         await update.message.reply_text("❌ Error generating admin report.")
 
 
-async def _export_users_to_sqlite(update: Update, users: list) -> None:
-    """Export users to a SQLite file and send it"""
+def _user_status(user: dict) -> str:
+    """Status label used in user exports"""
+    if user['user_id'] in VIP_USERS:
+        return "VIP"
+    if user.get('last_activity', 0) > (time.time() - 7 * 24 * 3600):
+        return "Active"
+    return "Inactive"
+
+
+async def _export_users(update: Update, export_format: str = "sqlite") -> None:
+    """Stream users into an export file (SQLite, CSV or NDJSON) and send it"""
+    import tempfile
+    
+    extension = {"sqlite": "db", "csv": "csv", "ndjson": "ndjson"}[export_format]
+    temp_path = None
     try:
-        import sqlite3
-        import tempfile
-        import os
-        
-        # Create temporary SQLite file
-        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_file:
-            temp_db_path = temp_file.name
+        with tempfile.NamedTemporaryFile(suffix=f'.{extension}', delete=False) as temp_file:
+            temp_path = temp_file.name
+        os.unlink(temp_path)  # SQLite export must create a fresh file
         
-        # Create new SQLite database with users
-        with sqlite3.connect(temp_db_path) as conn:
-            # Create users table
-            conn.execute("""
-                CREATE TABLE users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    last_name TEXT,
-                    created_at REAL,
-                    last_activity REAL,
-                    free_uses INTEGER DEFAULT 0,
-                    credits INTEGER DEFAULT 0,
-                    status TEXT
-                )
-            """)
-            
-            # Insert users data
-            for user in users:
-                # Determine status
-                if user['user_id'] in VIP_USERS:
-                    status = "VIP"
-                elif user.get('last_activity', 0) > (time.time() - 7 * 24 * 3600):
-                    status = "Active"
-                else:
-                    status = "Inactive"
-                
-                conn.execute("""
-                    INSERT INTO users (user_id, username, first_name, created_at, last_activity, status)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    user['user_id'],
-                    user.get('username'),
-                    user.get('first_name'),
-                    user.get('created_at', 0),
-                    user.get('last_activity', 0),
-                    status
-                ))
-            
-            conn.commit()
+        # Rows are streamed from the bot database straight into the export file
+        exported = await asyncio.to_thread(
+            write_users_export, db.iter_users(), temp_path, export_format, _user_status
+        )
         
-        # Send the SQLite file
-        with open(temp_db_path, 'rb') as db_file:
+        with open(temp_path, 'rb') as export_file:
             await update.message.reply_document(
-                document=db_file,
-                filename=f"users_export_{int(time.time())}.db",
-                caption="📁 **Users Database Export**\n\nSQLite file containing all user data with status information."
+                document=export_file,
+                filename=f"users_export_{int(time.time())}.{extension}",
+                caption=f"📁 **Users Database Export**\n\n{export_format.upper()} file containing {exported} users with status information."
             )
         
-        # Clean up temporary file
-        os.unlink(temp_db_path)
-        
     except Exception as e:
-        logger.error(f"Error exporting users to SQLite: {e}")
+        logger.error(f"Error exporting users ({export_format}): {e}")
         await update.message.reply_text("❌ Error exporting users database.")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.unlink(temp_path)
 
 
 async def analytics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -679,6 +652,35 @@ async def backup_db(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text(f"❌ Backup error: {str(e)}")
 
 
+async def maintenance_db(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Manual database maintenance with size report (admin only)"""
+    if not _is_authorized(update):
+        return
+    
+    user_id = update.message.from_user.id
+    
+    # Only allow specific admin users
+    ADMIN_USERS = {800092886}
+    if user_id not in ADMIN_USERS:
+        await update.message.reply_text("❌ Access denied. Admin only command.")
+        return
+    
+    # Record maintenance command
+    db.record_interaction(user_id, "manual_maintenance_command")
+    
+    await update.message.reply_text("🧹 Running database maintenance...")
+    
+    try:
+        # /maintenance full also runs a full ANALYZE
+        full_analyze = bool(context.args) and context.args[0].lower() == "full"
+        report = await maintenance_system.run_async(full_analyze=full_analyze)
+        await update.message.reply_text(DatabaseMaintenance.format_report(report))
+        
+    except Exception as e:
+        logger.error(f"Manual maintenance failed: {e}")
+        await update.message.reply_text(f"❌ Maintenance error: {str(e)}")
+
+
 async def handle_broadcast_content(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle broadcast content (text, photo, video)"""
     if not _is_authorized(update):
@@ -742,17 +744,13 @@ async def handle_broadcast_content(update: Update, context: ContextTypes.DEFAULT
     context.user_data['broadcast_content'] = broadcast_content
     context.user_data['broadcast_state'] = 'preview'
     
-    # Get user counts for preview
-    all_users = db.get_all_users()
-    active_users = db.get_active_users(30)
-    
     # Create preview message
     preview_text = f"""
 📢 **Broadcast Preview**
 
 **Message Type:** {broadcast_content['media_type'].replace('_', ' ').title()}
-**Target Users:** All users ({len(all_users)} total)
-**Active Users:** {len(active_users)} (last 30 days)
+**Target Users:** All users ({db.count_users()} total)
+**Active Users:** {db.count_users(30)} (last 30 days)
 
 **Message Content:**
 {broadcast_content['text'][:200]}{'...' if len(broadcast_content['text']) > 200 else ''}
@@ -831,32 +829,29 @@ async def _execute_broadcast(query, context, target_type):
     logger.info(f"Photo file_id: {broadcast_content.get('photo')}")
     logger.info(f"Video file_id: {broadcast_content.get('video')}")
     
-    # Get users based on target type
+    # Get users based on target type (streamed, so sending starts before all users are read)
     if target_type == "active":
-        users = db.get_active_users(30)
+        total_users = db.count_users(30)
+        users = db.iter_active_users(30)
         target_description = "active users (last 30 days)"
     elif target_type == "chat":
         # Send to current chat only
         chat_id = query.message.chat_id
-        users = [{"user_id": chat_id, "username": "chat", "first_name": "Chat"}]
+        total_users = 1
+        users = iter([{"user_id": chat_id, "username": "chat", "first_name": "Chat"}])
         target_description = "current chat"
         logger.info(f"Chat broadcast to chat_id: {chat_id}")
     else:
-        users = db.get_all_users()
+        total_users = db.count_users()
+        users = db.iter_users()
         target_description = "all users"
     
-    logger.info(f"Found {len(users)} users for broadcast")
+    logger.info(f"Found {total_users} users for broadcast")
     
-    if not users:
+    if not total_users:
         await query.edit_message_text("❌ No users found in database. Make sure users have interacted with the bot first.")
         return
     
-    # Log first few users for debugging
-    if users:
-        logger.info(f"First user: {users[0]}")
-        if len(users) > 1:
-            logger.info(f"Second user: {users[1]}")
-    
     # Start broadcasting - check if original message has media first
     original_message = query.message
     has_media = original_message.photo or original_message.video or original_message.document
@@ -864,19 +859,19 @@ async def _execute_broadcast(query, context, target_type):
     if has_media:
         # Original message has media, edit caption instead
         try:
-            await query.edit_message_caption(caption=f"🚀 Starting broadcast to {len(users)} {target_description}...")
+            await query.edit_message_caption(caption=f"🚀 Starting broadcast to {total_users} {target_description}...")
         except Exception as caption_error:
             logger.error(f"Failed to edit caption: {caption_error}")
             # Send a new message instead
-            await query.message.reply_text(f"🚀 Starting broadcast to {len(users)} {target_description}...")
+            await query.message.reply_text(f"🚀 Starting broadcast to {total_users} {target_description}...")
     else:
         # Original message is text only, edit text
         try:
-            await query.edit_message_text(f"🚀 Starting broadcast to {len(users)} {target_description}...")
+            await query.edit_message_text(f"🚀 Starting broadcast to {total_users} {target_description}...")
         except Exception as e:
             logger.error(f"Failed to edit text: {e}")
             # Send a new message instead
-            await query.message.reply_text(f"🚀 Starting broadcast to {len(users)} {target_description}...")
+            await query.message.reply_text(f"🚀 Starting broadcast to {total_users} {target_description}...")
     
     sent_count = 0
     failed_count = 0
@@ -889,7 +884,7 @@ async def _execute_broadcast(query, context, target_type):
             if i > 0:
                 await asyncio.sleep(0.1)
             
-            logger.info(f"Sending broadcast to user {user['user_id']} ({i+1}/{len(users)})")
+            logger.info(f"Sending broadcast to user {user['user_id']} ({i+1}/{total_users})")
             
             # Send message based on media type
             if broadcast_content['media_type'] == 'photo':
@@ -1004,14 +999,14 @@ async def _execute_broadcast(query, context, target_type):
                 if has_media:
                     # Original message has media, edit caption
                     try:
-                        await query.edit_message_caption(caption=f"📤 Progress: {i + 1}/{len(users)} messages sent...")
+                        await query.edit_message_caption(caption=f"📤 Progress: {i + 1}/{total_users} messages sent...")
                     except Exception as caption_error:
                         logger.warning(f"Failed to update progress caption: {caption_error}")
                         # Continue without updating progress message
                 else:
                     # Original message is text only, edit text
                     try:
-                        await query.edit_message_text(f"📤 Progress: {i + 1}/{len(users)} messages sent...")
+                        await query.edit_message_text(f"📤 Progress: {i + 1}/{total_users} messages sent...")
                     except Exception as e:
                         logger.warning(f"Failed to update progress text: {e}")
                         # Continue without updating progress message
@@ -1026,6 +1021,9 @@ async def _execute_broadcast(query, context, target_type):
             logger.error(f"Failed to send broadcast to user {user['user_id']}: {e}")
             # Continue with next user instead of stopping
     
+    # Users actually iterated (may differ from the count taken before streaming)
+    processed_count = sent_count + failed_count
+    
     # Record broadcast in database
     db.record_broadcast(query.from_user.id, broadcast_content['text'], sent_count, failed_count)
     
@@ -1035,10 +1033,10 @@ async def _execute_broadcast(query, context, target_type):
 
 📊 **Statistics:**
 • Target: {target_description}
-• Total users: {len(users)}
+• Total users: {processed_count}
 • Successfully sent: {sent_count}
 • Failed: {failed_count}
-• Success rate: {(sent_count / len(users) * 100):.1f}%
+• Success rate: {(sent_count / max(processed_count, 1) * 100):.1f}%
 
 📝 **Message sent:**
 {broadcast_content['text'][:200]}{'...' if len(broadcast_content['text']) > 200 else ''}
@@ -1640,7 +1638,7 @@ async def _handle_check_payment(update: Update, context: ContextTypes.DEFAULT_TY
     memo = cq.data[6:]  # Remove "check_" prefix
     
     # Verify payment
-    if payment_manager.verify_payment(memo, RECV_ADDR):
+    if await payment_manager.verify_payment(memo, RECV_ADDR):
         # Get updated user credits
         user = db.get_user(user_id)
         await cq.message.reply_text(
@@ -1913,6 +1911,8 @@ def main():
             
             # Schedule backup task to start after bot initialization
             app.job_queue.run_once(lambda ctx: asyncio.create_task(start_backup_scheduler()), when=10)  # Start after 10 seconds
+            # Maintenance runs on its own schedule, after the initial backup has been taken
+            app.job_queue.run_once(lambda ctx: asyncio.create_task(maintenance_system.start_scheduled_maintenance()), when=120)
 
             # Handlers
             app.add_handler(CommandHandler("start", start))
@@ -1926,6 +1926,7 @@ def main():
             app.add_handler(CommandHandler("test_broadcast", test_broadcast))
             app.add_handler(CommandHandler("broadcast", broadcast))
             app.add_handler(CommandHandler("backup", backup_db))
+            app.add_handler(CommandHandler("maintenance", maintenance_db))
             # Broadcast content handler (must come before photo handler)
             app.add_handler(MessageHandler(filters.TEXT | filters.PHOTO | filters.VIDEO | filters.Document.VIDEO, handle_broadcast_content))
             # Photo handler for image processing (only when not in broadcast mode)
@@ -4,10 +4,17 @@ Uses pytoniq library for blockchain interactions
 """
 
 import os
+import sys
 import asyncio
 import logging
 from typing import Optional
 from pytoniq import LiteBalancer, WalletV4R2
+
+# ton_wallet_cli.py only puts core/ on sys.path; the shared utils live in the backend root
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if bot_root not in sys.path:
+    sys.path.insert(0, bot_root)
+from utils import http_client
 from memo_system import get_memo_system
 from transaction_tracker import get_transaction_tracker
 from address_utils import convert_to_friendly_address
@@ -156,8 +163,6 @@ class TONWalletService:
     async def _get_real_transaction_hash(self, tx_hash: str) -> Optional[str]:
         """Get the real transaction hash from blockchain using TON Center API"""
         try:
-            import requests
-            
             # Get wallet address
             wallet_address = self.wallet.address.to_str(is_bounceable=False, is_url_safe=True)
             
@@ -169,8 +174,8 @@ class TONWalletService:
                 "sort": "desc"
             }
             
-            response = requests.get(api_url, params=params, timeout=10)
-            if response.status_code == 200:
+            response = await http_client.get(api_url, params=params, timeout=10)
+            if response.status == 200:
                 data = response.json()
                 logger.info(f"API Response: {data}")
                 
@@ -0,0 +1,77 @@
+"""
+Streaming user export writers (SQLite, CSV, NDJSON).
+Rows are written as they are read, so memory stays flat regardless of user count.
+"""
+
+import csv
+import itertools
+import json
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, Optional
+
+EXPORT_FORMATS = ("sqlite", "csv", "ndjson")
+
+EXPORT_COLUMNS = ("user_id", "username", "first_name", "created_at", "last_activity", "status")
+
+# Rows per executemany() call when writing SQLite exports
+SQLITE_CHUNK_SIZE = 1000
+
+
+def _export_rows(users: Iterable[Dict[str, Any]], status_for: Optional[Callable[[Dict[str, Any]], str]]):
+    for user in users:
+        yield (
+            user['user_id'],
+            user.get('username'),
+            user.get('first_name'),
+            user.get('created_at') or 0,
+            user.get('last_activity') or 0,
+            status_for(user) if status_for else None,
+        )
+
+
+def write_users_export(users: Iterable[Dict[str, Any]], path: str, fmt: str = "sqlite",
+                       status_for: Optional[Callable[[Dict[str, Any]], str]] = None) -> int:
+    """Write users to `path` in the given format, returns the number of rows written"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    rows = _export_rows(users, status_for)
+    count = 0
+
+    if fmt == "sqlite":
+        with sqlite3.connect(path) as conn:
+            conn.execute("""
+                CREATE TABLE users (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    created_at REAL,
+                    last_activity REAL,
+                    status TEXT
+                )
+            """)
+            while True:
+                chunk = list(itertools.islice(rows, SQLITE_CHUNK_SIZE))
+                if not chunk:
+                    break
+                conn.executemany("""
+                    INSERT OR REPLACE INTO users (user_id, username, first_name, created_at, last_activity, status)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, chunk)
+                count += len(chunk)
+            conn.commit()
+    elif fmt == "csv":
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+                f.write("\n")
+                count += 1
+
+    return count
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Database Benchmark Harness
+Seeds a bot_data.db with synthetic populations and times every BotDatabase,
+TransactionTracker and DailyWithdrawalTracker method under single-threaded and
+concurrent access, reporting p50/p99 latency and lock contention.
+
+Usage:
+    python3 scripts/benchmark_db.py --preset small
+    python3 scripts/benchmark_db.py --preset prod --db /data/bench/bot_data.db --threads 8
+    python3 scripts/benchmark_db.py --users 200000 --interactions 5000000 --json report.json
+"""
+
+import argparse
+import inspect
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+# The trackers use flat imports (memo_system, daily_withdrawal_tracker)
+sys.path.insert(0, os.path.join(bot_root, 'core'))
+sys.path.insert(0, os.path.join(bot_root, 'utils'))
+sys.path.insert(0, os.path.join(bot_root, 'scripts'))
+
+from core.database import BotDatabase
+from daily_withdrawal_tracker import DailyWithdrawalTracker
+
+try:
+    from transaction_tracker import TransactionTracker
+    TRANSACTION_TRACKER_AVAILABLE = True
+except ImportError as e:
+    # memo_system needs the cryptography package
+    print(f"⚠️ TransactionTracker not available: {e}")
+    TRANSACTION_TRACKER_AVAILABLE = False
+
+logger = logging.getLogger("db-benchmark")
+
+# Synthetic population sizes
+PRESETS = {
+    'small': {
+        'users': 10_000, 'interactions': 200_000, 'solves': 50_000, 'referrals': 2_000,
+        'requests': 20_000, 'payments': 2_000, 'rewards': 5_000, 'feed_events': 10_000,
+        'transactions': 5_000, 'withdrawals': 2_000,
+    },
+    'medium': {
+        'users': 100_000, 'interactions': 5_000_000, 'solves': 500_000, 'referrals': 10_000,
+        'requests': 200_000, 'payments': 20_000, 'rewards': 50_000, 'feed_events': 100_000,
+        'transactions': 50_000, 'withdrawals': 20_000,
+    },
+    'prod': {
+        'users': 1_000_000, 'interactions': 50_000_000, 'solves': 5_000_000, 'referrals': 100_000,
+        'requests': 2_000_000, 'payments': 200_000, 'rewards': 500_000, 'feed_events': 1_000_000,
+        'transactions': 500_000, 'withdrawals': 200_000,
+    },
+}
+
+TIME_SLOTS = ("00:00", "06:00", "12:00", "18:00")
+INTERACTION_TYPES = ("start", "free_plan", "paid_plan", "photo_upload", "command", "quiz_correct", "lucky_spin_won")
+SEED_BATCH_SIZE = 50_000
+BASE_DATE = date(2025, 1, 1)
+
+# Table seed_database() creates first; only databases carrying it are deleted without --overwrite
+MARKER_TABLE = 'benchmark_seed'
+
+# Methods that scan whole tables: run with fewer iterations
+HEAVY_METHODS = {'get_all_users', 'get_active_users', 'get_analytics_summary', 'get_pending_transactions'}
+
+
+def _batched(rows, size: int = SEED_BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _slot_for(index: int) -> Tuple[str, str]:
+    """(date, time_slot) for the Nth daily game slot"""
+    day, slot = divmod(index, len(TIME_SLOTS))
+    return str(BASE_DATE + timedelta(days=day)), TIME_SLOTS[slot]
+
+
+def is_benchmark_database(db_path: str) -> bool:
+    """True if seed_database() created this file (it has the marker table)"""
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return False
+    try:
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (MARKER_TABLE,)
+        ).fetchone() is not None
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
+
+def seed_database(db_path: str, population: Dict[str, int], seed: int = 42) -> Dict[str, float]:
+    """Create the schema through the real classes, then bulk-insert synthetic rows"""
+    rng = random.Random(seed)
+    n_users = max(population['users'], 1)
+    now = time.time()
+    timings = {}
+
+    # Mark the file as ours before anything else, so even a half-seeded one can be replaced
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {MARKER_TABLE} (seed INTEGER, created_at REAL)")
+        conn.execute(f"INSERT INTO {MARKER_TABLE} (seed, created_at) VALUES (?, ?)", (seed, now))
+    conn.close()
+
+    # Schema comes from the production code paths
+    BotDatabase(db_path)
+    DailyWithdrawalTracker(db_path)
+    if TRANSACTION_TRACKER_AVAILABLE:
+        TransactionTracker(db_path)
+
+    def user_id():
+        return rng.randint(1, n_users)
+
+    def ts(days: int = 90):
+        return now - rng.random() * days * 86400
+
+    tables = {
+        'users': ("""
+            INSERT OR IGNORE INTO users (user_id, username, first_name, free_uses, credits, created_at, last_activity)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, ((i, f"user{i}", f"User {i}", rng.randint(0, 3), rng.randint(0, 100), ts(365), ts(60))
+              for i in range(1, population['users'] + 1))),
+        'interactions': ("""
+            INSERT INTO interactions (user_id, interaction_type, data, created_at) VALUES (?, ?, ?, ?)
+        """, ((user_id(), rng.choice(INTERACTION_TYPES), None, ts()) for _ in range(population['interactions']))),
+        # One row per (slot, user): solve i belongs to slot i // n_users
+        'daily_game_solves': ("""
+            INSERT OR IGNORE INTO daily_game_solves (user_id, date, time_slot, answer, is_first_solver, solved_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (((i % n_users) + 1, *_slot_for(i // n_users), "answer", i % n_users == 0, ts())
+              for i in range(population['solves']))),
+        'referrals': ("""
+            INSERT OR IGNORE INTO referrals (referrer_id, invited_id, invited_name, invited_photo, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, ((user_id(), (i % n_users) + 1, f"User {i}", "", ts()) for i in range(population['referrals']))),
+        'requests': ("""
+            INSERT INTO requests (user_id, request_type, image_size, pieces_count, watermarked,
+                                  credits_used, created_at, processing_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, ((user_id(), "cut", "1080x1920", 12, rng.random() < 0.5, rng.randint(0, 1), ts(), rng.random())
+              for _ in range(population['requests']))),
+        'payments': ("""
+            INSERT OR IGNORE INTO payments (user_id, memo, amount_nano, credits_to_grant, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((user_id(), f"seed-memo-{i}", 100_000_000, 1, rng.choice(("pending", "completed")), ts())
+              for i in range(population['payments']))),
+        'daily_game_rewards': ("""
+            INSERT INTO daily_game_rewards (user_id, date, time_slot, amount, tx_hash, paid_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((user_id(), *_slot_for(i % 365), 0.1, None if rng.random() < 0.5 else "withdrawn", ts())
+              for i in range(population['rewards']))),
+        'feed_events': ("""
+            INSERT INTO feed_events (user_id, event_type, event_data, created_at) VALUES (?, ?, ?, ?)
+        """, ((user_id(), "game_win", None, ts()) for _ in range(population['feed_events']))),
+        'daily_withdrawals': ("""
+            INSERT OR IGNORE INTO daily_withdrawals (user_id, withdrawal_date, amount_ton, transaction_id)
+            VALUES (?, ?, ?, ?)
+        """, ((user_id(), str(BASE_DATE + timedelta(days=rng.randint(0, 365))), 0.2, f"seed{i:07d}")
+              for i in range(population['withdrawals']))),
+    }
+    if TRANSACTION_TRACKER_AVAILABLE:
+        tables['ton_transactions'] = ("""
+            INSERT OR IGNORE INTO ton_transactions (transaction_id, user_id, amount_ton, transaction_type,
+                                                    wallet_address, memo, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, ((f"s{i:07d}", user_id(), 0.2, rng.choice(("withdrawal", "deposit")), "UQseed", f"Ws{i:07d}",
+               rng.choice(("pending", "completed", "failed")))
+              for i in range(population['transactions'])))
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA synchronous = OFF")
+        for table, (sql, rows) in tables.items():
+            start = time.time()
+            conn.execute("BEGIN")
+            for batch in _batched(rows):
+                conn.executemany(sql, batch)
+            conn.execute("COMMIT")
+            timings[table] = time.time() - start
+            count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            print(f"   🌱 {table}: {count:,} rows ({timings[table]:.1f}s)")
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return timings
+
+
+class MethodBenchmark:
+    """Runs every public method of the DB classes with randomized arguments"""
+
+    def __init__(self, db_path: str, population: Dict[str, int], seed: int = 7):
+        self.db_path = db_path
+        self.n_users = max(population['users'], 1)
+        self.n_payments = max(population['payments'], 1)
+        self.n_transactions = max(population['transactions'], 1)
+        self.n_slots = max(population['solves'] // self.n_users, 1)
+        self._local = threading.local()
+        self._seed = seed
+        self._counter = itertools.count(1)
+
+        self.db = BotDatabase(db_path)
+        self.withdrawals = DailyWithdrawalTracker(db_path)
+        self.transactions = TransactionTracker(db_path) if TRANSACTION_TRACKER_AVAILABLE else None
+
+    @property
+    def rng(self) -> random.Random:
+        # One RNG per thread so concurrent runs do not share state
+        if not hasattr(self._local, 'rng'):
+            self._local.rng = random.Random(self._seed + threading.get_ident())
+        return self._local.rng
+
+    def _user(self) -> int:
+        return self.rng.randint(1, self.n_users)
+
+    def _slot(self) -> Tuple[str, str]:
+        return _slot_for(self.rng.randint(0, self.n_slots - 1))
+
+    def _unique(self) -> int:
+        return next(self._counter)
+
+    def cases(self) -> Dict[str, Callable[[], Any]]:
+        """name -> zero-argument callable performing one representative call"""
+        db = self.db
+        cases: Dict[str, Callable[[], Any]] = {
+            'BotDatabase.get_user': lambda: db.get_user(self._user()),
+            'BotDatabase.update_user_credits': lambda: db.update_user_credits(self._user(), 50),
+            'BotDatabase.update_user_free_uses': lambda: db.update_user_free_uses(self._user(), 1),
+            'BotDatabase.add_credits': lambda: db.add_credits(self._user(), 1),
+            'BotDatabase.consume_credit': lambda: db.consume_credit(self._user()),
+            'BotDatabase.use_free_cut': lambda: db.use_free_cut(self._user()),
+            'BotDatabase.create_payment': lambda: db.create_payment(self._user(), f"bench-memo-{self._unique()}-{time.time()}", 100_000_000, 1),
+            'BotDatabase.get_payment_by_memo': lambda: db.get_payment_by_memo(f"seed-memo-{self.rng.randint(0, self.n_payments - 1)}"),
+            'BotDatabase.complete_payment': lambda: db.complete_payment(f"seed-memo-{self.rng.randint(0, self.n_payments - 1)}", "benchhash"),
+            'BotDatabase.record_sale': lambda: db.record_sale(self._user(), 1, 0.1, 1),
+            'BotDatabase.record_request': lambda: db.record_request(self._user(), "cut", "1080x1920", 12, False, 1, 0.5),
+            'BotDatabase.get_user_stats': lambda: db.get_user_stats(self._user()),
+            'BotDatabase.record_interaction': lambda: db.record_interaction(self._user(), "command"),
+            'BotDatabase.start_session': lambda: db.start_session(self._user()),
+            'BotDatabase.update_session': lambda: db.update_session(self._user()),
+            'BotDatabase.get_analytics_summary': db.get_analytics_summary,
+            'BotDatabase.get_daily_game_solvers': lambda: db.get_daily_game_solvers(*self._slot()),
+            'BotDatabase.solve_daily_question': lambda: db.solve_daily_question(self._user(), *self._slot(), "answer"),
+            'BotDatabase.check_user_solved_daily_question': lambda: db.check_user_solved_daily_question(self._user(), *self._slot()),
+            'BotDatabase.is_first_solver_daily_question': lambda: db.is_first_solver_daily_question(*self._slot()),
+            'BotDatabase.record_daily_game_solve': lambda: db.record_daily_game_solve(self._user(), *self._slot(), "answer"),
+            'BotDatabase.record_daily_game_reward': lambda: db.record_daily_game_reward(self._user(), *self._slot(), 0.1),
+            'BotDatabase.get_user_daily_game_stats': lambda: db.get_user_daily_game_stats(self._user()),
+            'BotDatabase.get_user_ton_balance': lambda: db.get_user_ton_balance(self._user()),
+            'BotDatabase.withdraw_user_ton': lambda: db.withdraw_user_ton(self._user(), 0.1),
+            'BotDatabase.add_referral': lambda: db.add_referral(self._user(), self._user(), "Bench", ""),
+            'BotDatabase.get_invited_users': lambda: db.get_invited_users(self._user()),
+            'BotDatabase.get_referral_stats': lambda: db.get_referral_stats(self._user()),
+            'BotDatabase.record_feed_event': lambda: db.record_feed_event(self._user(), "game_win"),
+            'BotDatabase.get_feed_events': lambda: db.get_feed_events(50),
+            'BotDatabase.iter_users': lambda: list(itertools.islice(db.iter_users(), 500)),
+            'BotDatabase.iter_active_users': lambda: list(itertools.islice(db.iter_active_users(30), 500)),
+            'BotDatabase.count_users': lambda: db.count_users(30),
+            'BotDatabase.get_all_users': db.get_all_users,
+            'BotDatabase.get_active_users': lambda: db.get_active_users(30),
+            'BotDatabase.record_broadcast': lambda: db.record_broadcast(self._user(), "bench", 1, 0),
+        }
+
+        tracker = self.withdrawals
+        cases.update({
+            'DailyWithdrawalTracker.set_user_premium_status': lambda: tracker.set_user_premium_status(self._user(), self.rng.random() < 0.1),
+            'DailyWithdrawalTracker.is_user_premium': lambda: tracker.is_user_premium(self._user()),
+            'DailyWithdrawalTracker.get_daily_withdrawal_amount': lambda: tracker.get_daily_withdrawal_amount(self._user()),
+            'DailyWithdrawalTracker.can_withdraw': lambda: tracker.can_withdraw(self._user(), 0.2),
+            'DailyWithdrawalTracker.record_withdrawal': lambda: tracker.record_withdrawal(self._user(), 0.2, f"bench{self._unique()}"),
+            'DailyWithdrawalTracker.get_user_withdrawal_stats': lambda: tracker.get_user_withdrawal_stats(self._user()),
+        })
+
+        if self.transactions:
+            tx = self.transactions
+
+            def seeded_tx_id():
+                return f"s{self.rng.randint(0, self.n_transactions - 1):07d}"
+
+            cases.update({
+                'TransactionTracker.record_withdrawal': lambda: tx.record_withdrawal(self._user(), 0.2, "UQbench"),
+                'TransactionTracker.record_deposit': lambda: tx.record_deposit(self._user(), 0.2, "UQbench"),
+                'TransactionTracker.update_transaction_status': lambda: tx.update_transaction_status(seeded_tx_id(), "completed"),
+                'TransactionTracker.get_transaction': lambda: tx.get_transaction(seeded_tx_id()),
+                'TransactionTracker.get_user_transactions': lambda: tx.get_user_transactions(self._user()),
+                'TransactionTracker.is_transaction_processed': lambda: tx.is_transaction_processed(seeded_tx_id()),
+                'TransactionTracker.get_pending_transactions': tx.get_pending_transactions,
+            })
+        return cases
+
+    def uncovered_methods(self) -> List[str]:
+        """Public methods with no benchmark case, so new methods do not go unmeasured"""
+        covered = set(self.cases())
+        objects = [self.db, self.withdrawals] + ([self.transactions] if self.transactions else [])
+        missing = []
+        for obj in objects:
+            cls = type(obj).__name__
+            for name, _ in inspect.getmembers(obj, inspect.ismethod):
+                if not name.startswith('_') and name != 'init_database' and f"{cls}.{name}" not in covered:
+                    missing.append(f"{cls}.{name}")
+        return missing
+
+
+class _LockCounter(logging.Handler):
+    """Counts 'database is locked' errors that the DB classes log and swallow"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        if 'locked' in record.getMessage() or 'busy' in record.getMessage():
+            with self._lock:
+                self.count += 1
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_case(func: Callable[[], Any], iterations: int, threads: int, lock_counter: _LockCounter) -> Dict[str, Any]:
+    """Run one case `iterations` times across `threads` workers and summarize latencies"""
+    latencies: List[float] = []
+    raised_locked = 0
+    errors = 0
+    results_lock = threading.Lock()
+    locked_before = lock_counter.count
+
+    def worker(n: int):
+        nonlocal raised_locked, errors
+        local = []
+        for _ in range(n):
+            start = time.perf_counter()
+            try:
+                func()
+            except sqlite3.OperationalError as e:
+                with results_lock:
+                    if 'locked' in str(e) or 'busy' in str(e):
+                        raised_locked += 1
+                    else:
+                        errors += 1
+            except Exception:
+                with results_lock:
+                    errors += 1
+            local.append(time.perf_counter() - start)
+        with results_lock:
+            latencies.extend(local)
+
+    wall_start = time.perf_counter()
+    if threads <= 1:
+        worker(iterations)
+    else:
+        per_thread = max(iterations // threads, 1)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for future in [pool.submit(worker, per_thread) for _ in range(threads)]:
+                future.result()
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'throughput_ops': len(latencies) / wall if wall else 0.0,
+        'lock_errors': raised_locked + (lock_counter.count - locked_before),
+        'errors': errors,
+    }
+
+
+def run_benchmarks(bench: MethodBenchmark, iterations: int, heavy_iterations: int, threads: int,
+                   only: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    lock_counter = _LockCounter()
+    logging.getLogger().addHandler(lock_counter)
+    results = {}
+    try:
+        for name, func in bench.cases().items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            n = heavy_iterations if name.split('.')[-1] in HEAVY_METHODS else iterations
+            single = run_case(func, n, 1, lock_counter)
+            concurrent = run_case(func, n * threads, threads, lock_counter) if threads > 1 else None
+            results[name] = {'single': single, 'concurrent': concurrent}
+            line = f"{name:<52} p50 {single['p50_ms']:8.2f}ms  p99 {single['p99_ms']:8.2f}ms"
+            if concurrent:
+                slowdown = concurrent['p50_ms'] / single['p50_ms'] if single['p50_ms'] else 0.0
+                results[name]['contention_slowdown'] = slowdown
+                line += (f" | x{threads}: p50 {concurrent['p50_ms']:8.2f}ms  p99 {concurrent['p99_ms']:8.2f}ms"
+                         f"  slowdown {slowdown:5.1f}x  locked {concurrent['lock_errors']}")
+            print(line)
+    finally:
+        logging.getLogger().removeHandler(lock_counter)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bot database layer on synthetic data')
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'collectiblekit_bench', 'bot_data.db'),
+                        help='Benchmark database path (never point this at the production bot_data.db)')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small', help='Population preset')
+    for key in PRESETS['small']:
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, help=f'Override {key} population')
+    parser.add_argument('--reuse', action='store_true', help='Reuse an already seeded database')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Allow replacing a --db file this benchmark did not create')
+    parser.add_argument('--iterations', type=int, default=200, help='Calls per method (single-threaded)')
+    parser.add_argument('--heavy-iterations', type=int, default=3, help='Calls per full-scan method')
+    parser.add_argument('--threads', type=int, default=8, help='Workers for the concurrent run (1 disables it)')
+    parser.add_argument('--only', nargs='*', help='Only run methods whose name contains one of these')
+    parser.add_argument('--json', help='Write the full report to this JSON file')
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s | %(levelname)s | %(name)s | %(message)s", level=logging.WARNING)
+
+    population = dict(PRESETS[args.preset])
+    for key in population:
+        override = getattr(args, key)
+        if override is not None:
+            population[key] = override
+
+    # Resolve paths before changing directory, so relative ones still mean what the user typed
+    args.db = os.path.abspath(args.db)
+    # The benchmark writes to (and may delete) the database: never touch one it didn't seed
+    if os.path.exists(args.db) and not args.overwrite and not is_benchmark_database(args.db):
+        print(f"❌ {args.db} was not created by this benchmark; pass --overwrite to replace it", file=sys.stderr)
+        sys.exit(1)
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    db_dir = os.path.dirname(args.db)
+    os.makedirs(db_dir, exist_ok=True)
+    # memo_system stores memo rows in ./bot_data.db, keep those in the benchmark directory
+    os.chdir(db_dir)
+
+    print("🧪 Database benchmark")
+    print(f"   Database: {args.db}")
+    print(f"   Population: {population}")
+
+    seed_timings = {}
+    if not (args.reuse and os.path.exists(args.db)):
+        for path in (args.db, f"{args.db}-wal", f"{args.db}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        print("\n🌱 Seeding...")
+        seed_timings = seed_database(args.db, population)
+
+    bench = MethodBenchmark(args.db, population)
+    missing = bench.uncovered_methods()
+    if missing:
+        print(f"\n⚠️ Methods without a benchmark case: {', '.join(missing)}")
+
+    print(f"\n⏱️ Running ({args.iterations} calls/method, {args.threads} threads)...")
+    results = run_benchmarks(bench, args.iterations, args.heavy_iterations, args.threads, args.only)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'population': population,
+                'threads': args.threads,
+                'seed_seconds': seed_timings,
+                'db_size_bytes': os.path.getsize(args.db),
+                'results': results,
+            }, f, indent=2)
+        print(f"\n📄 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
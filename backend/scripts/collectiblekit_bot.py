@@ -10,6 +10,7 @@ import logging
 import os
 import time
 import random
+import sqlite3
 from io import BytesIO
 from typing import List, Optional
 
@@ -60,72 +61,142 @@ PACKAGES = {
     "buy_10": {"amount_nano": 500_000_000, "credits": 10, "ton": 0.5}, # 0.5 TON -> 10 cuts
 }
 
-# Simple in-memory database (replace with proper database in production)
-class SimpleDatabase:
-    def __init__(self):
-        self.users = {}
-        self.payments = {}
-        self.interactions = []
-        self.referrals = []
-        self.feed_events = []
+# Persistent SQLite store (survives the restart loop in main())
+DB_PATH = os.getenv("COLLECTIBLEKIT_BOT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "collectiblekit_bot.db"))
+
+class PersistentDatabase:
+    """
+    Indexed SQLite store with the same method surface as the old in-memory database.
+    Per-referrer and per-interaction-type counters are maintained on write, so
+    referral stats and analytics are lookups instead of scans.
+    """
+    
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        # The bot runs on a single event loop thread, one connection is enough
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_database()
+    
+    def _init_database(self):
+        """Initialize tables, indexes and counters"""
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                free_uses INTEGER DEFAULT 0,
+                credits INTEGER DEFAULT 0,
+                created_at REAL DEFAULT 0,
+                last_activity REAL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_users_last_activity ON users(last_activity);
+            
+            CREATE TABLE IF NOT EXISTS referrals (
+                referrer_id INTEGER NOT NULL,
+                invited_id INTEGER NOT NULL,
+                invited_name TEXT DEFAULT '',
+                invited_photo TEXT DEFAULT '',
+                created_at REAL NOT NULL,
+                PRIMARY KEY (referrer_id, invited_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_referrals_referrer_created ON referrals(referrer_id, created_at);
+            
+            CREATE TABLE IF NOT EXISTS referral_counters (
+                referrer_id INTEGER PRIMARY KEY,
+                total_referrals INTEGER NOT NULL DEFAULT 0
+            );
+            
+            CREATE TABLE IF NOT EXISTS interactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                interaction_type TEXT,
+                data TEXT DEFAULT NULL,
+                created_at REAL
+            );
+            
+            CREATE TABLE IF NOT EXISTS interaction_counters (
+                interaction_type TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            );
+            
+            CREATE TABLE IF NOT EXISTS bot_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            );
+            INSERT OR IGNORE INTO bot_counters (name, value) SELECT 'total_users', COUNT(*) FROM users;
+        """)
     
     def get_user(self, user_id: int, username: str = None, first_name: str = None):
         """Get or create user record"""
-        if user_id not in self.users:
-            self.users[user_id] = {
-                'user_id': user_id,
-                'username': username,
-                'first_name': first_name,
-                'free_uses': 0,
-                'credits': 0,
-                'created_at': time.time(),
-                'last_activity': time.time()
-            }
-        else:
-            # Update user info if provided
-            if username:
-                self.users[user_id]['username'] = username
-            if first_name:
-                self.users[user_id]['first_name'] = first_name
-            self.users[user_id]['last_activity'] = time.time()
-        
-        return self.users[user_id]
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.execute("""
+                INSERT OR IGNORE INTO users (user_id, username, first_name, created_at, last_activity)
+                VALUES (?, ?, ?, ?, ?)
+            """, (user_id, username, first_name, now, now))
+            if cursor.rowcount > 0:
+                self.conn.execute("UPDATE bot_counters SET value = value + 1 WHERE name = 'total_users'")
+            else:
+                self.conn.execute("""
+                    UPDATE users 
+                    SET last_activity = ?, username = COALESCE(?, username), first_name = COALESCE(?, first_name)
+                    WHERE user_id = ?
+                """, (now, username, first_name, user_id))
+        row = self.conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(row)
     
     def add_credits(self, user_id: int, amount: int):
         """Add credits to user"""
-        if user_id in self.users:
-            self.users[user_id]['credits'] += amount
+        self.conn.execute("UPDATE users SET credits = credits + ? WHERE user_id = ?", (amount, user_id))
     
     def consume_credit(self, user_id: int) -> bool:
         """Consume one credit if available"""
-        if user_id in self.users and self.users[user_id]['credits'] > 0:
-            self.users[user_id]['credits'] -= 1
-            return True
-        return False
+        cursor = self.conn.execute(
+            "UPDATE users SET credits = credits - 1 WHERE user_id = ? AND credits > 0", (user_id,)
+        )
+        return cursor.rowcount > 0
     
     def use_free_cut(self, user_id: int) -> bool:
         """Use one free cut if available"""
-        if user_id in self.users and self.users[user_id]['free_uses'] < FREE_LIMIT:
-            self.users[user_id]['free_uses'] += 1
-            return True
-        return False
+        cursor = self.conn.execute(
+            "UPDATE users SET free_uses = free_uses + 1 WHERE user_id = ? AND free_uses < ?", (user_id, FREE_LIMIT)
+        )
+        return cursor.rowcount > 0
     
-    def add_referral(self, referrer_id: int, invited_id: int, invited_name: str, invited_photo: str):
-        """Add a referral record"""
-        self.referrals.append({
-            'referrer_id': referrer_id,
-            'invited_id': invited_id,
-            'invited_name': invited_name,
-            'invited_photo': invited_photo,
-            'created_at': time.time()
-        })
-        return True
+    def add_referral(self, referrer_id: int, invited_id: int, invited_name: str, invited_photo: str) -> bool:
+        """Add a referral record (each invited user counts once per referrer)
+        
+        Returns True only if the referral is new, so callers grant its bonus once.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.execute("""
+                INSERT OR IGNORE INTO referrals (referrer_id, invited_id, invited_name, invited_photo, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (referrer_id, invited_id, invited_name, invited_photo, time.time()))
+            added = cursor.rowcount > 0
+            if added:
+                self.conn.execute("""
+                    INSERT INTO referral_counters (referrer_id, total_referrals) VALUES (?, 1)
+                    ON CONFLICT(referrer_id) DO UPDATE SET total_referrals = total_referrals + 1
+                """, (referrer_id,))
+        return added
     
     def get_referral_stats(self, referrer_id: int):
         """Get referral statistics for a user"""
-        total_referrals = sum(1 for r in self.referrals if r['referrer_id'] == referrer_id)
+        row = self.conn.execute(
+            "SELECT total_referrals FROM referral_counters WHERE referrer_id = ?", (referrer_id,)
+        ).fetchone()
+        total_referrals = row[0] if row else 0
+        
         week_ago = time.time() - (7 * 24 * 60 * 60)
-        recent_referrals = sum(1 for r in self.referrals if r['referrer_id'] == referrer_id and r['created_at'] > week_ago)
+        recent_referrals = self.conn.execute(
+            "SELECT COUNT(*) FROM referrals WHERE referrer_id = ? AND created_at > ?", (referrer_id, week_ago)
+        ).fetchone()[0] if total_referrals else 0
         
         return {
             'total_referrals': total_referrals,
@@ -134,28 +205,36 @@ class SimpleDatabase:
     
     def record_interaction(self, user_id: int, interaction_type: str, data: str = None):
         """Record user interaction for analytics"""
-        self.interactions.append({
-            'user_id': user_id,
-            'interaction_type': interaction_type,
-            'data': data,
-            'created_at': time.time()
-        })
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("""
+                INSERT INTO interactions (user_id, interaction_type, data, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (user_id, interaction_type, data, time.time()))
+            self.conn.execute("""
+                INSERT INTO interaction_counters (interaction_type, count) VALUES (?, 1)
+                ON CONFLICT(interaction_type) DO UPDATE SET count = count + 1
+            """, (interaction_type,))
     
     def get_analytics_summary(self):
         """Get comprehensive analytics for the bot"""
-        total_users = len(self.users)
+        total_users = self.conn.execute("SELECT value FROM bot_counters WHERE name = 'total_users'").fetchone()[0]
         week_ago = time.time() - (7 * 24 * 3600)
-        active_users = sum(1 for u in self.users.values() if u['last_activity'] > week_ago)
+        active_users = self.conn.execute(
+            "SELECT COUNT(*) FROM users WHERE last_activity > ?", (week_ago,)
+        ).fetchone()[0]
         
-        interactions_by_type = {}
-        for interaction in self.interactions:
-            itype = interaction['interaction_type']
-            interactions_by_type[itype] = interactions_by_type.get(itype, 0) + 1
+        interactions_by_type = {
+            row['interaction_type']: row['count']
+            for row in self.conn.execute(
+                "SELECT interaction_type, count FROM interaction_counters ORDER BY count DESC"
+            )
+        }
         
         return {
             'total_users': total_users,
             'active_users_7d': active_users,
-            'total_interactions': len(self.interactions),
+            'total_interactions': sum(interactions_by_type.values()),
             'interactions_by_type': interactions_by_type,
             'total_revenue_ton': 0,  # Placeholder
             'total_requests': 0,     # Placeholder
@@ -165,10 +244,10 @@ class SimpleDatabase:
     
     def get_all_users(self):
         """Get all users for broadcast"""
-        return list(self.users.keys())
+        return [row[0] for row in self.conn.execute("SELECT user_id FROM users")]
 
 # Initialize database
-db = SimpleDatabase()
+db = PersistentDatabase()
 
 def _is_authorized(update: Update) -> bool:
     """Only allow private chats for security"""
@@ -204,19 +283,21 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 logger.info(f"🔗 Processing referral: {user_id} referred by {referrer_id}")
                 
                 # Record referral in database
-                db.add_referral(
+                added = db.add_referral(
                     referrer_id=referrer_id,
                     invited_id=user_id,
                     invited_name=f"{first_name} {update.effective_user.last_name or ''}".strip() or f"User {user_id}",
                     invited_photo=update.effective_user.photo.small_file_id if update.effective_user.photo else ''
                 )
                 
-                # Grant referral bonus credits (50 credits for both referrer and referee)
-                db.add_credits(user_id, 50)  # Bonus for new user
-                db.add_credits(referrer_id, 50)  # Bonus for referrer
-                referral_bonus_granted = True
-                
-                logger.info(f"✅ Referral processed successfully: {user_id} referred by {referrer_id}")
+                if added:
+                    # Grant referral bonus credits (50 credits for both referrer and referee)
+                    db.add_credits(user_id, 50)  # Bonus for new user
+                    db.add_credits(referrer_id, 50)  # Bonus for referrer
+                    referral_bonus_granted = True
+                    logger.info(f"✅ Referral processed successfully: {user_id} referred by {referrer_id}")
+                else:
+                    logger.info(f"🔗 Referral {user_id} -> {referrer_id} already recorded, no bonus")
         except (ValueError, Exception) as e:
             logger.error(f"Error processing referral: {e}")
     
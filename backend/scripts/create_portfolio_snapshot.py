@@ -14,9 +14,10 @@ import os
 bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, bot_root)
 from services.get_profile_gifts import get_profile_gifts
+from utils.db_paths import SHARED_DB_PATH
 
 # Database path
-DB_PATH = '/root/01studio/CollectibleKIT/bot/bot_data.db'
+DB_PATH = SHARED_DB_PATH
 
 def save_snapshot(user_id: int, portfolio_data: dict):
     """Save portfolio snapshot to database"""
@@ -32,37 +32,17 @@ except ImportError as e:
     print(f"DEBUG: Import failed: {e}", file=sys.stderr)
     UNUPGRADEABLE_PRICES_AVAILABLE = False
 
+from utils.gift_catalog import get_catalog
+
 def load_static_prices():
-    """Load static prices from clean_unique_gifts.json"""
-    static_file = "/root/01studio/CollectibleKIT/mrktandquantomapi/quant/clean_unique_gifts.json"
-    try:
-        with open(static_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        prices = {}
-        names = {}
-        for item in data:
-            if 'id' in item:
-                # Extract price (can be in 'floor_price', 'price', etc.)
-                price = 0
-                if 'floor_price' in item and item['floor_price']:
-                    try:
-                        price = float(item['floor_price'])
-                    except:
-                        pass
-                elif 'price' in item:
-                    try:
-                        price = float(item['price'])
-                    except:
-                        pass
-                prices[str(item['id'])] = price
-                
-                # Extract name
-                name = item.get('full_name') or item.get('short_name') or item.get('name', f"Gift {item['id']}")
-                names[str(item['id'])] = name
-        return prices, names
-    except Exception as e:
-        print(f"Warning: Could not load static prices: {e}", file=sys.stderr)
-        return {}, {}
+    """
+    Static prices and names from the shared gift catalog (clean_unique_gifts.json)
+    
+    Returns:
+        ({gift_id: floor price} for listed gifts, {gift_id: name}) - shared dicts, don't modify
+    """
+    catalog = get_catalog()
+    return catalog.floor_prices, catalog.names
 
 async def load_unupgradeable_prices(client=None):
     """Load unupgradeable gift prices - try live API first, then fallback to static file"""
@@ -89,23 +69,28 @@ async def load_unupgradeable_prices(client=None):
     
     return prices
 
-async def get_account_gifts(account_username: str):
+async def collect_account_gifts(account_username: str, client=None):
     """
     Fetch all unupgradeable gifts from a public user account
     
     Args:
         account_username: The username of the account (e.g., 'username' or '@username')
+        client: Connected TelegramClient to reuse (portfolio_service.py); when None a
+            client is created for this call and disconnected afterwards
     
     Returns:
-        Dictionary with gift_id as key and count as value
+        The JSON-ready result with per-gift counts and values, or
+        {"success": False, "error": "..."}
     """
     # Remove @ if present
     if account_username.startswith('@'):
         account_username = account_username[1:]
     
+    owns_client = client is None
     try:
-        client = TelegramClient(SESSION_FILE, API_ID, API_HASH)
-        await client.start()
+        if owns_client:
+            client = TelegramClient(SESSION_FILE, API_ID, API_HASH)
+            await client.start()
         
         # Load unupgradeable prices (try live API first, then static file)
         unupgradeable_prices = await load_unupgradeable_prices(client)
@@ -117,12 +102,10 @@ async def get_account_gifts(account_username: str):
         try:
             user = await client.get_entity(account_username)
         except Exception as e:
-            print(json.dumps({
+            return {
                 "success": False,
                 "error": f"Account not found: {account_username}. Make sure it's a public account."
-            }))
-            await client.disconnect()
-            return
+            }
         
         # Fetch all gifts from the account using GetSavedStarGiftsRequest
         gift_counts = {}
@@ -157,8 +140,6 @@ async def get_account_gifts(account_username: str):
                 gift_id = gift.id
                 gift_counts[gift_id] = gift_counts.get(gift_id, 0) + 1
         
-        await client.disconnect()
-        
         # Prepare result
         gifts = []
         total_value = 0
@@ -181,7 +162,7 @@ async def get_account_gifts(account_username: str):
         # Sort by total_value descending
         gifts.sort(key=lambda x: x['total_value'], reverse=True)
         
-        print(json.dumps({
+        return {
             "success": True,
             "account_username": account_username,
             "account_id": user.id if hasattr(user, 'id') else None,
@@ -189,16 +170,21 @@ async def get_account_gifts(account_username: str):
             "unique_gifts": len(gift_counts),
             "gifts": gifts,
             "total_value": total_value
-        }, ensure_ascii=False))
+        }
         
     except Exception as e:
-        print(json.dumps({
+        return {
             "success": False,
             "error": str(e)
-        }))
-        if 'client' in locals():
+        }
+    finally:
+        if owns_client and client is not None:
             await client.disconnect()
 
+async def get_account_gifts(account_username: str):
+    """Fetch gifts for a public account and print them as JSON (CLI entry point)"""
+    print(json.dumps(await collect_account_gifts(account_username), ensure_ascii=False))
+
 def main():
     if len(sys.argv) < 2:
         print(json.dumps({
@@ -209,6 +195,13 @@ def main():
     
     account_username = sys.argv[1]
     
+    # Thin client: let the resident portfolio service answer when it is running
+    from services.portfolio_client import request_service
+    service_output = request_service('/account-gifts', {'username': account_username})
+    if service_output is not None:
+        print(json.dumps(service_output, ensure_ascii=False))
+        return
+    
     asyncio.run(get_account_gifts(account_username))
 
 if __name__ == "__main__":
@@ -7,10 +7,16 @@ Returns JSON with attributes (Model, Backdrop, Symbol, Quantity)
 import asyncio
 import sys
 import json
+import os
 import re
-import aiohttp
 from bs4 import BeautifulSoup
 
+# Add bot root to path
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+
+from utils import http_client
+
 # Configuration
 TELEGRAM_URL = "https://t.me/nft"
 
@@ -19,80 +25,79 @@ async def get_gift_metadata(gift_name, item_id):
     url = f"{TELEGRAM_URL}/{gift_name}-{item_id}"
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers={
-                'Accept': 'text/html',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }) as response:
-                if response.ok:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    # Extract attributes from HTML table
-                    attributes = {}
-                    
-                    # Try to extract from table rows
-                    table = soup.find('table')
-                    owner_username = None
-                    owner_name = None
-                    
-                    if table:
-                        rows = table.find_all('tr')
-                        for row in rows:
-                            cells = row.find_all(['td', 'th'])
-                            if len(cells) >= 2:
-                                trait_type = cells[0].get_text(strip=True)
-                                value = cells[1].get_text(strip=True)
-                                
-                                # Special handling for Owner row: extract username from link
-                                if trait_type == 'Owner':
-                                    owner_link = cells[1].find('a')
-                                    if owner_link and 'href' in owner_link.attrs:
-                                        href = owner_link['href']
-                                        # Extract username from URL like "https://t.me/armpit_juice"
-                                        username_match = re.search(r'/t\.me/([^/?]+)', href)
-                                        if username_match:
-                                            owner_username = username_match.group(1)
-                                    # Get display name (text inside the row)
-                                    owner_name = value
-                                elif trait_type and value and trait_type not in ['Owner', 'Portal']:
-                                    attributes[trait_type] = value
-                    
-                    # Parse specific attributes and clean up (remove percentages)
-                    model_raw = attributes.get('Model', '')
-                    backdrop_raw = attributes.get('Backdrop', '')
-                    symbol_raw = attributes.get('Symbol', '')
-                    quantity = attributes.get('Quantity', None)
-                    
-                    # Extract just the name part (remove percentage)
-                    # Handle cases like "Sunflower 0.3%" -> "Sunflower"
-                    model = re.sub(r'\s*\d+\.?\d*\s*%?$', '', model_raw).strip() if model_raw else None
-                    backdrop = re.sub(r'\s*\d+\.?\d*\s*%?$', '', backdrop_raw).strip() if backdrop_raw else None
-                    symbol = re.sub(r'\s*\d+\.?\d*\s*%?$', '', symbol_raw).strip() if symbol_raw else None
-                    
-                    result = {
-                        "success": True,
-                        "gift_name": gift_name,
-                        "item_id": item_id,
-                        "model": model,
-                        "backdrop": backdrop,
-                        "symbol": symbol,
-                        "quantity": quantity,
-                        "owner_username": owner_username,
-                        "owner_name": owner_name,
-                        "attributes": attributes
-                    }
-                    
-                    print(json.dumps(result))
-                    return result
-                else:
-                    error = {
-                        "success": False,
-                        "error": f"HTTP {response.status}: Could not fetch gift metadata"
-                    }
-                    print(json.dumps(error))
-                    return error
-                    
+        response = await http_client.get(url, headers={
+            'Accept': 'text/html',
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        })
+        if response.ok:
+            html = response.text()
+            soup = BeautifulSoup(html, 'html.parser')
+            
+            # Extract attributes from HTML table
+            attributes = {}
+            
+            # Try to extract from table rows
+            table = soup.find('table')
+            owner_username = None
+            owner_name = None
+            
+            if table:
+                rows = table.find_all('tr')
+                for row in rows:
+                    cells = row.find_all(['td', 'th'])
+                    if len(cells) >= 2:
+                        trait_type = cells[0].get_text(strip=True)
+                        value = cells[1].get_text(strip=True)
+                        
+                        # Special handling for Owner row: extract username from link
+                        if trait_type == 'Owner':
+                            owner_link = cells[1].find('a')
+                            if owner_link and 'href' in owner_link.attrs:
+                                href = owner_link['href']
+                                # Extract username from URL like "https://t.me/armpit_juice"
+                                username_match = re.search(r'/t\.me/([^/?]+)', href)
+                                if username_match:
+                                    owner_username = username_match.group(1)
+                            # Get display name (text inside the row)
+                            owner_name = value
+                        elif trait_type and value and trait_type not in ['Owner', 'Portal']:
+                            attributes[trait_type] = value
+            
+            # Parse specific attributes and clean up (remove percentages)
+            model_raw = attributes.get('Model', '')
+            backdrop_raw = attributes.get('Backdrop', '')
+            symbol_raw = attributes.get('Symbol', '')
+            quantity = attributes.get('Quantity', None)
+            
+            # Extract just the name part (remove percentage)
+            # Handle cases like "Sunflower 0.3%" -> "Sunflower"
+            model = re.sub(r'\s*\d+\.?\d*\s*%?$', '', model_raw).strip() if model_raw else None
+            backdrop = re.sub(r'\s*\d+\.?\d*\s*%?$', '', backdrop_raw).strip() if backdrop_raw else None
+            symbol = re.sub(r'\s*\d+\.?\d*\s*%?$', '', symbol_raw).strip() if symbol_raw else None
+            
+            result = {
+                "success": True,
+                "gift_name": gift_name,
+                "item_id": item_id,
+                "model": model,
+                "backdrop": backdrop,
+                "symbol": symbol,
+                "quantity": quantity,
+                "owner_username": owner_username,
+                "owner_name": owner_name,
+                "attributes": attributes
+            }
+            
+            print(json.dumps(result))
+            return result
+        else:
+            error = {
+                "success": False,
+                "error": f"HTTP {response.status}: Could not fetch gift metadata"
+            }
+            print(json.dumps(error))
+            return error
+            
     except Exception as e:
         error = {
             "success": False,
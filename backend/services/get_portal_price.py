@@ -9,16 +9,11 @@ import json
 import argparse
 import os
 
-# CRITICAL: Patch timeout BEFORE importing aportalsmp functions
-# This increases timeout from 15s to 60s
-try:
-    import aportalsmp.handlers as handlers
-    _original_fetch = handlers.fetch
-    async def patched_fetch(method="GET", url="", headers=None, json=None, timeout=60, impersonate="chrome110"):
-        return await _original_fetch(method, url, headers, json, timeout, impersonate)
-    handlers.fetch = patched_fetch
-except:
-    pass  # If patching fails, continue anyway
+# CRITICAL: Patch fetch BEFORE importing aportalsmp functions
+# One persistent session with a 60s timeout instead of a new session per request
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import portal_session
+portal_session.install()
 
 # Import aportalsmp for Portal Market API
 try:
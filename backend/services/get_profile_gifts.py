@@ -10,6 +10,7 @@ import json
 import os
 import re
 import time
+import uuid
 from telethon import TelegramClient, types
 from telethon.tl.functions.payments import GetSavedStarGiftsRequest
 from telethon.errors import SessionPasswordNeededError, UsernameNotOccupiedError, PeerIdInvalidError, UsernameInvalidError
@@ -21,10 +22,17 @@ bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, bot_root)
 
 try:
-    from utils.get_portfolio_cache import get_cached_portfolio, set_cached_portfolio, set_fetching_status, is_fetching
+    from utils.get_portfolio_cache import (
+        get_cached_portfolio, set_cached_portfolio, set_fetching_status, is_fetching,
+        get_fresh_prices, gift_key
+    )
     CACHE_AVAILABLE = True
 except ImportError:
     CACHE_AVAILABLE = False
+    def gift_key(gift):
+        return gift.get('slug') or (f"id:{gift['gift_id']}" if gift.get('gift_id') is not None else None)
+
+from utils.gift_catalog import get_catalog
 
 # Use our working Portal Market API wrapper
 # This fixes all issues: correct domain, timeout, rate limiting
@@ -72,6 +80,57 @@ except ImportError:
     MULTI_ACCOUNT_AVAILABLE = False
     PORTAL_ACCOUNTS = []
 
+# Max seconds to keep refreshing stale cached prices after the result is printed
+STALE_REFRESH_TIMEOUT = 30
+
+# Work that outlives a request (stale price refreshes); the CLI drains it before exiting,
+# portfolio_service.py just lets it run on its event loop
+_background_tasks = set()
+
+def _track_background(task):
+    """Keep a reference to a background task until it finishes"""
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def drain_background_tasks(timeout=STALE_REFRESH_TIMEOUT):
+    """Wait (up to `timeout` seconds) for background work started by collect_profile_gifts()"""
+    if not _background_tasks:
+        return
+    done, pending = await asyncio.wait(list(_background_tasks), timeout=timeout)
+    for task in done:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Stale price refresh failed: {task.exception()}", file=sys.stderr)
+    if pending:
+        print(f"⚠️ Stale price refresh incomplete: {len(pending)} task(s) still running", file=sys.stderr)
+
+async def resolve_price_with_retry(resolver, gift_name, model, backdrop, max_retries=3, base_delay=0.5):
+    """Resolve a price with retry logic, exponential backoff, and network error handling
+    Returns the price, or None if Portal Market has no listing. Request failures are
+    retried and finally raised, so they are never mistaken for "no listing"."""
+    last_error = None
+    for attempt in range(max_retries):
+        try:
+            return await resolver.resolve(
+                gift_name=gift_name,
+                model=model if model else None,
+                backdrop=backdrop if backdrop else None
+            )
+        except Exception as e:
+            last_error = e
+            # Check if it's a rate limit error (429)
+            error_str = str(e).lower()
+            is_rate_limit = '429' in error_str or 'rate limit' in error_str or 'too many' in error_str
+            
+            if attempt < max_retries - 1:
+                # Exponential backoff: 0.5s, 1s, 2s
+                # Longer wait for rate limits
+                wait_time = (base_delay * 2 if is_rate_limit else base_delay) * (2 ** attempt)
+                await asyncio.sleep(wait_time)
+            else:
+                # Last attempt failed, log error
+                print(f"⚠️ Price fetch failed after {max_retries} attempts for {gift_name} (model: {model}, backdrop: {backdrop}): {last_error}", file=sys.stderr)
+    raise last_error
+
 async def fetch_all_gifts(client, peer):
     """Fetch all Star Gifts for a peer (pinned and unpinned) - from gifts/bot.py"""
     all_gifts = []
@@ -99,15 +158,8 @@ async def get_portal_market_price(slug, backdrop_name=None, model_name=None, sym
     
     # Use multi-account API wrapper (round-robin across 3 accounts)
     try:
-        # Import from same directory
-        import importlib.util
-        spec = importlib.util.spec_from_file_location(
-            "portal_market_multi_account",
-            os.path.join(os.path.dirname(__file__), "portal_market_multi_account.py")
-        )
-        multi_account_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(multi_account_module)
-        get_portal_market_price_multi = multi_account_module.get_portal_market_price_multi
+        # Regular import - the module (and its authenticated accounts) is loaded once per process
+        from services.portal_market_multi_account import get_portal_market_price_multi
         
         gifts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gifts')
         price = await get_portal_market_price_multi(
@@ -141,31 +193,53 @@ async def get_portal_market_price(slug, backdrop_name=None, model_name=None, sym
         # Silent - don't spam errors
         return None
 
-async def get_profile_gifts(user_id=None, return_cached=False, background_update=False):
+def summary_record(output):
+    """Last record of a streamed (NDJSON) portfolio: the result without the gift list"""
+    record = {"type": "summary" if output.get("success") else "error"}
+    record.update({k: v for k, v in output.items() if k != 'gifts'})
+    if 'gifts' in output:
+        record['priced'] = sum(1 for g in output['gifts'] if g.get('price') is not None)
+    return record
+
+def get_session_path():
+    """Telethon session used for profile gifts (from the gifts directory, where it actually works)"""
+    gifts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gifts')
+    return os.path.join(gifts_dir, f'{SESSION_NAME}.session')
+
+async def collect_profile_gifts(user_id=None, background_update=False, client=None, incremental=True, on_event=None):
     """
     Fetch saved Star Gifts for a Telegram user with Portal Market prices
     
     Args:
         user_id: Telegram user ID or username
-        return_cached: If True, return cached data immediately and start background update
         background_update: If True, update cache in background without blocking
+        client: Connected TelegramClient to reuse (portfolio_service.py); when None a
+            client is created for this call and disconnected afterwards
+        incremental: Diff against the cached portfolio (by slug / gift id) and only
+            price new gifts and gifts whose cached price has expired
+        on_event: Streaming callback; receives {"type": "gifts", ...} right after the
+            gift list is built, then {"type": "price", "index": i, ...} for each gift
+            as its price resolves, most valuable first
+    
+    Returns:
+        The JSON-ready result: {"success": True, "gifts": [...], ...} or
+        {"success": False, "error": "..."}
     """
-    # Use the session from gifts directory (where it actually works)
     gifts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gifts')
-    session_path = os.path.join(gifts_dir, f'{SESSION_NAME}.session')
-    
-    client = TelegramClient(session_path, API_ID, API_HASH)
+    owns_client = client is None
+    if owns_client:
+        client = TelegramClient(get_session_path(), API_ID, API_HASH)
     portal_auth_data = None
     
     try:
-        await client.connect()
+        if owns_client:
+            await client.connect()
         
         if not await client.is_user_authorized():
-            print(json.dumps({
+            return {
                 "success": False,
                 "error": "Not authenticated. Please configure Telethon session in gifts directory."
-            }))
-            sys.exit(1)
+            }
         
         # Mark as fetching if cache available
         if CACHE_AVAILABLE and not background_update:
@@ -194,23 +268,20 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                 target_user = entity
                 # Silent - no need to print user info to stderr
             except (UsernameNotOccupiedError, UsernameInvalidError):
-                print(json.dumps({
+                return {
                     "success": False,
                     "error": f"Username not found or invalid: {user_id}"
-                }))
-                sys.exit(1)
+                }
             except PeerIdInvalidError:
-                print(json.dumps({
+                return {
                     "success": False,
                     "error": f"User ID invalid, private, or blocked: {user_id}"
-                }))
-                sys.exit(1)
+                }
             except Exception as e:
-                print(json.dumps({
+                return {
                     "success": False,
                     "error": f"Could not find user {user_id}: {str(e)}"
-                }))
-                sys.exit(1)
+                }
         else:
             # Get the current user (session owner)
             target_user = await client.get_me()
@@ -219,65 +290,42 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
         # Fetch ALL saved gifts with pagination using the working method
         all_gifts, total_count = await fetch_all_gifts(client, target_user)
         
+        # Incremental refresh: prices from the cached portfolio that haven't expired yet
+        fresh_prices, cached_keys = {}, set()
+        if incremental and CACHE_AVAILABLE:
+            try:
+                fresh_prices, cached_keys = get_fresh_prices(getattr(target_user, 'id', None))
+            except Exception as e:
+                print(f"⚠️ Could not load cached portfolio prices: {e}", file=sys.stderr)
+        # gift_key -> price_updated_at of every price reused from the cache
+        reused_at = {}
+        
         # Fetch unupgradeable gift prices once at the start
         unupgradeable_prices = {}
-        unupgradeable_names = {}
-        try:
-            # Load Quant static data for names and supplies
-            quant_file = '/root/01studio/CollectibleKIT/mrktandquantomapi/quant/clean_unique_gifts.json'
-            with open(quant_file, 'r') as f:
-                quant_data = json.load(f)
-                for item in quant_data:
-                    gift_id = item.get('id')
-                    unupgradeable_names[gift_id] = {
-                        'name': item.get('full_name', item.get('short_name', 'Unknown')),
-                        'supply': item.get('supply', None)
-                    }
-        except Exception as e:
-            # Silently fail
-            pass
+        # Static catalog for names, supplies and fallback prices (parsed once per process)
+        catalog = get_catalog()
         
+        # Live unupgradeable prices are only needed for gifts without a fresh cached price
+        unupgradeable_keys = {
+            f"id:{sg.gift.id}" for sg in all_gifts
+            if not isinstance(sg.gift, types.StarGiftUnique) and getattr(sg.gift, 'upgrade_stars', None) is None
+        }
+        if unupgradeable_keys and unupgradeable_keys.issubset(fresh_prices):
+            for key in unupgradeable_keys:
+                unupgradeable_prices[key[len("id:"):]], reused_at[key] = fresh_prices[key]
         # Fetch unupgradeable prices using imported function with shared client
-        if UNUPGRADEABLE_PRICES_AVAILABLE:
+        elif UNUPGRADEABLE_PRICES_AVAILABLE and unupgradeable_keys:
             try:
                 unupgradeable_prices = await fetch_unupgradeable_prices(client)
             except Exception as e:
-                # Fallback to static file
-                try:
-                    quant_file = '/root/01studio/CollectibleKIT/mrktandquantomapi/quant/clean_unique_gifts.json'
-                    with open(quant_file, 'r') as f:
-                        quant_data = json.load(f)
-                        for item in quant_data:
-                            gift_id = item.get('id')
-                            floor_price = item.get('floor_price', '0')
-                            try:
-                                price = float(floor_price)
-                                if price > 0:
-                                    unupgradeable_prices[str(gift_id)] = price
-                            except:
-                                pass
-                except:
-                    pass
+                # Fall back to the static prices added below
+                print(f"⚠️ Live unupgradeable prices failed: {e}", file=sys.stderr)
         
         # Also load static prices to supplement live API data
-        try:
-            quant_file = '/root/01studio/CollectibleKIT/mrktandquantomapi/quant/clean_unique_gifts.json'
-            with open(quant_file, 'r') as f:
-                quant_data = json.load(f)
-                for item in quant_data:
-                    gift_id = item.get('id')
-                    floor_price = item.get('floor_price', '0')
-                    gift_id_str = str(gift_id)
-                    # Only add if not already present in live prices
-                    if gift_id_str not in unupgradeable_prices:
-                        try:
-                            price = float(floor_price)
-                            if price > 0:
-                                unupgradeable_prices[gift_id_str] = price
-                        except:
-                            pass
-        except:
-            pass
+        for gift_id_str, price in catalog.floor_prices.items():
+            # Only add if not already present in live prices
+            if gift_id_str not in unupgradeable_prices:
+                unupgradeable_prices[gift_id_str] = price
         
         # Process gifts and collect price requests for parallel fetching
         processed_gifts = []
@@ -391,10 +439,10 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                         gift_id_str = str(gift_id)
                         if gift_id_str in unupgradeable_prices:
                             price = unupgradeable_prices[gift_id_str]
-                        if gift_id_str in unupgradeable_names:
-                            gift_info = unupgradeable_names[gift_id_str]
-                            title = gift_info.get('name', 'N/A')
-                            total_supply_value = gift_info.get('supply')
+                        catalog_entry = catalog.get(gift_id_str)
+                        if catalog_entry:
+                            title = catalog_entry.name
+                            total_supply_value = catalog_entry.supply
                     
                     # For unupgraded gifts, collect price request for parallel fetching
                     if is_unupgraded and PORTAL_MARKET_API_AVAILABLE:
@@ -437,14 +485,48 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                 print(f"⚠️ Error processing gift: {e}", file=sys.stderr)
                 continue
         
+        # Reuse fresh cached prices; only new gifts and expired prices go to Portal Market
+        if fresh_prices:
+            pending_requests = []
+            for req in price_requests:
+                key = gift_key(processed_gifts[req['index']])
+                if key in fresh_prices:
+                    processed_gifts[req['index']]['price'], reused_at[key] = fresh_prices[key]
+                else:
+                    pending_requests.append(req)
+            current_keys = {gift_key(g) for g in processed_gifts} - {None}
+            print(f"🔁 Incremental refresh: {len(current_keys - cached_keys)} new, "
+                  f"{len(cached_keys - current_keys)} removed, {len(reused_at)} prices reused, "
+                  f"{len(pending_requests)} price requests left", file=sys.stderr)
+            price_requests = pending_requests
+        
+        # Streaming mode: the gift list goes out now, prices follow as they resolve
+        emitted_prices = set()
+        def emit_price(idx, price):
+            if on_event is not None and idx not in emitted_prices:
+                emitted_prices.add(idx)
+                on_event({"type": "price", "index": idx, "slug": processed_gifts[idx].get('slug'), "price": price})
+        if on_event is not None:
+            on_event({
+                "type": "gifts",
+                "gifts": processed_gifts,
+                "total": total_count,
+                "nft_count": len([g for g in processed_gifts if g.get('is_upgraded')]),
+                "pending_prices": len(price_requests) if PORTAL_MARKET_API_AVAILABLE else 0
+            })
+        
         # Fetch all prices in parallel batches (using 4 accounts with rate limiting)
         # Cache prices by (gift_name, model, backdrop) to avoid duplicate searches
         # Use global cache (shared across users) + local cache (this session)
         if price_requests and PORTAL_MARKET_API_AVAILABLE:
             try:
-                from portal_market_multi_account import get_multi_account_api
+                from services.portal_market_multi_account import get_multi_account_api
+                from services.portal_price_resolver import CollectionPriceResolver
                 try:
-                    from utils.global_price_cache import get_cached_price, set_cached_price, normalize_attr
+                    from utils.global_price_cache import (
+                        lookup_many, set_many, normalize_attr, get_metrics, STALE, NEGATIVE,
+                        acquire_leases, renew_leases, release_leases, wait_for_entries, LEASE_TTL
+                    )
                     GLOBAL_CACHE_AVAILABLE = True
                 except ImportError:
                     # Fallback if global cache not available
@@ -452,38 +534,66 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                         if attr is None:
                             return ""
                         return str(attr).strip().lower()
-                    def get_cached_price(*args):
-                        return None
-                    def set_cached_price(*args):
+                    def lookup_many(keys):
+                        return {}
+                    def set_many(items):
                         pass
+                    def get_metrics():
+                        return {}
+                    def acquire_leases(keys, owner):
+                        return set(keys)
+                    def renew_leases(keys, owner):
+                        return 0
+                    def release_leases(keys, owner):
+                        pass
+                    LEASE_TTL = 30
+                    async def wait_for_entries(keys, owner):
+                        return {}, list(keys)
+                    STALE, NEGATIVE = "stale", "negative"
                     GLOBAL_CACHE_AVAILABLE = False
                 
                 api = await get_multi_account_api(gifts_dir)
+                # Answers most prices from one filterFloors index per collection
+                resolver = CollectionPriceResolver(api)
                 
-                # Local price cache for this session: key = (gift_name, model, backdrop), value = price
-                price_cache = {}
+                # Prices fetched in this session, written to the global cache in one transaction
+                new_prices = []
                 
-                # Check global cache first (saves API calls across users)
+                # Check global cache first (saves API calls across users) - one bulk lookup
                 print(f"🔍 Checking global cache for {len(price_requests)} price requests...", file=sys.stderr)
-                global_cache_hits = 0
+                request_keys = []
+                key_indices = {}  # key: (gift_name, model, backdrop), value: indices of every gift with it
                 for req in price_requests:
                     collection_name = req['slug'].split('-')[0] if '-' in req['slug'] else req['slug']
-                    cached_price = get_cached_price(
-                        collection_name,
-                        req.get('model_name'),
-                        req.get('backdrop_name')
+                    request_key = (
+                        collection_name.lower().strip(),
+                        normalize_attr(req.get('model_name')),
+                        normalize_attr(req.get('backdrop_name'))
                     )
-                    if cached_price is not None:
-                        # Found in global cache, use it
-                        normalized_model = normalize_attr(req.get('model_name'))
-                        normalized_backdrop = normalize_attr(req.get('backdrop_name'))
-                        cache_key = (collection_name.lower().strip(), normalized_model, normalized_backdrop)
-                        price_cache[cache_key] = cached_price
-                        global_cache_hits += 1
+                    request_keys.append(request_key)
+                    key_indices.setdefault(request_key, []).append(req['index'])
+                cached_entries = lookup_many(set(request_keys))
+                # Local price cache for this session: key = (gift_name, model, backdrop), value = price
+                # Stale prices are served now and refreshed once the result is written
+                price_cache = {k: price for k, (price, state) in cached_entries.items() if state != NEGATIVE}
+                stale_keys = [k for k, (_, state) in cached_entries.items() if state == STALE]
+                # Combos recently found to have no listing - not re-queried until the negative entry expires
+                no_listing_keys = {k for k, (_, state) in cached_entries.items() if state == NEGATIVE}
+                global_cache_hits = sum(1 for cache_key in request_keys if cache_key in cached_entries)
                 
                 if global_cache_hits > 0:
                     print(f"✅ Found {global_cache_hits} prices in global cache (saved {global_cache_hits} API calls)", file=sys.stderr)
                 
+                def publish(keys):
+                    """Apply resolved prices to every gift sharing each key and stream them out"""
+                    for cache_key in keys:
+                        if cache_key in price_cache:
+                            for idx in key_indices.get(cache_key, ()):
+                                processed_gifts[idx]['price'] = price_cache[cache_key]
+                                emit_price(idx, price_cache[cache_key])
+                
+                publish(sorted(price_cache, key=price_cache.get, reverse=True))
+                
                 # Group requests by unique (gift_name, model, backdrop) combination
                 # Skip requests already in cache
                 unique_requests = {}  # key: (gift_name, model, backdrop), value: list of indices
@@ -500,7 +610,7 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                     )
                     
                     # Check if already in local cache (from global cache check)
-                    if cache_key not in price_cache:
+                    if cache_key not in price_cache and cache_key not in no_listing_keys:
                         if cache_key not in unique_requests:
                             unique_requests[cache_key] = []
                         unique_requests[cache_key].append(req['index'])
@@ -509,89 +619,127 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                 print(f"📊 Found {len(price_requests)} price requests, {len(unique_requests)} unique combinations to fetch ({len(price_requests) - len(requests_to_fetch)} already cached)", file=sys.stderr)
                 
                 # Fetch unique prices with retry logic and dynamic batch sizing
-                async def get_price_with_retry(api, gift_name, model, backdrop, max_retries=3):
-                    """Get price with retry logic, exponential backoff, and network error handling"""
-                    last_error = None
-                    for attempt in range(max_retries):
-                        try:
-                            price = await api.get_gift_price(
-                                gift_name=gift_name,
-                                model=model if model else None,
-                                backdrop=backdrop if backdrop else None
-                            )
-                            if price is not None:
-                                # Save to global cache
-                                set_cached_price(gift_name, model, backdrop, price)
-                                return price
-                        except Exception as e:
-                            last_error = e
-                            # Check if it's a rate limit error (429)
-                            error_str = str(e).lower()
-                            is_rate_limit = '429' in error_str or 'rate limit' in error_str or 'too many' in error_str
-                            
-                            if attempt < max_retries - 1:
-                                # Exponential backoff: 0.5s, 1s, 2s
-                                # Longer wait for rate limits
-                                base_wait = 1.0 if is_rate_limit else 0.5
-                                wait_time = base_wait * (2 ** attempt)
-                                await asyncio.sleep(wait_time)
-                            else:
-                                # Last attempt failed, log error
-                                print(f"⚠️ Price fetch failed after {max_retries} attempts for {gift_name} (model: {model}, backdrop: {backdrop}): {last_error}", file=sys.stderr)
-                    return None
+                async def get_price_with_retry(api, gift_name, model, backdrop):
+                    """Get a price; only a real "nothing listed" answer is negatively cached"""
+                    price = await resolve_price_with_retry(resolver, gift_name, model, backdrop)
+                    if price is None:
+                        # Portal Market answered with no listing - remember it briefly (negative cache entry)
+                        no_listing_keys.add((gift_name, model, backdrop))
+                    # Saved to global cache with the rest of the batch
+                    new_prices.append((gift_name, model, backdrop, price))
+                    return price
+                
+                async def refresh_stale_prices(keys, batch_size=4):
+                    """Re-fetch stale cached prices and write them back to the global cache"""
+                    refreshed = []
+                    for i in range(0, len(keys), batch_size):
+                        batch = keys[i:i+batch_size]
+                        results = await asyncio.gather(*[
+                            resolver.resolve(gift_name=gift_name, model=model or None, backdrop=backdrop or None)
+                            for gift_name, model, backdrop in batch
+                        ], return_exceptions=True)
+                        for (gift_name, model, backdrop), price in zip(batch, results):
+                            if isinstance(price, (int, float)):
+                                refreshed.append((gift_name, model, backdrop, price))
+                    set_many(refreshed)
+                    print(f"🔄 Refreshed {len(refreshed)}/{len(keys)} stale cached prices", file=sys.stderr)
                 
-                # Dynamic batch sizing: start with 4, adjust based on errors
-                batch_size = 4  # Start conservative
                 unique_keys = list(unique_requests.keys())
-                consecutive_errors = 0
                 
-                for i in range(0, len(unique_keys), batch_size):
-                    batch_keys = unique_keys[i:i+batch_size]
-                    
-                    # Create tasks for unique requests
-                    tasks = []
-                    for cache_key in batch_keys:
-                        gift_name, model, backdrop = cache_key
-                        task = get_price_with_retry(api, gift_name, model, backdrop)
-                        tasks.append((cache_key, task))
-                    
-                    # Execute batch in parallel
-                    results = await asyncio.gather(*[task for _, task in tasks], return_exceptions=True)
-                    
-                    # Store results in cache and track errors
-                    batch_errors = 0
-                    batch_successes = 0
-                    for (cache_key, _), price_result in zip(tasks, results):
-                        if not isinstance(price_result, Exception) and price_result is not None:
-                            price_cache[cache_key] = price_result
-                            batch_successes += 1
-                        elif isinstance(price_result, Exception):
-                            # Log exception
-                            error_str = str(price_result).lower()
-                            is_rate_limit = '429' in error_str or 'rate limit' in error_str
-                            if is_rate_limit:
-                                print(f"⚠️ Rate limit hit for {cache_key[0]}, reducing batch size", file=sys.stderr)
-                            batch_errors += 1
+                # Load model/backdrop floor indexes for all collections up front
+                if unique_keys:
+                    await resolver.prefetch(cache_key[0] for cache_key in unique_keys)
+                # Highest expected value first, so the most valuable gifts are priced (and streamed) first
+                unique_keys.sort(key=lambda k: resolver.estimate(*k) * len(unique_requests[k]), reverse=True)
+                
+                async def fetch_in_batches(keys):
+                    """Fetch prices in parallel batches with dynamic batch sizing"""
+                    # Dynamic batch sizing: start with 4, adjust based on errors
+                    batch_size = 4  # Start conservative
+                    consecutive_errors = 0
                     
-                    # Dynamic batch sizing: adjust based on errors
-                    if batch_errors > batch_successes:
-                        # More errors than successes, reduce batch size
-                        consecutive_errors += 1
-                        if consecutive_errors >= 2 and batch_size > 2:
-                            batch_size = max(2, batch_size - 1)
-                            print(f"📉 Reducing batch size to {batch_size} due to errors", file=sys.stderr)
-                    else:
-                        # Success, can try increasing batch size
-                        consecutive_errors = 0
-                        if batch_size < 8 and i > 0 and (i // batch_size) % 3 == 0:
-                            # Gradually increase if stable
-                            batch_size = min(8, batch_size + 1)
-                            print(f"📈 Increasing batch size to {batch_size} (stable)", file=sys.stderr)
+                    # Walk the keys by position: batch_size changes between batches
+                    i = 0
+                    renewed_at = time.time()
+                    while i < len(keys):
+                        batch_keys = keys[i:i+batch_size]
+                        
+                        # Keep the leases on the keys still to fetch alive past LEASE_TTL
+                        if time.time() - renewed_at > LEASE_TTL / 3:
+                            renew_leases(keys[i:], lease_owner)
+                            renewed_at = time.time()
+                        
+                        # Create tasks for unique requests
+                        tasks = []
+                        for cache_key in batch_keys:
+                            gift_name, model, backdrop = cache_key
+                            task = get_price_with_retry(api, gift_name, model, backdrop)
+                            tasks.append((cache_key, task))
+                        
+                        # Execute batch in parallel
+                        results = await asyncio.gather(*[task for _, task in tasks], return_exceptions=True)
+                        
+                        # Store results in cache and track errors
+                        batch_errors = 0
+                        batch_successes = 0
+                        for (cache_key, _), price_result in zip(tasks, results):
+                            if not isinstance(price_result, Exception) and price_result is not None:
+                                price_cache[cache_key] = price_result
+                                batch_successes += 1
+                            elif isinstance(price_result, Exception):
+                                # Log exception
+                                error_str = str(price_result).lower()
+                                is_rate_limit = '429' in error_str or 'rate limit' in error_str
+                                if is_rate_limit:
+                                    print(f"⚠️ Rate limit hit for {cache_key[0]}, reducing batch size", file=sys.stderr)
+                                batch_errors += 1
+                        
+                        publish(batch_keys)
+                        
+                        # Publish this batch right away - other processes may be waiting on these keys
+                        if new_prices:
+                            set_many(new_prices)
+                            new_prices.clear()
+                        
+                        # Dynamic batch sizing: adjust based on errors
+                        if batch_errors > batch_successes:
+                            # More errors than successes, reduce batch size
+                            consecutive_errors += 1
+                            if consecutive_errors >= 2 and batch_size > 2:
+                                batch_size = max(2, batch_size - 1)
+                                print(f"📉 Reducing batch size to {batch_size} due to errors", file=sys.stderr)
+                        else:
+                            # Success, can try increasing batch size
+                            consecutive_errors = 0
+                            if batch_size < 8 and i > 0 and (i // batch_size) % 3 == 0:
+                                # Gradually increase if stable
+                                batch_size = min(8, batch_size + 1)
+                                print(f"📈 Increasing batch size to {batch_size} (stable)", file=sys.stderr)
+                        i += len(batch_keys)
                     
-                    # Adaptive delay between batches based on errors
-                    delay = 0.5 if batch_errors > 0 else 0.3
-                    if i + batch_size < len(unique_keys):
-                        await asyncio.sleep(delay)
+                # Lease keys across processes: concurrent portfolio loads fetch each key once,
+                # the others wait for it to land in the global cache
+                lease_owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+                leased_keys = acquire_leases(unique_keys, lease_owner)
+                waiting_keys = [k for k in unique_keys if k not in leased_keys]
+                wait_task = None
+                if waiting_keys:
+                    print(f"⏳ {len(waiting_keys)} prices are being fetched by another request, waiting for them", file=sys.stderr)
+                    wait_task = asyncio.ensure_future(wait_for_entries(waiting_keys, lease_owner))
+                try:
+                    await fetch_in_batches([k for k in unique_keys if k in leased_keys])
+                    if wait_task is not None:
+                        shared_entries, unresolved_keys = await wait_task
+                        for cache_key, (price, state) in shared_entries.items():
+                            if state == NEGATIVE:
+                                no_listing_keys.add(cache_key)
+                            else:
+                                price_cache[cache_key] = price
+                        publish(shared_entries)
+                        if unresolved_keys:
+                            await fetch_in_batches(unresolved_keys)
+                finally:
+                    release_leases(leased_keys, lease_owner)
                 
                 # Apply cached prices to all gifts with matching attributes
                 # Use normalized keys for matching
@@ -610,14 +758,17 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                         idx = req['index']
                         if idx < len(processed_gifts):
                             processed_gifts[idx]['price'] = price
+                            emit_price(idx, price)
                     else:
                         # Price not found, try sequential fallback with retry
+                        # (skipped for combos already known to have no listing)
                         idx = req['index']
+                        if cache_key in no_listing_keys:
+                            continue
                         if idx < len(processed_gifts) and processed_gifts[idx].get('price') is None:
                             try:
-                                from portal_market_multi_account import get_portal_market_price_multi
-                                # Try sequential fetch with small delay
-                                await asyncio.sleep(0.2)
+                                from services.portal_market_multi_account import get_portal_market_price_multi
+                                # Try sequential fetch (paced by the shared rate limiter)
                                 price = await get_portal_market_price_multi(
                                     slug=req['slug'],
                                     backdrop_name=req.get('backdrop_name'),
@@ -626,12 +777,27 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                                 )
                                 if price is not None:
                                     processed_gifts[idx]['price'] = price
+                                    emit_price(idx, price)
                                     # Cache it for future use (both local and global)
                                     price_cache[cache_key] = price
-                                    set_cached_price(collection_name, req.get('model_name'), req.get('backdrop_name'), price)
+                                    new_prices.append((*cache_key, price))
                             except Exception as e:
                                 print(f"⚠️ Sequential fallback failed for {req['slug']}: {e}", file=sys.stderr)
                 
+                # Save all newly fetched prices to the global cache in one transaction
+                if new_prices:
+                    set_many(new_prices)
+                
+                # Refresh stale prices in the background while the result is assembled and written
+                if stale_keys:
+                    _track_background(asyncio.ensure_future(refresh_stale_prices(stale_keys)))
+                print(f"📊 Price cache metrics: {get_metrics()}", file=sys.stderr)
+                try:
+                    from services.portal_market_api import get_rate_limits
+                    print(f"📊 Portal request rates: {get_rate_limits()}", file=sys.stderr)
+                except ImportError:
+                    pass
+                
                 # Log final statistics
                 prices_fetched = sum(1 for g in processed_gifts if g.get('price') is not None)
                 total_gifts = len(processed_gifts)
@@ -640,7 +806,7 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                 # If parallel fetching fails, try sequential fallback
                 print(f"⚠️ Parallel fetching failed, using sequential fallback: {e}", file=sys.stderr)
                 try:
-                    from portal_market_multi_account import get_portal_market_price_multi
+                    from services.portal_market_multi_account import get_portal_market_price_multi
                     for req in price_requests:
                         try:
                             price = await get_portal_market_price_multi(
@@ -652,13 +818,18 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
                             )
                             if price is not None and req['index'] < len(processed_gifts):
                                 processed_gifts[req['index']]['price'] = price
-                            # Small delay to avoid rate limiting
-                            await asyncio.sleep(0.2)
+                                emit_price(req['index'], price)
                         except Exception:
                             pass
                 except Exception:
                     pass
         
+        # Stamp prices so the next incremental refresh knows when they expire
+        priced_at = int(time.time() * 1000)
+        for gift_data in processed_gifts:
+            if gift_data.get('price') is not None:
+                gift_data['price_updated_at'] = reused_at.get(gift_key(gift_data), priced_at)
+        
         # Calculate total value
         total_value = sum(gift.get('price', 0) or 0 for gift in processed_gifts)
         
@@ -682,16 +853,44 @@ async def get_profile_gifts(user_id=None, return_cached=False, background_update
             "total_value": total_value
         }
         
-        print(json.dumps(output))
+        return output
         
     except Exception as e:
-        print(json.dumps({
+        return {
             "success": False,
             "error": str(e)
-        }))
-        sys.exit(1)
+        }
     finally:
-        await client.disconnect()
+        if owns_client:
+            await client.disconnect()
+
+async def get_profile_gifts(user_id=None, return_cached=False, background_update=False, incremental=True, stream=False):
+    """
+    Fetch saved Star Gifts for a Telegram user and print them as JSON (CLI entry point)
+    
+    Args:
+        user_id: Telegram user ID or username
+        return_cached: If True, return cached data immediately and start background update
+        background_update: If True, update cache in background without blocking
+        incremental: Only re-price new gifts and expired prices (see collect_profile_gifts)
+        stream: Print NDJSON instead of one document: the gift list, then price
+            updates as they resolve, then a summary record
+    """
+    if stream:
+        def write_record(record):
+            print(json.dumps(record), flush=True)
+        output = await collect_profile_gifts(user_id, background_update=background_update,
+                                             incremental=incremental, on_event=write_record)
+        write_record(summary_record(output))
+    else:
+        output = await collect_profile_gifts(user_id, background_update=background_update, incremental=incremental)
+        print(json.dumps(output))
+    if not output.get("success"):
+        sys.exit(1)
+    
+    # Let the stale price refresh finish after the result has been written
+    sys.stdout.flush()
+    await drain_background_tasks()
 
 async def update_portfolio_background(user_id):
     """Background task to update portfolio cache"""
@@ -704,9 +903,10 @@ if __name__ == "__main__":
     # Get user_id from command line if provided
     user_id = None
     return_cached = False
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
     
-    if len(sys.argv) > 1:
-        user_input = sys.argv[1]
+    if args:
+        user_input = args[0]
         try:
             # Try to parse as integer ID
             user_id = int(user_input)
@@ -718,4 +918,28 @@ if __name__ == "__main__":
     if '--cached' in sys.argv:
         return_cached = True
     
-    asyncio.run(get_profile_gifts(user_id, return_cached=return_cached))
+    # --full re-prices every gift instead of only new gifts and expired prices
+    incremental = '--full' not in sys.argv
+    # --stream prints NDJSON records as prices resolve
+    stream = '--stream' in sys.argv
+    
+    # Thin client: let the resident portfolio service answer when it is running
+    from services.portfolio_client import request_service, stream_service
+    params = {'user': user_id} if user_id is not None else {}
+    if not incremental:
+        params['full'] = 1
+    if stream:
+        records = stream_service('/profile-gifts', params)
+        if records is not None:
+            success = False
+            for record in records:
+                print(json.dumps(record), flush=True)
+                success = record.get("type") == "summary"
+            sys.exit(0 if success else 1)
+    else:
+        service_output = request_service('/profile-gifts', params)
+        if service_output is not None:
+            print(json.dumps(service_output))
+            sys.exit(0 if service_output.get("success") else 1)
+    
+    asyncio.run(get_profile_gifts(user_id, return_cached=return_cached, incremental=incremental, stream=stream))
@@ -6,12 +6,18 @@ Standalone script that returns JSON - can be called from Next.js API route
 import os
 import sys
 import json
-import requests
 import logging
 import asyncio
+import sqlite3
+import time
 import urllib.parse
 from telethon import TelegramClient, functions
 
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+from utils import http_client, token_vault
+from utils.db_paths import SHARED_DB_PATH
+
 # Disable logging for cleaner output when called from API
 logging.basicConfig(level=logging.ERROR)
 
@@ -25,9 +31,21 @@ API_ID = 22307634
 API_HASH = '7ab906fc6d065a2047a84411c1697593'
 SESSION_NAME = 'gifts_session'  # Use authorized user session
 
+# Seconds a Stickerdom JWT is reused from the token vault (capped by the JWT's own expiry)
+STICKERDOM_TOKEN_TTL = 86400
+
+# Seconds the indexed stickers.tools prices are reused (in-process and across runs)
+PRICING_CACHE_TTL = float(os.getenv("STICKER_PRICING_TTL", "300"))
+
+# Stored with the other price caches in the shared bot database
+PRICING_CACHE_DB = SHARED_DB_PATH
+
 # Global variables for auth
 current_jwt_token = None
-pricing_data = None
+
+# Collection name -> character name -> (init_price_usd, floor_usd), both names lower-cased
+pricing_index = None
+pricing_index_at = 0.0
 
 async def get_webview_url(client: TelegramClient) -> dict:
     """Get webview URL using Telethon"""
@@ -110,7 +128,7 @@ async def get_fresh_init_data() -> str:
         if client:
             await client.disconnect()
 
-def get_jwt_token(init_data: str) -> str:
+async def get_jwt_token(init_data: str) -> str:
     """Get JWT token from initData"""
     try:
         headers = {
@@ -119,12 +137,12 @@ def get_jwt_token(init_data: str) -> str:
         }
         
         print(f"DEBUG: Sending initData to auth API (length: {len(init_data)})", file=sys.stderr)
-        # Try decoded format first - requests handles UTF-8 encoding automatically
-        response = requests.post(f"{API_BASE}/api/v1/auth", headers=headers, data=init_data, timeout=15)
+        # Try decoded format first (sent as UTF-8)
+        response = await http_client.post(f"{API_BASE}/api/v1/auth", headers=headers, data=init_data.encode('utf-8'), timeout=15)
         
-        print(f"DEBUG: Auth response status: {response.status_code}", file=sys.stderr)
+        print(f"DEBUG: Auth response status: {response.status}", file=sys.stderr)
         
-        if response.status_code == 200:
+        if response.status == 200:
             data = response.json()
             if data.get('ok') and data.get('data'):
                 return data['data']
@@ -133,8 +151,8 @@ def get_jwt_token(init_data: str) -> str:
                 # Try URL-encoded version
                 print(f"DEBUG: Trying URL-encoded format", file=sys.stderr)
                 encoded_init = urllib.parse.quote(init_data, safe='=&')
-                response2 = requests.post(f"{API_BASE}/api/v1/auth", headers=headers, data=encoded_init, timeout=15)
-                if response2.status_code == 200:
+                response2 = await http_client.post(f"{API_BASE}/api/v1/auth", headers=headers, data=encoded_init.encode('utf-8'), timeout=15)
+                if response2.status == 200:
                     data2 = response2.json()
                     print(f"DEBUG: URL-encoded format response: {data2}", file=sys.stderr)
                     if data2.get('ok') and data2.get('data'):
@@ -146,7 +164,19 @@ def get_jwt_token(init_data: str) -> str:
         print(f"ERROR: Auth failed: {e}", file=sys.stderr)
         return None
 
-def get_user_portfolio(user_id: str) -> dict:
+async def stickerdom_login() -> str:
+    """initData (MANUAL_INIT_DATA or a fresh webview) -> Stickerdom JWT"""
+    # Try to get initData from environment first (manual override)
+    init_data = os.getenv('MANUAL_INIT_DATA')
+    if init_data:
+        print(f"DEBUG: Using MANUAL_INIT_DATA from environment", file=sys.stderr)
+    else:
+        init_data = await get_fresh_init_data()
+    if not init_data:
+        return None
+    return await get_jwt_token(init_data)
+
+async def get_user_portfolio(user_id: str) -> dict:
     """Get user portfolio from API"""
     global current_jwt_token
     
@@ -161,11 +191,14 @@ def get_user_portfolio(user_id: str) -> dict:
         }
         
         print(f"DEBUG: Requesting profile for user {user_id}", file=sys.stderr)
-        response = requests.get(f"{API_BASE}/api/v1/user/{user_id}/profile", headers=headers, timeout=15)
+        response = await http_client.get(f"{API_BASE}/api/v1/user/{user_id}/profile", headers=headers, timeout=15)
         
-        print(f"DEBUG: Profile response status: {response.status_code}", file=sys.stderr)
+        print(f"DEBUG: Profile response status: {response.status}", file=sys.stderr)
         
-        if response.status_code == 200:
+        if response.status == 401:
+            # JWT rejected - the next run logs in again
+            token_vault.invalidate('stickerdom')
+        elif response.status == 200:
             data = response.json()
             if data.get('ok'):
                 profile = data.get('data')
@@ -173,26 +206,24 @@ def get_user_portfolio(user_id: str) -> dict:
             else:
                 print(f"DEBUG: API returned ok=False: {data}", file=sys.stderr)
         else:
-            print(f"DEBUG: API error response: {response.text[:500]}", file=sys.stderr)
+            print(f"DEBUG: API error response: {response.text()[:500]}", file=sys.stderr)
         
         return None
     except Exception as e:
         print(f"ERROR: Profile request failed: {e}", file=sys.stderr)
         return None
 
-def get_pricing_data():
+async def get_pricing_data():
     """Get pricing data from stickers.tools"""
-    global pricing_data
-    
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0',
             'Accept': 'application/json',
         }
         
-        response = requests.get(PRICING_API, headers=headers, timeout=30)
+        response = await http_client.get(PRICING_API, headers=headers, timeout=30)
         
-        if response.status_code == 200:
+        if response.status == 200:
             return response.json()
         
         return None
@@ -200,16 +231,98 @@ def get_pricing_data():
         print(f"ERROR: Pricing request failed: {e}", file=sys.stderr)
         return None
 
-def calculate_portfolio_value(profile_data: dict) -> dict:
-    """Calculate portfolio value"""
-    global pricing_data
+def index_pricing_data(data: dict) -> dict:
+    """
+    Index a stickers.tools payload by name
+    
+    Args:
+        data: stats-new response
     
-    if not pricing_data:
-        pricing_data = get_pricing_data()
+    Returns:
+        Collection name -> character name -> (init_price_usd, floor_usd), names lower-cased
+        (the first sticker with a given name in a collection wins)
+    """
+    index = {}
+    for coll_pricing in (data.get('collections') or {}).values():
+        stickers = index.setdefault((coll_pricing.get('name') or '').lower(), {})
+        for sticker_data in (coll_pricing.get('stickers') or {}).values():
+            floor = (((sticker_data.get('current') or {}).get('price') or {}).get('floor') or {})
+            stickers.setdefault(
+                (sticker_data.get('name') or '').lower(),
+                (sticker_data.get('init_price_usd', 0), floor.get('usd', 0))
+            )
+    return index
+
+def _load_pricing_index():
+    """(fetched_at, index) stored by an earlier run, or None"""
+    try:
+        conn = sqlite3.connect(PRICING_CACHE_DB, timeout=10)
+        try:
+            row = conn.execute("SELECT fetched_at, data FROM sticker_pricing_cache WHERE id = 1").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if not row:
+        return None
+    try:
+        return row[0], json.loads(row[1])
+    except ValueError:
+        return None
+
+def _save_pricing_index(fetched_at: float, index: dict):
+    try:
+        conn = sqlite3.connect(PRICING_CACHE_DB, timeout=10)
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS sticker_pricing_cache (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        fetched_at REAL NOT NULL,
+                        data TEXT NOT NULL
+                    )
+                """)
+                conn.execute(
+                    "INSERT OR REPLACE INTO sticker_pricing_cache (id, fetched_at, data) VALUES (1, ?, ?)",
+                    (fetched_at, json.dumps(index, separators=(',', ':')))
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not store sticker pricing: {e}", file=sys.stderr)
+
+async def get_pricing_index():
+    """
+    Get the indexed stickers.tools prices, fetching them at most once per PRICING_CACHE_TTL
+    
+    Returns:
+        Index from index_pricing_data (a stale one if stickers.tools is unreachable), or None
+    """
+    global pricing_index, pricing_index_at
     
+    now = time.time()
+    if pricing_index is not None and now - pricing_index_at < PRICING_CACHE_TTL:
+        return pricing_index
+    
+    stored = await asyncio.to_thread(_load_pricing_index)
+    if stored and now - stored[0] < PRICING_CACHE_TTL:
+        pricing_index_at, pricing_index = stored
+        return pricing_index
+    
+    data = await get_pricing_data()
+    if data:
+        pricing_index, pricing_index_at = index_pricing_data(data), now
+        await asyncio.to_thread(_save_pricing_index, now, pricing_index)
+    elif pricing_index is None and stored:
+        print("DEBUG: stickers.tools unavailable, using stored prices", file=sys.stderr)
+        pricing_index_at, pricing_index = stored
+    return pricing_index
+
+def calculate_portfolio_value(profile_data: dict) -> dict:
+    """Calculate portfolio value (pricing_index is loaded by main alongside the profile)"""
     # If pricing fails, we still want to return the portfolio with 0 prices
     # rather than returning None and showing nothing to the user
-    use_pricing = pricing_data is not None
+    use_pricing = pricing_index is not None
     
     try:
         meta = profile_data.get('meta', {})
@@ -233,8 +346,6 @@ def calculate_portfolio_value(profile_data: dict) -> dict:
             }
         }
         
-        collections_pricing = pricing_data.get('collections', {}) if pricing_data else {}
-        
         for collection in collections:
             coll_info = collection.get('collection', {})
             coll_name = coll_info.get('title', 'Unknown')
@@ -252,12 +363,7 @@ def calculate_portfolio_value(profile_data: dict) -> dict:
             }
             
             # Find matching collection in pricing (if available)
-            matching_coll_id = None
-            if use_pricing:
-                for coll_id, coll_pricing in collections_pricing.items():
-                    if coll_pricing.get('name', '').lower() == coll_name.lower():
-                        matching_coll_id = coll_id
-                        break
+            coll_prices = pricing_index.get(coll_name.lower()) if use_pricing else None
             
             # Process characters (with or without pricing)
             for character in characters:
@@ -271,13 +377,8 @@ def calculate_portfolio_value(profile_data: dict) -> dict:
                     init_price = 0
                     current_price = 0
                     
-                    if matching_coll_id:
-                        stickers_pricing = collections_pricing[matching_coll_id].get('stickers', {})
-                        for sticker_id, sticker_data in stickers_pricing.items():
-                            if sticker_data.get('name', '').lower() == char_name.lower():
-                                init_price = sticker_data.get('init_price_usd', 0)
-                                current_price = sticker_data.get('current', {}).get('price', {}).get('floor', {}).get('usd', 0)
-                                break
+                    if coll_prices:
+                        init_price, current_price = coll_prices.get(char_name.lower(), (0, 0))
                     
                     coll_data['nfts'] += 1
                     coll_data['stickers'] += sticker_count
@@ -335,36 +436,9 @@ async def main():
     
     user_id = sys.argv[1]
     
-    # Try to get initData from environment first (manual override)
-    import os
-    init_data = os.getenv('MANUAL_INIT_DATA')
-    if init_data:
-        print(f"DEBUG: Using MANUAL_INIT_DATA from environment", file=sys.stderr)
-    else:
-        # Get fresh initData and JWT token
-        init_data = await get_fresh_init_data()
-    
-    if not init_data:
-        # Return empty data if auth fails (requires user session to be set up)
-        print(json.dumps({
-            'success': True,
-            'stickers': [],
-            'portfolio_value': {
-                'collections': [],
-                'total_init': 0,
-                'total_current': 0,
-                'total_pnl': 0
-            },
-            'profile': {
-                'user': {'id': user_id, 'name': 'Unknown', 'username': 'N/A'},
-                'total_nfts': 0,
-                'total_stickers': 0
-            }
-        }), flush=True)
-        return
-    
+    # JWT from the token vault - the webview and auth round trips only run when it is missing or expired
     global current_jwt_token
-    current_jwt_token = get_jwt_token(init_data)
+    current_jwt_token = await token_vault.get_token('stickerdom', stickerdom_login, STICKERDOM_TOKEN_TTL)
     if not current_jwt_token:
         print("DEBUG: JWT token auth failed", file=sys.stderr)
         # Return empty data if auth fails
@@ -387,8 +461,8 @@ async def main():
     
     print(f"DEBUG: JWT token obtained: {current_jwt_token[:50]}...", file=sys.stderr)
     
-    # Get user portfolio
-    profile_data = get_user_portfolio(user_id)
+    # Get user portfolio and stickers.tools prices concurrently
+    profile_data, _ = await asyncio.gather(get_user_portfolio(user_id), get_pricing_index())
     if not profile_data:
         print(f"DEBUG: No profile data returned for user {user_id}", file=sys.stderr)
         # Return empty data if profile fetch fails
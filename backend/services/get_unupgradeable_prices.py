@@ -2,17 +2,26 @@
 """
 Get prices for unupgradeable gifts from MRKT and Quant APIs
 With 1-hour cache fallback for when gifts aren't listed
+Both marketplaces are fetched concurrently without blocking the event loop;
+if one fails or times out, the other's prices (plus the cache) are still used.
 """
 
 import sys
 import json
-import requests
 import asyncio
 import urllib.parse
 import os
+import sqlite3
+import threading
 import time
 from telethon import TelegramClient, functions
 
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+from utils.gift_catalog import get_catalog
+from utils import http_client, token_vault
+from utils.db_paths import SHARED_DB_PATH
+
 # Use same credentials as other scripts
 API_ID = 22307634
 API_HASH = '7ab906fc6d065a2047a84411c1697593'
@@ -36,27 +45,113 @@ MRKT_ONLY_IDS = [
     "6003477390536213997",  # Durov's Figurine
 ]
 
-# Cache file for prices (1 hour TTL)
-CACHE_FILE = '/root/01studio/CollectibleKIT/bot/unupgradeable_prices_cache.json'
+# Price cache (1 hour TTL), one row per gift in the shared bot database
+CACHE_DB_PATH = SHARED_DB_PATH
 CACHE_TTL = 3600  # 1 hour in seconds
 
+# Previous JSON cache file, imported once into the table
+CACHE_FILE = '/root/01studio/CollectibleKIT/bot/unupgradeable_prices_cache.json'
+
+# Seconds the in-process copy of the cache is served before re-reading the table
+MEMORY_CACHE_TTL = 30
+
+# Seconds per HTTP request, and per marketplace (webview + auth + price list)
+HTTP_TIMEOUT = 15
+MARKET_FETCH_TIMEOUT = float(os.getenv("UNUPGRADEABLE_FETCH_TIMEOUT", "40"))
+
+# Seconds marketplace credentials are reused from the token vault
+MRKT_TOKEN_TTL = 86400  # capped by the JWT's own expiry
+QUANT_INIT_DATA_TTL = 3600
+
+# One connection per process, opened lazily; plus the in-process copy of the table
+_cache_conn = None
+_cache_lock = threading.Lock()
+_memory_cache = {}
+_memory_loaded_at = 0.0
+
+def _get_cache_connection():
+    """Return the cache connection (caller must hold _cache_lock)"""
+    global _cache_conn
+    if _cache_conn is None:
+        conn = sqlite3.connect(CACHE_DB_PATH, timeout=30, check_same_thread=False)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS unupgradeable_price_cache (
+                gift_id TEXT PRIMARY KEY,
+                price REAL NOT NULL,
+                timestamp REAL NOT NULL,
+                source TEXT
+            )
+        """)
+        conn.commit()
+        _import_legacy_cache(conn)
+        _cache_conn = conn
+    return _cache_conn
+
+def _import_legacy_cache(conn):
+    """Move entries from the old JSON cache file into an empty table"""
+    if not os.path.exists(CACHE_FILE) or conn.execute("SELECT 1 FROM unupgradeable_price_cache LIMIT 1").fetchone():
+        return
+    try:
+        with open(CACHE_FILE, 'r') as f:
+            legacy = json.load(f)
+        _upsert(conn, legacy)
+    except Exception as e:
+        print(f"DEBUG: Failed to import legacy cache: {e}", file=sys.stderr)
+
+def _upsert(conn, entries):
+    rows = [
+        (str(gift_id), float(entry['price']), float(entry.get('timestamp', 0)), entry.get('source'))
+        for gift_id, entry in entries.items()
+        if entry and entry.get('price')
+    ]
+    with conn:
+        # Never replace a newer price written by a concurrent run
+        conn.executemany("""
+            INSERT INTO unupgradeable_price_cache (gift_id, price, timestamp, source)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(gift_id) DO UPDATE SET
+                price = excluded.price, timestamp = excluded.timestamp, source = excluded.source
+            WHERE excluded.timestamp >= unupgradeable_price_cache.timestamp
+        """, rows)
+
 def load_cache():
-    """Load price cache from file"""
+    """
+    Load the price cache
+
+    Returns:
+        {gift_id: {'price', 'timestamp', 'source'}} for entries still within CACHE_TTL
+        (shared in-process copy - don't modify)
+    """
+    global _memory_cache, _memory_loaded_at
+    now = time.time()
+    if now - _memory_loaded_at < MEMORY_CACHE_TTL:
+        return _memory_cache
     try:
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, 'r') as f:
-                return json.load(f)
+        with _cache_lock:
+            rows = _get_cache_connection().execute("""
+                SELECT gift_id, price, timestamp, source FROM unupgradeable_price_cache WHERE timestamp > ?
+            """, (now - CACHE_TTL,)).fetchall()
     except Exception as e:
         print(f"DEBUG: Failed to load cache: {e}", file=sys.stderr)
-    return {}
+        return _memory_cache
+    _memory_cache = {
+        gift_id: {'price': price, 'timestamp': timestamp, 'source': source}
+        for gift_id, price, timestamp, source in rows
+    }
+    _memory_loaded_at = now
+    return _memory_cache
 
-def save_cache(cache):
-    """Save price cache to file"""
+def save_cache(entries):
+    """Upsert fresh price entries ({gift_id: {'price', 'timestamp', 'source'}}) into the cache"""
+    if not entries:
+        return
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(cache, f, indent=2)
+        with _cache_lock:
+            _upsert(_get_cache_connection(), entries)
+        for gift_id, entry in entries.items():
+            known = _memory_cache.get(str(gift_id))
+            if not known or entry.get('timestamp', 0) >= known['timestamp']:
+                _memory_cache[str(gift_id)] = entry
     except Exception as e:
         print(f"DEBUG: Failed to save cache: {e}", file=sys.stderr)
 
@@ -123,15 +218,23 @@ async def get_mrkt_init_data(client=None):
         if not use_provided_client and client:
             await client.disconnect()
 
-def get_mrkt_token(init_data):
+async def _request_json(method, url, **kwargs):
+    """Send a request over the shared HTTP pool; returns (status, decoded JSON or None)"""
+    response = await http_client.request(method, url, timeout=HTTP_TIMEOUT, **kwargs)
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    return response.status, data
+
+async def get_mrkt_token(init_data):
     """Get MRKT JWT token"""
     try:
         headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
         payload = {'data': init_data}
-        response = requests.post(f"{MRKT_API_BASE}/api/v1/auth", headers=headers, json=payload, timeout=15)
+        status, data = await _request_json('POST', f"{MRKT_API_BASE}/api/v1/auth", headers=headers, json=payload)
         
-        if response.status_code == 200:
-            data = response.json()
+        if status == 200 and isinstance(data, dict):
             if 'token' in data:
                 return data['token']
             elif 'accessToken' in data:
@@ -141,14 +244,15 @@ def get_mrkt_token(init_data):
         print(f"ERROR: MRKT token failed: {e}", file=sys.stderr)
         return None
 
-def get_mrkt_prices(token):
-    """Get MRKT prices for unupgradeable gifts"""
+async def get_mrkt_prices(token):
+    """Get MRKT prices for unupgradeable gifts (None if the token was rejected)"""
     try:
         headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
-        response = requests.get(f"{MRKT_API_BASE}/api/v1/gifts/collections", headers=headers, timeout=15)
+        status, collections = await _request_json('GET', f"{MRKT_API_BASE}/api/v1/gifts/collections", headers=headers)
         
-        if response.status_code == 200:
-            collections = response.json()
+        if status == 401:
+            return None
+        if status == 200 and collections:
             prices = {}
             
             for coll in collections:
@@ -165,6 +269,50 @@ def get_mrkt_prices(token):
         print(f"ERROR: MRKT prices failed: {e}", file=sys.stderr)
         return {}
 
+async def mrkt_login(telegram_client):
+    """Webview initData -> MRKT JWT"""
+    mrkt_init_data = await get_mrkt_init_data(await telegram_client())
+    if not mrkt_init_data:
+        return None
+    return await get_mrkt_token(mrkt_init_data)
+
+async def fetch_mrkt_prices(telegram_client, background_refresh=True):
+    """MRKT prices keyed by collection name (JWT from the token vault -> collections)"""
+    login = lambda: mrkt_login(telegram_client)
+    for _ in range(2):
+        mrkt_token = await token_vault.get_token('mrkt', login, MRKT_TOKEN_TTL, background_refresh=background_refresh)
+        if not mrkt_token:
+            return {}
+        prices = await get_mrkt_prices(mrkt_token)
+        if prices is not None:
+            return prices
+        # Token rejected - drop it and log in once more
+        token_vault.invalidate('mrkt')
+    return {}
+
+async def fetch_quant_prices(telegram_client, background_refresh=True):
+    """Quant prices and names keyed by gift ID (initData from the token vault)"""
+    async def login():
+        return await get_quant_init_data(await telegram_client())
+    
+    quant_init_data = await token_vault.get_token(
+        'quant', login, QUANT_INIT_DATA_TTL, background_refresh=background_refresh
+    )
+    if not quant_init_data:
+        return {}, {}
+    # cloudscraper is synchronous - keep it off the event loop
+    return await asyncio.to_thread(get_quant_prices, quant_init_data)
+
+async def _with_deadline(name, coro, empty):
+    """Run one marketplace fetch; on error or timeout log it and return `empty`"""
+    try:
+        return await asyncio.wait_for(coro, MARKET_FETCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"ERROR: {name} timed out after {MARKET_FETCH_TIMEOUT:.0f}s", file=sys.stderr)
+    except Exception as e:
+        print(f"ERROR: {name} failed: {e}", file=sys.stderr)
+    return empty
+
 async def get_quant_init_data(client=None):
     """Get Quant initData - optionally use provided client"""
     use_provided_client = client is not None
@@ -226,7 +374,10 @@ def get_quant_prices(init_data):
         }
         response = scraper.get(f"{QUANT_API_BASE}/api/gifts/gifts", headers=headers, timeout=30)
         
-        if response.status_code == 200:
+        if response.status_code == 401:
+            # initData rejected - the next run logs in again
+            token_vault.invalidate('quant')
+        elif response.status_code == 200:
             data = response.json()
             prices = {}
             names = {}
@@ -252,31 +403,10 @@ def get_quant_prices(init_data):
     except Exception as e:
         print(f"ERROR: Quant API failed: {e}", file=sys.stderr)
     
-    # Fallback to static file
-    try:
-        quant_file = '/root/01studio/CollectibleKIT/mrktandquantomapi/quant/clean_unique_gifts.json'
-        with open(quant_file, 'r') as f:
-            data = json.load(f)
-        
-        prices = {}
-        names = {}
-        for item in data:
-            gift_id = item.get('id')
-            floor_price = item.get('floor_price', '0')
-            full_name = item.get('full_name', '')
-            try:
-                price = float(floor_price)
-                if price > 0:
-                    prices[str(gift_id)] = price
-                    if full_name:
-                        names[str(gift_id)] = full_name
-            except:
-                pass
-        
-        return prices, names
-    except Exception as e:
-        print(f"ERROR: Quant file failed: {e}", file=sys.stderr)
-        return {}, {}
+    # Fallback to static catalog
+    catalog = get_catalog()
+    names = {gift_id: entry.full_name for gift_id, entry in catalog.entries.items() if entry.full_name}
+    return dict(catalog.floor_prices), names
 
 async def fetch_unupgradeable_prices(client=None):
     """Async function to fetch unupgradeable prices - can be imported
@@ -285,65 +415,62 @@ async def fetch_unupgradeable_prices(client=None):
     try:
         # Load cache
         cache = load_cache()
+        cache_updates = {}
         current_time = time.time()
         
-        # Load static file to map MRKT names to gift IDs
-        name_to_id_map = {}
-        id_to_name_map = {}
-        try:
-            quant_file = '/root/01studio/CollectibleKIT/mrktandquantomapi/quant/clean_unique_gifts.json'
-            with open(quant_file, 'r') as f:
-                quant_data = json.load(f)
-                for item in quant_data:
-                    gift_id = str(item.get('id', ''))
-                    short_name = item.get('short_name', '').lower()
-                    full_name = item.get('full_name', '').lower()
-                    if gift_id:
-                        # Map both short_name and full_name to gift ID
-                        if short_name:
-                            name_to_id_map[short_name] = gift_id
-                        if full_name:
-                            name_to_id_map[full_name] = gift_id
-                        id_to_name_map[gift_id] = short_name or full_name
-        except Exception as e:
-            print(f"DEBUG: Failed to load name mapping: {e}", file=sys.stderr)
+        # Static catalog maps MRKT names to gift IDs
+        catalog = get_catalog()
         
-        # Get MRKT prices (keyed by collection name)
-        mrkt_prices_by_name = {}
-        mrkt_init_data = await get_mrkt_init_data(client)
-        if mrkt_init_data:
-            mrkt_token = get_mrkt_token(mrkt_init_data)
-            if mrkt_token:
-                mrkt_prices_by_name = get_mrkt_prices(mrkt_token)
+        # Fetch MRKT (keyed by collection name) and Quant (keyed by gift ID) concurrently
+        # Credentials come from the token vault; Telegram is only needed to log in again,
+        # so a missing client is created on first use and shared by both webviews
+        state = {'client': client, 'owned': False}
+        client_lock = asyncio.Lock()
+        
+        async def telegram_client():
+            async with client_lock:
+                if state['client'] is None:
+                    gifts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gifts')
+                    state['client'] = TelegramClient(os.path.join(gifts_dir, f'{SESSION_NAME}.session'), API_ID, API_HASH)
+                    state['owned'] = True
+                if state['owned'] and not state['client'].is_connected():
+                    await state['client'].connect()
+                return state['client']
+        
+        # A client we create is disconnected below, so no login may outlive this call:
+        # tokens are only refreshed ahead of expiry when the caller owns the client
+        background_refresh = client is not None
+        
+        try:
+            mrkt_prices_by_name, (quant_prices, quant_names) = await asyncio.gather(
+                _with_deadline("MRKT", fetch_mrkt_prices(telegram_client, background_refresh), {}),
+                _with_deadline("Quant", fetch_quant_prices(telegram_client, background_refresh), ({}, {}))
+            )
+        finally:
+            if state['owned']:
+                await state['client'].disconnect()
         
         # Convert MRKT prices from name-based to ID-based
         mrkt_prices = {}
         for name, price in mrkt_prices_by_name.items():
             name_lower = name.lower()
-            gift_id = name_to_id_map.get(name_lower)
+            gift_id = catalog.name_to_id.get(name_lower)
             if gift_id and price > 0:
                 mrkt_prices[gift_id] = price
                 # Update cache with fresh price
-                cache[gift_id] = {
+                cache_updates[gift_id] = {
                     'price': price,
                     'timestamp': current_time,
                     'source': 'mrkt'
                 }
         
-        # Get Quant prices (already keyed by gift ID)
-        quant_init_data = await get_quant_init_data(client)
-        if quant_init_data:
-            quant_prices, quant_names = get_quant_prices(quant_init_data)
-        else:
-            quant_prices, quant_names = {}, {}
-        
         # Update cache with Quant prices
         for gift_id, price in quant_prices.items():
             if price > 0:
                 gift_id_str = str(gift_id)
                 # Only update cache if we don't have a newer MRKT price
                 if gift_id_str not in mrkt_prices:
-                    cache[gift_id_str] = {
+                    cache_updates[gift_id_str] = {
                         'price': price,
                         'timestamp': current_time,
                         'source': 'quant'
@@ -380,15 +507,14 @@ async def fetch_unupgradeable_prices(client=None):
         
         # Also check cache for any gift IDs that might not be in APIs but were cached before
         # (only for gifts we have in our static file)
-        for gift_id in id_to_name_map.keys():
-            gift_id_str = str(gift_id)
+        for gift_id_str in catalog.entries:
             if gift_id_str not in final_prices:
                 cached_price = get_cached_price(gift_id_str, cache)
                 if cached_price:
                     final_prices[gift_id_str] = cached_price
         
-        # Save updated cache
-        save_cache(cache)
+        # Save the fresh prices (only the entries that changed)
+        save_cache(cache_updates)
         
         return final_prices
         
@@ -397,17 +523,10 @@ async def fetch_unupgradeable_prices(client=None):
         # On error, try to use cache for all known gifts
         cache = load_cache()
         fallback_prices = {}
-        try:
-            quant_file = '/root/01studio/CollectibleKIT/mrktandquantomapi/quant/clean_unique_gifts.json'
-            with open(quant_file, 'r') as f:
-                quant_data = json.load(f)
-                for item in quant_data:
-                    gift_id = str(item.get('id', ''))
-                    cached_price = get_cached_price(gift_id, cache)
-                    if cached_price:
-                        fallback_prices[gift_id] = cached_price
-        except:
-            pass
+        for gift_id in get_catalog().entries:
+            cached_price = get_cached_price(gift_id, cache)
+            if cached_price:
+                fallback_prices[gift_id] = cached_price
         return fallback_prices
 
 async def main():
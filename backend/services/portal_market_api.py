@@ -3,15 +3,25 @@
 Working Portal Market API wrapper
 Fixes all issues with aportalsmp library:
 - Correct domain: portal-market.com (not portals-market.com)
-- Longer timeout: 60s (not 15s)
+- Longer timeout: 60s (not 15s), over one persistent session (portal_session.py)
 - Better error handling
-- Rate limiting protection
+- Rate limiting protection (adaptive, shared across processes)
 """
 import asyncio
+import json
+import os
 import sys
-from typing import Optional, List, Dict, Any
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any, Tuple
 from urllib.parse import quote_plus
 
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if bot_root not in sys.path:
+    sys.path.insert(0, bot_root)
+from utils.rate_limiter import TokenBucketLimiter
+from utils import token_vault
+from services import portal_session
+
 # Apply fixes BEFORE importing aportalsmp
 def _apply_portal_market_fixes():
     """Apply all fixes to aportalsmp library"""
@@ -22,28 +32,22 @@ def _apply_portal_market_fixes():
         other_utils.HEADERS_MAIN["Origin"] = "https://portal-market.com"
         other_utils.HEADERS_MAIN["Referer"] = "https://portal-market.com/"
         
-        # Fix 2: Increase timeout from 15s to 60s
-        import aportalsmp.handlers as handlers
-        _original_fetch = handlers.fetch
-        
-        async def patched_fetch(method="GET", url="", headers=None, json=None, timeout=60, impersonate="chrome110"):
-            """Patched fetch with 60s timeout"""
-            return await _original_fetch(method, url, headers, json, timeout, impersonate)
-        
-        handlers.fetch = patched_fetch
+        # Fix 2: 60s timeout on a persistent pooled session, and feed responses to the rate limiter
+        # (_observe_response is defined below, so look it up per response)
+        portal_session.install(on_response=lambda response: _observe_response(response))
         
         # Fix 3: Patch in modules that already imported API_URL
         import aportalsmp.gifts
+        import aportalsmp.offers
+        import aportalsmp.account
         aportalsmp.gifts.API_URL = "https://portal-market.com/api/"
         aportalsmp.gifts.HEADERS_MAIN["Origin"] = "https://portal-market.com"
         aportalsmp.gifts.HEADERS_MAIN["Referer"] = "https://portal-market.com/"
         
-        import aportalsmp.offers
         aportalsmp.offers.API_URL = "https://portal-market.com/api/"
         aportalsmp.offers.HEADERS_MAIN["Origin"] = "https://portal-market.com"
         aportalsmp.offers.HEADERS_MAIN["Referer"] = "https://portal-market.com/"
         
-        import aportalsmp.account
         aportalsmp.account.API_URL = "https://portal-market.com/api/"
         aportalsmp.account.HEADERS_MAIN["Origin"] = "https://portal-market.com"
         aportalsmp.account.HEADERS_MAIN["Referer"] = "https://portal-market.com/"
@@ -62,30 +66,97 @@ from aportalsmp.gifts import giftsFloors, filterFloors, search as _search
 from aportalsmp.utils.functions import toShortName
 from aportalsmp.classes.Objects import PortalsGift, GiftsFloors, Filters
 
-# Rate limiting with account rotation
+# Rate limiting: one token bucket per account, shared by every process through SQLite.
+# The rate adapts (AIMD) to successes and 429s observed in portal_session.fetch.
 import time
-from collections import deque
-_last_request_times = {}  # Per-account request times
-_min_request_interval = 0.3  # 300ms between requests per account
-_account_queue = deque()  # Round-robin account queue
+from collections import OrderedDict
+_min_request_interval = 0.3  # Starting pace: 300ms between requests per account
+_limiter = TokenBucketLimiter("portal", initial_rate=1 / _min_request_interval)
+_current_account: ContextVar[Optional[str]] = ContextVar("portal_account", default=None)
+
+# Accounts whose authData was rejected (401) and must be re-authenticated
+_rejected_auth = set()
+
+# Fraction of the auth cache TTL after which authData is refreshed in the background
+AUTH_REFRESH_AHEAD = 0.8
 
 async def _rate_limit(account_id=None):
-    """Rate limiting to avoid 429 errors - per account"""
-    if account_id:
-        last_time = _last_request_times.get(account_id, 0)
-        elapsed = time.time() - last_time
-        if elapsed < _min_request_interval:
-            await asyncio.sleep(_min_request_interval - elapsed)
-        _last_request_times[account_id] = time.time()
-    else:
-        # Global rate limit if no account specified
-        await asyncio.sleep(_min_request_interval)
+    """Wait for a request token from the account's shared bucket"""
+    _current_account.set(account_id)
+    await _limiter.acquire(account_id)
+
+def _observe_response(response):
+    """Adapt the current account's rate to a Portal Market response"""
+    status = getattr(response, "status_code", None)
+    if status is None:
+        return
+    account_id = _current_account.get()
+    if status == 401 and account_id:
+        _rejected_auth.add(account_id)
+    if status == 429:
+        retry_after = None
+        try:
+            retry_after = float(response.headers.get("Retry-After"))
+        except (AttributeError, TypeError, ValueError):
+            pass
+        _limiter.on_throttle(account_id, retry_after)
+    elif 200 <= status < 300:
+        _limiter.on_success(account_id)
+
+def get_rate_limits() -> Dict[str, Dict[str, Any]]:
+    """Current request rate, tokens and throttle counts per Portal account"""
+    return _limiter.get_rates()
+
+# Collection floor table cache, shared by every PortalMarketAPI instance in the process
+FLOOR_CACHE_TTL = float(os.getenv("PORTAL_FLOOR_CACHE_TTL", "300"))  # seconds
+FLOOR_REFRESH_AHEAD = 0.8  # after this fraction of the TTL, refresh in the background
+_floor_cache = {'table': {}, 'fetched_at': 0.0}
+_floor_refresh_task: Optional[asyncio.Task] = None
+
+# search() results memoized per filter tuple, shared by every PortalMarketAPI instance
+# in the process. get_gift_price() issues the same model-only search for every backdrop
+# of a model, so these sub-queries run once per window instead of once per gift.
+SEARCH_CACHE_TTL = float(os.getenv("PORTAL_SEARCH_CACHE_TTL", "300"))  # seconds
+SEARCH_CACHE_SIZE = 5000
+_search_cache: "OrderedDict[tuple, Tuple[float, List[Any]]]" = OrderedDict()
+_search_inflight: Dict[tuple, asyncio.Task] = {}
+
+
+def _is_reusable(task: Optional[asyncio.Task]) -> bool:
+    """True if `task` is still running on the current event loop and can be joined"""
+    return task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop()
+
+
+def _normalize_filter(value) -> Any:
+    """Normalize a search filter value for use in a memoization key"""
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(_normalize_filter(v) for v in value))
+    return str(value or "").strip().lower()
+
+
+def _finish_search(key: tuple, task: asyncio.Task):
+    """Store a finished search in the cache and release its in-flight slot"""
+    if _search_inflight.get(key) is task:
+        del _search_inflight[key]
+    if task.cancelled() or task.exception() is not None:
+        return
+    _search_cache[key] = (time.time(), task.result())
+    _search_cache.move_to_end(key)
+    while len(_search_cache) > SEARCH_CACHE_SIZE:
+        _search_cache.popitem(last=False)
 
 
 class PortalMarketAPI:
     """Working Portal Market API wrapper"""
     
-    def __init__(self, api_id: int, api_hash: str, session_name: str = "portals_session", session_path: str = None):
+    def __init__(
+        self,
+        api_id: int,
+        api_hash: str,
+        session_name: str = "portals_session",
+        session_path: str = None,
+        auth_cache_ttl: int = 3600
+    ):
         """
         Initialize Portal Market API
         
@@ -94,54 +165,144 @@ class PortalMarketAPI:
             api_hash: Telegram API Hash
             session_name: Pyrogram session name
             session_path: Path to session files
+            auth_cache_ttl: Seconds authData is reused for (kept in the shared token vault)
         """
         self.api_id = api_id
         self.api_hash = api_hash
         self.session_name = session_name
         self.session_path = session_path
+        self.auth_cache_ttl = auth_cache_ttl
         self._auth_data: Optional[str] = None
+        self._auth_created_at = 0.0  # 0 = supplied by the caller, never expires
+        self._auth_refresh_task: Optional[asyncio.Task] = None
     
-    async def authenticate(self) -> str:
-        """
-        Authenticate with Portal Market
-        
-        Returns:
-            Auth data string
-        """
-        if self._auth_data:
-            return self._auth_data
-        
+    def _use_auth(self, entry: Optional[token_vault.TokenEntry]) -> Optional[str]:
+        """Adopt authData from the token vault"""
+        if not entry:
+            return None
+        self._auth_data = entry.token
+        self._auth_created_at = entry.created_at
+        _rejected_auth.discard(self.session_name)
+        return entry.token
+    
+    async def _login(self) -> Optional[str]:
+        """Get fresh authData from Telegram"""
         try:
-            self._auth_data = await update_auth(
+            return await update_auth(
                 api_id=self.api_id,
                 api_hash=self.api_hash,
                 session_name=self.session_name,
                 session_path=self.session_path
             )
-            return self._auth_data
         except Exception as e:
             raise Exception(f"Portal Market authentication failed: {e}")
     
-    async def get_all_floor_prices(self) -> Dict[str, float]:
+    async def _update_auth(self) -> str:
+        """Get fresh authData (one login across all processes) and store it in the token vault"""
+        entry = await token_vault.refresh(
+            'portal', self._login, self.auth_cache_ttl,
+            account=self.session_name, seen_created_at=self._auth_created_at
+        )
+        return self._use_auth(entry)
+    
+    def _refresh_auth_in_background(self):
+        """Refresh authData ahead of expiry without blocking the caller"""
+        if _is_reusable(self._auth_refresh_task):
+            return
+        
+        async def refresh():
+            try:
+                await self._update_auth()
+            except Exception as e:
+                print(f"⚠️ Background Portal auth refresh failed for {self.session_name}: {e}", file=sys.stderr)
+        
+        self._auth_refresh_task = asyncio.ensure_future(refresh())
+    
+    async def authenticate(self, force_refresh: bool = False) -> str:
         """
-        Get floor prices for all gift collections
+        Authenticate with Portal Market
+        
+        authData is reused from memory or the shared token vault until auth_cache_ttl
+        expires, and refreshed in the background once AUTH_REFRESH_AHEAD of the
+        TTL has passed. A 401 from Portal Market forces a refresh.
+        
+        Args:
+            force_refresh: Ignore cached authData
         
         Returns:
-            Dictionary mapping gift names to floor prices
+            Auth data string
         """
+        if self.session_name in _rejected_auth:
+            force_refresh = True
+        
+        if not force_refresh:
+            if not self._auth_data:
+                self._use_auth(token_vault.load('portal', self.session_name))
+            if self._auth_data:
+                if not self._auth_created_at:
+                    return self._auth_data
+                age = time.time() - self._auth_created_at
+                if age < self.auth_cache_ttl:
+                    if age >= self.auth_cache_ttl * AUTH_REFRESH_AHEAD:
+                        self._refresh_auth_in_background()
+                    return self._auth_data
+        
+        return await self._update_auth()
+    
+    async def _fetch_floor_prices(self) -> Dict[str, float]:
+        """Download the giftsFloors table and store it in the process-wide cache"""
         await self.authenticate()
-        await _rate_limit()
+        await _rate_limit(self.session_name)
         
         try:
             floors = await giftsFloors(authData=self._auth_data)
             # Convert to dict
             if hasattr(floors, 'floorPrices'):
-                return floors.floorPrices
+                table = floors.floorPrices
             elif hasattr(floors, '__dict__'):
-                return floors.__dict__.get('floorPrices', {})
-            return {}
+                table = floors.__dict__.get('floorPrices', floors.__dict__)
+            else:
+                table = {}
         except Exception as e:
             raise Exception(f"Failed to get floor prices: {e}")
+        
+        _floor_cache['table'] = table
+        _floor_cache['fetched_at'] = time.time()
+        return table
+    
+    def _refresh_floor_prices(self) -> asyncio.Task:
+        """Start a floor table download, or join the one already in flight (single-flight)"""
+        global _floor_refresh_task
+        task = _floor_refresh_task
+        if not _is_reusable(task):
+            task = asyncio.ensure_future(self._fetch_floor_prices())
+            # Background refreshes may finish with nobody awaiting them
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            _floor_refresh_task = task
+        return task
+    
+    async def get_all_floor_prices(self, force_refresh: bool = False) -> Dict[str, float]:
+        """
+        Get floor prices for all gift collections
+        
+        The table is cached per process for FLOOR_CACHE_TTL seconds. Past
+        FLOOR_REFRESH_AHEAD of the TTL the cached table is still returned while a
+        background refresh runs, and concurrent callers share a single download.
+        
+        Args:
+            force_refresh: Ignore the cached table and download a fresh one
+        
+        Returns:
+            Dictionary mapping gift names to floor prices
+        """
+        age = time.time() - _floor_cache['fetched_at']
+        if _floor_cache['table'] and not force_refresh and age < FLOOR_CACHE_TTL:
+            if age >= FLOOR_CACHE_TTL * FLOOR_REFRESH_AHEAD:
+                self._refresh_floor_prices()
+            return _floor_cache['table']
+        
+        # shield() keeps one caller's cancellation from aborting the shared download
+        return await asyncio.shield(self._refresh_floor_prices())
     
     async def get_gift_floor_price(self, gift_name: str) -> Optional[float]:
         """
@@ -155,7 +316,9 @@ class PortalMarketAPI:
         """
         floors = await self.get_all_floor_prices()
         short_name = toShortName(gift_name).lower()
-        return floors.get(short_name)
+        price = floors.get(short_name)
+        # Floor table values come back as strings
+        return float(price) if price is not None else None
     
     async def search_gifts(
         self,
@@ -167,11 +330,15 @@ class PortalMarketAPI:
         max_price: int = 100000,
         sort: str = "price_asc",
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        use_cache: bool = True
     ) -> List[PortalsGift]:
         """
         Search for gifts with filters
         
+        Results are memoized per filter tuple for SEARCH_CACHE_TTL seconds, and
+        concurrent identical searches share one request.
+        
         Args:
             gift_name: Gift collection name
             model: Model name filter
@@ -182,12 +349,45 @@ class PortalMarketAPI:
             sort: Sort order (price_asc, price_desc, latest, etc.)
             limit: Maximum results
             offset: Pagination offset
+            use_cache: Serve a memoized result if one is still valid
         
         Returns:
             List of PortalsGift objects
         """
+        key = tuple(_normalize_filter(v) for v in (gift_name, model, backdrop, symbol, sort)) + (
+            min_price, max_price, limit, offset
+        )
+        if use_cache:
+            cached = _search_cache.get(key)
+            if cached and time.time() - cached[0] < SEARCH_CACHE_TTL:
+                _search_cache.move_to_end(key)
+                return cached[1]
+        
+        task = _search_inflight.get(key)
+        if not _is_reusable(task):
+            task = asyncio.ensure_future(self._search(
+                gift_name, model, backdrop, symbol, min_price, max_price, sort, limit, offset
+            ))
+            _search_inflight[key] = task
+            task.add_done_callback(lambda t: _finish_search(key, t))
+        # shield() keeps one caller's cancellation from aborting the shared request
+        return await asyncio.shield(task)
+    
+    async def _search(
+        self,
+        gift_name: Optional[str],
+        model: Optional[str],
+        backdrop: Optional[str],
+        symbol: Optional[str],
+        min_price: int,
+        max_price: int,
+        sort: str,
+        limit: int,
+        offset: int
+    ) -> List[PortalsGift]:
+        """Run one search request against Portal Market"""
         await self.authenticate()
-        await _rate_limit()
+        await _rate_limit(self.session_name)
         
         try:
             results = await _search(
@@ -225,7 +425,11 @@ class PortalMarketAPI:
             symbol: Optional symbol/pattern filter (not used for pricing)
         
         Returns:
-            Best price in TON, or None if not found
+            Best price in TON, or None if nothing is listed
+        
+        Raises:
+            Exception if a request fails (timeouts, 429s, auth), so a failure is never
+            mistaken for "no listing"
         """
         try:
             # Special cases: Onyx Black and Black 2 backgrounds always use model+background combo
@@ -292,9 +496,12 @@ class PortalMarketAPI:
                     return combo_price
                 elif model_price is not None:
                     return model_price
-                else:
-                    # Fallback to base floor price
-                    return await self.get_gift_floor_price(gift_name)
+                # Nothing found - only real answers from both searches mean "no listing"
+                for result in (model_results, combo_results):
+                    if isinstance(result, Exception):
+                        raise result
+                # Fallback to base floor price
+                return await self.get_gift_floor_price(gift_name)
             
             # If only model provided (no backdrop)
             if model:
@@ -321,8 +528,7 @@ class PortalMarketAPI:
             # Fallback to base floor price
             return await self.get_gift_floor_price(gift_name)
         except Exception as e:
-            # Return None on error (don't raise)
-            return None
+            raise Exception(f"Failed to get gift price: {e}")
     
     async def get_filter_floors(self, gift_name: str) -> Optional[Filters]:
         """
@@ -335,7 +541,7 @@ class PortalMarketAPI:
             Filters object with floor prices, or None
         """
         await self.authenticate()
-        await _rate_limit()
+        await _rate_limit(self.session_name)
         
         try:
             return await filterFloors(gift_name=gift_name, authData=self._auth_data)
@@ -353,7 +559,7 @@ class PortalMarketAPI:
             CollectionOffer object, or None
         """
         await self.authenticate()
-        await _rate_limit()
+        await _rate_limit(self.session_name)
         
         try:
             short_name = toShortName(gift_name)
@@ -400,20 +606,18 @@ async def get_portal_market_price(
         # Create temporary API instance
         api = PortalMarketAPI(api_id, api_hash, session_name, session_path)
         api._auth_data = portal_auth_data
-        return await api.get_gift_price(
-            gift_name=collection_name,
-            model=model_name,
-            backdrop=backdrop_name,
-            symbol=symbol_name
-        )
     elif api_id and api_hash:
         api = PortalMarketAPI(api_id, api_hash, session_name, session_path)
+    else:
+        return None
+    try:
         return await api.get_gift_price(
             gift_name=collection_name,
             model=model_name,
             backdrop=backdrop_name,
             symbol=symbol_name
         )
-    else:
+    except Exception:
+        # Return None on error (don't raise)
         return None
 
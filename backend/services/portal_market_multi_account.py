@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 """
 Multi-account Portal Market API wrapper
-Uses 3 accounts in parallel/rotation for faster price fetching
+Uses several accounts in parallel for faster price fetching. Requests go to the
+account with the fewest outstanding requests, weighted by observed latency and
+error rate; failing accounts are taken out by a circuit breaker and probed again
+after a cooldown, and throttled accounts' queued work is stolen by the others.
 """
 import asyncio
 import sys
@@ -14,18 +17,103 @@ import sys
 import os
 bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, bot_root)
-from services.portal_market_api import PortalMarketAPI, _apply_portal_market_fixes
+from services.portal_market_api import PortalMarketAPI, _apply_portal_market_fixes, get_rate_limits
 
 # Apply fixes first
 _apply_portal_market_fixes()
 
 # Import account config
 try:
-    from portal_accounts_config import PORTAL_ACCOUNTS
+    from portal_accounts_config import PORTAL_ACCOUNTS, AUTH_CACHE_TTL
     MULTI_ACCOUNT_AVAILABLE = True
 except ImportError:
     MULTI_ACCOUNT_AVAILABLE = False
     PORTAL_ACCOUNTS = []
+    AUTH_CACHE_TTL = 3600
+
+
+class AccountHealth:
+    """Latency/error tracking and circuit breaker for one Portal account"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0, max_cooldown: float = 300.0, alpha: float = 0.2):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            cooldown: Seconds the breaker stays open before a half-open probe
+            max_cooldown: Cap for the cooldown, which doubles on each failed probe
+            alpha: EWMA smoothing factor for latency and error rate
+        """
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.alpha = alpha
+        self.outstanding = 0
+        self.latency = 0.5  # seconds, EWMA
+        self.error_rate = 0.0  # EWMA of failures
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.requests = 0
+        self.failures = 0
+    
+    def available(self, now: float) -> bool:
+        """True if the breaker lets a request through right now"""
+        if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            return not self.probing
+        return self.state == self.CLOSED
+    
+    def score(self, backoff: float = 0.0, queued: int = 0) -> float:
+        """Expected wait on this account - lower is better"""
+        return (self.outstanding + queued + 1) * self.latency * (1 + 4 * self.error_rate) + backoff
+    
+    def start(self):
+        self.outstanding += 1
+        if self.state == self.HALF_OPEN:
+            self.probing = True
+    
+    def release(self):
+        """Request abandoned (e.g. cancelled) - no health signal"""
+        self.outstanding -= 1
+        self.probing = False
+    
+    def finish(self, latency: float, ok: bool):
+        self.outstanding -= 1
+        self.requests += 1
+        self.latency += self.alpha * (latency - self.latency)
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        was_probe = self.state == self.HALF_OPEN
+        self.probing = False
+        if ok:
+            self.consecutive_failures = 0
+            if was_probe:
+                self.state = self.CLOSED
+                self.cooldown = self.base_cooldown
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        if was_probe or self.consecutive_failures >= self.failure_threshold:
+            if was_probe:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.state = self.OPEN
+            self.opened_at = time.time()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'outstanding': self.outstanding,
+            'latency': round(self.latency, 3),
+            'error_rate': round(self.error_rate, 3),
+            'requests': self.requests,
+            'failures': self.failures
+        }
 
 
 class MultiAccountPortalMarketAPI:
@@ -40,50 +128,67 @@ class MultiAccountPortalMarketAPI:
         """
         self.session_path = session_path
         self.accounts: List[PortalMarketAPI] = []
-        self.account_queue = deque()
-        self.account_lock = asyncio.Lock()
+        self.health: Dict[str, AccountHealth] = {}
+        # Account -> time the shared rate limiter blocks it until (read every second)
+        self._blocked_until: Dict[str, float] = {}
+        self._backoff_checked_at = 0.0
         self._initialized = False
+        self._init_task: Optional[asyncio.Task] = None
     
     async def _initialize_accounts(self):
-        """Initialize all available accounts"""
+        """Initialize all available accounts (concurrent callers share one bootstrap)"""
         if self._initialized:
             return
         
+        if self._init_task is None or self._init_task.done():
+            self._init_task = asyncio.ensure_future(self._bootstrap_accounts())
+        await asyncio.shield(self._init_task)
+    
+    async def _authenticate_account(self, account_config: Dict[str, Any]) -> Optional[PortalMarketAPI]:
+        """Authenticate one account, from its auth cache file when still valid"""
+        try:
+            api = PortalMarketAPI(
+                api_id=account_config["api_id"],
+                api_hash=account_config["api_hash"],
+                session_name=account_config["session_name"],
+                session_path=self.session_path,
+                auth_cache_ttl=AUTH_CACHE_TTL
+            )
+        except Exception as e:
+            print(f"   ❌ Account {account_config['account_id']} init failed: {e}", file=sys.stderr)
+            return None
+        
+        # Try to authenticate (with timeout to avoid hanging on interactive prompts)
+        try:
+            auth = await asyncio.wait_for(api.authenticate(), timeout=5.0)
+            if auth:
+                print(f"   ✅ Account {account_config['account_id']} ({account_config['app_title']}) authenticated", file=sys.stderr)
+                return api
+            print(f"   ⚠️ Account {account_config['account_id']} auth returned empty", file=sys.stderr)
+        except asyncio.TimeoutError:
+            print(f"   ⚠️ Account {account_config['account_id']} auth timeout (needs interactive login)", file=sys.stderr)
+        except (EOFError, KeyboardInterrupt):
+            print(f"   ⚠️ Account {account_config['account_id']} needs interactive login", file=sys.stderr)
+        except Exception as e:
+            error_msg = str(e)
+            if "EOF" in error_msg or "interactive" in error_msg.lower():
+                print(f"   ⚠️ Account {account_config['account_id']} needs interactive login", file=sys.stderr)
+            else:
+                print(f"   ⚠️ Account {account_config['account_id']} auth failed: {error_msg[:50]}", file=sys.stderr)
+        return None
+    
+    async def _bootstrap_accounts(self):
         if not MULTI_ACCOUNT_AVAILABLE or not PORTAL_ACCOUNTS:
             raise Exception("Multi-account config not available")
         
         print(f"🔑 Initializing {len(PORTAL_ACCOUNTS)} Portal Market accounts...", file=sys.stderr)
         
-        # Initialize all accounts
-        for account_config in PORTAL_ACCOUNTS:
-            try:
-                api = PortalMarketAPI(
-                    api_id=account_config["api_id"],
-                    api_hash=account_config["api_hash"],
-                    session_name=account_config["session_name"],
-                    session_path=self.session_path
-                )
-                # Try to authenticate (with timeout to avoid hanging on interactive prompts)
-                try:
-                    auth = await asyncio.wait_for(api.authenticate(), timeout=5.0)
-                    if auth:
-                        self.accounts.append(api)
-                        self.account_queue.append(api)
-                        print(f"   ✅ Account {account_config['account_id']} ({account_config['app_title']}) authenticated", file=sys.stderr)
-                    else:
-                        print(f"   ⚠️ Account {account_config['account_id']} auth returned empty", file=sys.stderr)
-                except asyncio.TimeoutError:
-                    print(f"   ⚠️ Account {account_config['account_id']} auth timeout (needs interactive login)", file=sys.stderr)
-                except (EOFError, KeyboardInterrupt):
-                    print(f"   ⚠️ Account {account_config['account_id']} needs interactive login", file=sys.stderr)
-                except Exception as e:
-                    error_msg = str(e)
-                    if "EOF" in error_msg or "interactive" in error_msg.lower():
-                        print(f"   ⚠️ Account {account_config['account_id']} needs interactive login", file=sys.stderr)
-                    else:
-                        print(f"   ⚠️ Account {account_config['account_id']} auth failed: {error_msg[:50]}", file=sys.stderr)
-            except Exception as e:
-                print(f"   ❌ Account {account_config['account_id']} init failed: {e}", file=sys.stderr)
+        # Authenticate all accounts concurrently (cached authData makes this instant)
+        apis = await asyncio.gather(*[self._authenticate_account(config) for config in PORTAL_ACCOUNTS])
+        for api in apis:
+            if api is not None:
+                self.accounts.append(api)
+                self.health[api.session_name] = AccountHealth()
         
         if not self.accounts:
             raise Exception("No accounts could be authenticated")
@@ -91,22 +196,73 @@ class MultiAccountPortalMarketAPI:
         self._initialized = True
         print(f"✅ {len(self.accounts)} accounts ready for use", file=sys.stderr)
     
+    async def _refresh_backoff(self):
+        """Re-read the accounts' rate limiter blocks, at most once a second
+        
+        The limiter's database read waits on the lock its worker threads hold during
+        their transactions, so it runs in a thread instead of on the event loop.
+        """
+        now = time.time()
+        if now - self._backoff_checked_at < 1.0:
+            return
+        self._backoff_checked_at = now
+        rates = await asyncio.to_thread(get_rate_limits)
+        now = time.time()
+        self._blocked_until = {name: now + info.get('blocked_for', 0.0) for name, info in rates.items()}
+    
+    def _backoff_for(self, account: PortalMarketAPI) -> float:
+        """Seconds the shared rate limiter still holds this account back (as of the last refresh)"""
+        return max(self._blocked_until.get(account.session_name, 0.0) - time.time(), 0.0)
+    
+    def _pick_account(self, queued: Optional[Dict[str, int]] = None) -> Optional[PortalMarketAPI]:
+        """Healthiest available account, or None while every breaker is open"""
+        now = time.time()
+        candidates = [a for a in self.accounts if self.health[a.session_name].available(now)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda a: self.health[a.session_name].score(
+            self._backoff_for(a), (queued or {}).get(a.session_name, 0)
+        ))
+    
     async def _get_next_account(self) -> PortalMarketAPI:
-        """Get next account in round-robin fashion"""
+        """Get the account with the lowest expected wait (waits while all breakers are open)"""
         await self._initialize_accounts()
         
-        async with self.account_lock:
-            if not self.account_queue:
-                # Rebuild queue if empty
-                self.account_queue.extend(self.accounts)
-            
-            account = self.account_queue.popleft()
-            self.account_queue.append(account)  # Put back at end for round-robin
-            return account
+        while True:
+            await self._refresh_backoff()
+            account = self._pick_account()
+            if account is not None:
+                return account
+            await asyncio.sleep(0.5)
+    
+    async def _run_on(self, account: PortalMarketAPI, method: str, *args, **kwargs):
+        """Call `method` on an account, recording latency and errors for the scheduler"""
+        health = self.health[account.session_name]
+        health.start()
+        start = time.time()
+        try:
+            result = await getattr(account, method)(*args, **kwargs)
+        except Exception:
+            health.finish(time.time() - start, ok=False)
+            raise
+        except BaseException:
+            health.release()
+            raise
+        health.finish(time.time() - start, ok=True)
+        return result
+    
+    async def _call(self, method: str, *args, **kwargs):
+        """Call `method` on the healthiest account"""
+        account = await self._get_next_account()
+        return await self._run_on(account, method, *args, **kwargs)
+    
+    def get_account_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Scheduler view of every account: breaker state, load, latency, error rate"""
+        return {name: health.snapshot() for name, health in self.health.items()}
     
     async def get_all_floor_prices(self) -> Dict[str, float]:
         """
-        Get floor prices for all gift collections using first available account
+        Get floor prices for all gift collections using the healthiest account
         
         Returns:
             Dictionary mapping gift names to floor prices
@@ -115,9 +271,7 @@ class MultiAccountPortalMarketAPI:
         if not self.accounts:
             raise Exception("No accounts available")
         
-        # Use first account for this (it's a single call)
-        account = self.accounts[0]
-        return await account.get_all_floor_prices()
+        return await self._call("get_all_floor_prices")
     
     async def get_gift_floor_price(self, gift_name: str) -> Optional[float]:
         """
@@ -133,9 +287,24 @@ class MultiAccountPortalMarketAPI:
         if not self.accounts:
             return None
         
-        # Use first account
-        account = self.accounts[0]
-        return await account.get_gift_floor_price(gift_name)
+        return await self._call("get_gift_floor_price", gift_name)
+    
+    async def get_filter_floors(self, gift_name: str) -> Optional[Any]:
+        """
+        Get floor prices for models/backdrops/symbols for a gift
+        Uses the healthiest account
+        
+        Args:
+            gift_name: Gift collection name
+        
+        Returns:
+            Filters object with floor prices, or None
+        """
+        await self._initialize_accounts()
+        if not self.accounts:
+            return None
+        
+        return await self._call("get_filter_floors", gift_name)
     
     async def get_gift_price(
         self,
@@ -146,7 +315,7 @@ class MultiAccountPortalMarketAPI:
     ) -> Optional[float]:
         """
         Get the lowest price for a gift with optional attribute filters
-        Uses round-robin account rotation
+        Uses the healthiest account
         
         Args:
             gift_name: Gift collection name
@@ -161,9 +330,7 @@ class MultiAccountPortalMarketAPI:
         if not self.accounts:
             return None
         
-        # Get next account in rotation
-        account = await self._get_next_account()
-        return await account.get_gift_price(gift_name, model, backdrop, symbol)
+        return await self._call("get_gift_price", gift_name, model, backdrop, symbol)
     
     async def search_gifts(
         self,
@@ -178,7 +345,7 @@ class MultiAccountPortalMarketAPI:
         offset: int = 0
     ) -> List[Any]:
         """
-        Search for gifts with filters using round-robin account rotation
+        Search for gifts with filters using the healthiest account
         
         Args:
             gift_name: Gift collection name
@@ -198,10 +365,8 @@ class MultiAccountPortalMarketAPI:
         if not self.accounts:
             return []
         
-        # Get next account in rotation
-        account = await self._get_next_account()
-        return await account.search_gifts(
-            gift_name, model, backdrop, symbol,
+        return await self._call(
+            "search_gifts", gift_name, model, backdrop, symbol,
             min_price, max_price, sort, limit, offset
         )
     
@@ -226,35 +391,54 @@ class MultiAccountPortalMarketAPI:
         
         results = {}
         
-        # Create tasks for all requests
-        async def fetch_single_price(request, account):
-            """Fetch price for a single gift using specified account"""
-            try:
-                price = await account.get_gift_price(
-                    gift_name=request.get("gift_name"),
-                    model=request.get("model"),
-                    backdrop=request.get("backdrop"),
-                    symbol=request.get("symbol")
-                )
-                return request.get("id", request.get("gift_name")), price
-            except Exception as e:
-                return request.get("id", request.get("gift_name")), None
+        # Initial assignment: each request is queued on the account with the lowest
+        # expected wait, counting what is already queued on it
+        await self._refresh_backoff()
+        queues: Dict[str, deque] = {a.session_name: deque() for a in self.accounts}
+        for request in gift_requests:
+            account = self._pick_account({name: len(q) for name, q in queues.items()}) or self.accounts[0]
+            queues[account.session_name].append(request)
         
-        # Distribute requests across accounts
-        tasks = []
-        for i, request in enumerate(gift_requests):
-            account = self.accounts[i % len(self.accounts)]  # Round-robin distribution
-            tasks.append(fetch_single_price(request, account))
+        def steal(thief: str) -> Optional[Dict[str, Any]]:
+            """Take a request from the tail of the longest queue, preferring backed-off accounts"""
+            now = time.time()
+            victims = [a for a in self.accounts if a.session_name != thief and queues[a.session_name]]
+            if not victims:
+                return None
+            victim = max(victims, key=lambda a: (
+                not self.health[a.session_name].available(now) or self._backoff_for(a) > 0,
+                len(queues[a.session_name])
+            ))
+            return queues[victim.session_name].pop()
         
-        # Execute all tasks
-        completed = await asyncio.gather(*tasks, return_exceptions=True)
+        async def worker(account: PortalMarketAPI):
+            """Drain this account's queue, then steal from others; yields while backed off"""
+            name = account.session_name
+            health = self.health[name]
+            while any(queues.values()):
+                await self._refresh_backoff()
+                if not health.available(time.time()) or self._backoff_for(account) > 0:
+                    # Backed off - leave our queue to the other workers for now
+                    await asyncio.sleep(0.2)
+                    continue
+                request = queues[name].popleft() if queues[name] else steal(name)
+                if request is None:
+                    return
+                gift_id = request.get("id", request.get("gift_name"))
+                try:
+                    results[gift_id] = await self._run_on(
+                        account, "get_gift_price",
+                        gift_name=request.get("gift_name"),
+                        model=request.get("model"),
+                        backdrop=request.get("backdrop"),
+                        symbol=request.get("symbol")
+                    )
+                except Exception:
+                    results[gift_id] = None
         
-        # Process results
-        for result in completed:
-            if isinstance(result, Exception):
-                continue
-            gift_id, price = result
-            results[gift_id] = price
+        await asyncio.gather(*[
+            worker(account) for account in self.accounts for _ in range(max_concurrent)
+        ])
         
         return results
 
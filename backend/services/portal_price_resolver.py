@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Collection-level Portal Market price resolver
+Fetches filterFloors once per collection and keeps a model/backdrop floor index
+in memory, so most gift prices are answered without a search request:
+- model only / backdrop only: the attribute floor from the index
+- model + backdrop: MAX(model floor, combo price); the combo still needs a live
+  search, but only when both attributes are actually listed
+- Onyx Black / Black 2: combo price, else backdrop floor, else collection floor
+Pricing cost scales with the number of distinct collections, not gifts.
+Transport errors (timeouts, 429s, auth failures) are raised, so None always
+means "no listing".
+"""
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from services.portal_market_api import _is_reusable
+
+# Seconds a collection's model/backdrop floor index stays valid
+FILTER_FLOORS_TTL = float(os.getenv("PORTAL_FILTER_FLOORS_TTL", "300"))
+
+# Backdrops that are always priced by the model+backdrop combo
+COMBO_ONLY_BACKDROPS = ("onyx black", "black 2")
+
+# Collection indexes shared by every resolver in the process:
+# collection -> (fetched_at, {'models': {name: floor}, 'backdrops': {name: floor}} or None)
+_collection_floors: Dict[str, Tuple[float, Optional[Dict[str, Dict[str, float]]]]] = {}
+_index_inflight: Dict[str, asyncio.Task] = {}
+
+# Price lookups in flight, so concurrent requests for one key share a single lookup
+_resolve_inflight: Dict[Tuple[str, str, str], asyncio.Task] = {}
+
+
+def _floor_map(values: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """Lower-cased name -> floor for every attribute that has a listing"""
+    floors = {}
+    for name, price in (values or {}).items():
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            continue
+        if price > 0:
+            floors[str(name).strip().lower()] = price
+    return floors
+
+
+class CollectionPriceResolver:
+    """Resolve gift prices from per-collection floor indexes"""
+
+    def __init__(self, api, max_concurrent: int = 4):
+        """
+        Initialize resolver
+
+        Args:
+            api: PortalMarketAPI or MultiAccountPortalMarketAPI
+            max_concurrent: Max concurrent Portal Market requests from resolve_many()
+        """
+        self.api = api
+        self.max_concurrent = max_concurrent
+
+    async def _fetch_index(self, collection: str) -> Optional[Dict[str, Dict[str, float]]]:
+        try:
+            filters = await self.api.get_filter_floors(collection)
+        except Exception as e:
+            print(f"⚠️ filterFloors failed for {collection}: {e}", file=sys.stderr)
+            raise
+        if filters is None:
+            index = None
+        else:
+            index = {
+                'models': _floor_map(getattr(filters, 'models', None)),
+                'backdrops': _floor_map(getattr(filters, 'backdrops', None))
+            }
+        _collection_floors[collection] = (time.time(), index)
+        return index
+
+    async def get_index(self, gift_name: str) -> Optional[Dict[str, Dict[str, float]]]:
+        """
+        Get the model/backdrop floor index for a collection
+
+        Returns:
+            {'models': {...}, 'backdrops': {...}} keyed by lower-cased names, or None
+            if Portal Market has no filter floors for the collection
+
+        Raises:
+            The filterFloors error (to every caller sharing the request); nothing is cached
+        """
+        collection = gift_name.strip().lower()
+        cached = _collection_floors.get(collection)
+        if cached and time.time() - cached[0] < FILTER_FLOORS_TTL:
+            return cached[1]
+
+        task = _index_inflight.get(collection)
+        if not _is_reusable(task):
+            task = asyncio.ensure_future(self._fetch_index(collection))
+            _index_inflight[collection] = task
+            task.add_done_callback(
+                lambda t: _index_inflight.pop(collection, None) if _index_inflight.get(collection) is t else None
+            )
+            # Waiters may all be cancelled - don't leave the error unretrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    def estimate(self, gift_name: str, model: Optional[str] = None, backdrop: Optional[str] = None) -> float:
+        """
+        Expected value of a gift from the already loaded floor index, without any request
+        Used to price the most valuable gifts first; 0 when the collection isn't indexed.
+        """
+        cached = _collection_floors.get(gift_name.strip().lower())
+        index = cached[1] if cached else None
+        if not index:
+            return 0.0
+        model_floor = index['models'].get(model.strip().lower()) if model else None
+        backdrop_floor = index['backdrops'].get(backdrop.strip().lower()) if backdrop else None
+        return model_floor or backdrop_floor or 0.0
+
+    async def _combo_price(self, gift_name: str, model: str, backdrop: str) -> Optional[float]:
+        results = await self.api.search_gifts(
+            gift_name=gift_name,
+            model=model,
+            backdrop=backdrop,
+            limit=1,
+            sort="price_asc"
+        )
+        return float(results[0].price) if results else None
+
+    async def resolve(
+        self,
+        gift_name: str,
+        model: Optional[str] = None,
+        backdrop: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        Get the price for a gift, same rules as PortalMarketAPI.get_gift_price
+        Concurrent lookups of the same key within the process share one request
+        (and its result or error).
+
+        Returns:
+            Price in TON, or None if nothing is listed
+
+        Raises:
+            Any request error, so callers can tell a failure from "no listing"
+        """
+        key = (gift_name.strip().lower(), (model or "").strip().lower(), (backdrop or "").strip().lower())
+        task = _resolve_inflight.get(key)
+        if not _is_reusable(task):
+            task = asyncio.ensure_future(self._resolve(gift_name, model, backdrop))
+            _resolve_inflight[key] = task
+            task.add_done_callback(
+                lambda t: _resolve_inflight.pop(key, None) if _resolve_inflight.get(key) is t else None
+            )
+            # Waiters may all be cancelled - don't leave the error unretrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    async def _resolve(
+        self,
+        gift_name: str,
+        model: Optional[str],
+        backdrop: Optional[str]
+    ) -> Optional[float]:
+        index = await self.get_index(gift_name)
+        if index is None:
+            # No filter floors for this collection - use the search-based path
+            return await self.api.get_gift_price(gift_name=gift_name, model=model, backdrop=backdrop)
+
+        model_floor = index['models'].get(model.strip().lower()) if model else None
+        backdrop_floor = index['backdrops'].get(backdrop.strip().lower()) if backdrop else None
+
+        # Special cases: Onyx Black and Black 2 backgrounds always use model+background combo
+        if backdrop and backdrop.strip().lower() in COMBO_ONLY_BACKDROPS:
+            if model_floor is not None and backdrop_floor is not None:
+                combo_price = await self._combo_price(gift_name, model, backdrop)
+                if combo_price is not None:
+                    return combo_price
+            if backdrop_floor is not None:
+                return backdrop_floor
+            return await self.api.get_gift_floor_price(gift_name)
+
+        if model and backdrop:
+            # A combo can only be listed if both attributes are listed
+            combo_price = None
+            if model_floor is not None and backdrop_floor is not None:
+                combo_price = await self._combo_price(gift_name, model, backdrop)
+            # Use MAX (safe default - never underestimate)
+            if model_floor is not None and combo_price is not None:
+                return max(model_floor, combo_price)
+            if model_floor is not None:
+                return model_floor
+            return await self.api.get_gift_floor_price(gift_name)
+
+        if model_floor is not None:
+            return model_floor
+        if backdrop_floor is not None:
+            return backdrop_floor
+        return await self.api.get_gift_floor_price(gift_name)
+
+    async def prefetch(self, gift_names: Iterable[str]):
+        """Load the floor indexes for several collections concurrently"""
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async def load(gift_name):
+            async with semaphore:
+                await self.get_index(gift_name)
+
+        # Best effort: a failed index is fetched again by the lookups that need it
+        await asyncio.gather(*[load(name) for name in {n.strip().lower() for n in gift_names}], return_exceptions=True)
+
+    async def resolve_many(
+        self,
+        keys: Iterable[Tuple[str, Optional[str], Optional[str]]]
+    ) -> Dict[Tuple[str, Optional[str], Optional[str]], Optional[float]]:
+        """
+        Resolve many (gift_name, model, backdrop) keys
+
+        Indexes for all distinct collections are loaded first, then each key is
+        resolved; only unresolved combos reach the search endpoint. Keys whose
+        lookup failed map to None.
+        """
+        keys = list(dict.fromkeys(keys))
+        await self.prefetch(gift_name for gift_name, _, _ in keys)
+
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async def resolve_key(key):
+            async with semaphore:
+                return await self.resolve(*key)
+
+        prices = await asyncio.gather(*[resolve_key(key) for key in keys], return_exceptions=True)
+        return {key: None if isinstance(price, Exception) else price for key, price in zip(keys, prices)}
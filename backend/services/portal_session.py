@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Persistent HTTP session for aportalsmp
+aportalsmp's fetch() opens a new curl_cffi AsyncSession (TLS handshake, browser
+impersonation setup) for every request. install() replaces it with a fetch that
+reuses one pooled session per event loop, so searches share warm connections and
+HTTP/2 multiplexes concurrent requests to Portal Market over them.
+"""
+import asyncio
+import sys
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from curl_cffi.requests import AsyncSession
+    CURL_CFFI_AVAILABLE = True
+except ImportError:
+    CURL_CFFI_AVAILABLE = False
+
+try:
+    from curl_cffi import CurlHttpVersion
+    HTTP_VERSION = CurlHttpVersion.V2TLS  # HTTP/2 when the server offers it over TLS, else 1.1
+except ImportError:
+    HTTP_VERSION = None
+
+# Seconds per request (aportalsmp's own default is 15s, too short for Portal Market)
+DEFAULT_TIMEOUT = 60
+
+# Concurrent transfers per session (HTTP/2 streams share the underlying connections)
+MAX_CLIENTS = 20
+
+# (loop, impersonate, proxies) -> (session, stop future, task that closes the session
+# once the future is set by close() or when asyncio.run() cancels it on exit)
+_sessions: Dict[tuple, Tuple[Any, asyncio.Future, asyncio.Task]] = {}
+
+# Called with every response (e.g. the Portal rate limiter)
+_on_response: Optional[Callable[[Any], None]] = None
+
+
+async def _close_on_shutdown(session, stop: asyncio.Future):
+    try:
+        await stop
+    finally:
+        await session.close()
+
+
+def _get_session(impersonate: str, proxies: Optional[dict]):
+    loop = asyncio.get_running_loop()
+    key = (loop, impersonate, tuple(sorted(proxies.items())) if proxies else None)
+    entry = _sessions.get(key)
+    if entry is None:
+        for old_key in [k for k in _sessions if k[0].is_closed()]:
+            del _sessions[old_key]
+        options = {"impersonate": impersonate, "timeout": DEFAULT_TIMEOUT, "max_clients": MAX_CLIENTS}
+        if proxies:
+            options["proxies"] = proxies
+        if HTTP_VERSION is not None:
+            options["http_version"] = HTTP_VERSION
+        session = AsyncSession(**options)
+        stop = loop.create_future()
+        entry = (session, stop, loop.create_task(_close_on_shutdown(session, stop)))
+        _sessions[key] = entry
+    return entry[0]
+
+
+async def fetch(method: str = "GET", url: str = "", headers: dict = None, json: dict = None,
+                timeout: int = DEFAULT_TIMEOUT, impersonate: str = "chrome110", proxies: Optional[dict] = None):
+    """
+    Drop-in replacement for aportalsmp.handlers.fetch on the shared session
+
+    Returns:
+        curl_cffi Response
+
+    Raises:
+        aportalsmp connectionError if the request fails
+    """
+    from aportalsmp.classes.Exceptions import connectionError
+    session = _get_session(impersonate, proxies)
+    try:
+        response = await session.request(method=method, url=url, headers=headers, json=json, timeout=timeout)
+    except Exception as e:
+        raise connectionError(f"aportalsmp: fetch(): Error: {e}")
+    if _on_response is not None:
+        _on_response(response)
+    return response
+
+
+def install(on_response: Optional[Callable[[Any], None]] = None) -> bool:
+    """
+    Route all aportalsmp requests through fetch()
+
+    Args:
+        on_response: Optional callback for every response
+
+    Returns:
+        True if aportalsmp was patched
+    """
+    global _on_response
+    if not CURL_CFFI_AVAILABLE:
+        return False
+    try:
+        import aportalsmp.handlers as handlers
+        # The API modules bind fetch at import time, so patch their references too
+        import aportalsmp.gifts
+        import aportalsmp.offers
+        import aportalsmp.account
+    except ImportError:
+        return False
+    if on_response is not None:
+        _on_response = on_response
+    for module in (handlers, aportalsmp.gifts, aportalsmp.offers, aportalsmp.account):
+        module.fetch = fetch
+    return True
+
+
+async def close():
+    """Close the running loop's sessions now (asyncio.run() also closes them on exit)"""
+    loop = asyncio.get_running_loop()
+    for key in [k for k in _sessions if k[0] is loop]:
+        _, stop, closer = _sessions.pop(key)
+        # Let the closer close the session (once, even if it hasn't started yet)
+        if not stop.done():
+            stop.set_result(None)
+        try:
+            await closer
+        except Exception as e:
+            print(f"⚠️ Could not close Portal session: {e}", file=sys.stderr)
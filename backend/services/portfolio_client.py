@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Thin client for the resident portfolio service (portfolio_service.py)
+get_profile_gifts.py, get_account_gifts.py and get_channel_gifts.py call the
+service first and only fall back to doing the work in-process when it is not
+running. Standard library only, so the CLIs start fast.
+"""
+import json
+import os
+import socket
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlencode
+
+# Unix socket the service listens on; set to "" to always run in-process
+SOCKET_PATH = os.getenv("PORTFOLIO_SERVICE_SOCKET", "/tmp/collectiblekit_portfolio.sock")
+
+# Seconds to wait for a response (a cold portfolio can take minutes to price)
+SERVICE_TIMEOUT = float(os.getenv("PORTFOLIO_SERVICE_TIMEOUT", "300"))
+
+
+def _connect(socket_path: str, timeout: float) -> Optional[socket.socket]:
+    """Connected socket, or None if the service is not running"""
+    if not socket_path or not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError, PermissionError):
+        sock.close()
+        return None
+    return sock
+
+
+def _request_bytes(path: str, params: Optional[Dict[str, Any]]) -> bytes:
+    query = urlencode({k: v for k, v in (params or {}).items() if v is not None})
+    target = f"{path}?{query}" if query else path
+    return f"GET {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode()
+
+
+def request_service(
+    path: str,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: float = SERVICE_TIMEOUT,
+    socket_path: str = SOCKET_PATH
+) -> Optional[Dict[str, Any]]:
+    """
+    Send one GET request to the portfolio service
+
+    Args:
+        path: Endpoint, e.g. "/profile-gifts"
+        params: Query parameters
+        timeout: Seconds to wait for the full response
+        socket_path: Unix socket of the service
+
+    Returns:
+        The decoded JSON response, or None if the service is not running
+        (the caller should then do the work itself)
+    """
+    sock = _connect(socket_path, timeout)
+    if sock is None:
+        return None
+    try:
+        sock.sendall(_request_bytes(path, params))
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    except OSError as e:
+        return {"success": False, "error": f"Portfolio service error: {e}"}
+    finally:
+        sock.close()
+
+    _, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    try:
+        return json.loads(body)
+    except ValueError:
+        return {"success": False, "error": "Portfolio service returned an invalid response"}
+
+
+def _iter_records(sock: socket.socket) -> Iterator[Dict[str, Any]]:
+    try:
+        stream = sock.makefile("rb")
+        # Skip the status line and headers
+        for line in stream:
+            if line in (b"\r\n", b"\n"):
+                break
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    except (OSError, ValueError) as e:
+        yield {"type": "error", "success": False, "error": f"Portfolio service error: {e}"}
+    finally:
+        sock.close()
+
+
+def stream_service(
+    path: str,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: float = SERVICE_TIMEOUT,
+    socket_path: str = SOCKET_PATH
+) -> Optional[Iterator[Dict[str, Any]]]:
+    """
+    Send one streaming (NDJSON) GET request to the portfolio service
+
+    Args:
+        path: Endpoint, e.g. "/profile-gifts"
+        params: Query parameters ("stream=1" is added)
+        timeout: Max seconds to wait between two records
+        socket_path: Unix socket of the service
+
+    Returns:
+        Iterator over the records as they arrive, or None if the service is not running
+    """
+    sock = _connect(socket_path, timeout)
+    if sock is None:
+        return None
+    try:
+        sock.sendall(_request_bytes(path, {**(params or {}), 'stream': 1}))
+    except OSError as e:
+        sock.close()
+        return iter([{"type": "error", "success": False, "error": f"Portfolio service error: {e}"}])
+    return _iter_records(sock)
+
+
+if __name__ == "__main__":
+    import sys
+
+    result = request_service(sys.argv[1] if len(sys.argv) > 1 else "/health")
+    print(json.dumps(result if result is not None else {"success": False, "error": "Service not running"}, indent=2))
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Resident portfolio service
+Serves the output of get_profile_gifts.py, get_account_gifts.py and
+get_channel_gifts.py over HTTP on a Unix socket, from one long-lived process that
+keeps its Telethon clients connected, its Portal accounts authenticated and all
+in-process price caches (floors, filter-floor indexes, search memo) warm.
+The CLIs are thin clients of this service (see portfolio_client.py) and only do
+the work themselves when it is not running.
+
+Endpoints (GET, JSON responses):
+- /profile-gifts?user=<id or username>[&full=1][&stream=1]   (no user: the session owner;
+  stream=1 answers with NDJSON: gift list, price updates, summary)
+- /account-gifts?username=<username>
+- /channel-gifts?username=<username>
+- /health
+
+Run:
+    python3 services/portfolio_service.py [--socket PATH]
+"""
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+
+from telethon import TelegramClient
+
+from services import get_account_gifts, get_channel_gifts, get_profile_gifts
+from services import portal_session
+from services.portfolio_client import SOCKET_PATH
+from utils import http_client
+
+# Max bytes accepted for the request line plus headers
+MAX_REQUEST_SIZE = 16384
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class PortfolioService:
+    """Long-lived portfolio server with warm Telegram and Portal Market clients"""
+
+    def __init__(self, socket_path: str = SOCKET_PATH):
+        """
+        Initialize service
+
+        Args:
+            socket_path: Unix socket to listen on
+        """
+        self.socket_path = socket_path
+        self.gifts_dir = os.path.join(bot_root, 'gifts')
+        self.started_at = time.time()
+        self.requests_served = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        # One connected client per (session file, api_id); reconnected on demand
+        self._clients: Dict[Tuple[str, int], TelegramClient] = {}
+        self._client_locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+        # Identical requests in flight share one result (e.g. portfolio/gifts + preload)
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.routes = {
+            '/profile-gifts': self.profile_gifts,
+            '/account-gifts': self.account_gifts,
+            '/channel-gifts': self.channel_gifts,
+            '/health': self.health,
+        }
+
+    async def get_client(self, session_path: str, api_id: int, api_hash: str) -> TelegramClient:
+        """Get a connected, authorized TelegramClient for a session, creating it once"""
+        key = (session_path, api_id)
+        lock = self._client_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = TelegramClient(session_path, api_id, api_hash)
+                self._clients[key] = client
+            if not client.is_connected():
+                await client.connect()
+                if not await client.is_user_authorized():
+                    raise RuntimeError(f"Telethon session is not authorized: {session_path}")
+            return client
+
+    async def warm_up(self):
+        """Connect the Telegram clients and authenticate Portal accounts before the first request"""
+        try:
+            await self.get_client(get_profile_gifts.get_session_path(), get_profile_gifts.API_ID,
+                                  get_profile_gifts.API_HASH)
+        except Exception as e:
+            print(f"⚠️ Telegram warm-up failed: {e}", file=sys.stderr)
+        if get_profile_gifts.PORTAL_MARKET_API_AVAILABLE:
+            try:
+                from services.portal_market_multi_account import get_multi_account_api
+                api = await get_multi_account_api(self.gifts_dir)
+                # Authenticates every account and fills the collection floor cache
+                await api.get_all_floor_prices()
+            except Exception as e:
+                print(f"⚠️ Portal Market warm-up failed: {e}", file=sys.stderr)
+
+    async def profile_gifts(self, params: Dict[str, str], on_event=None) -> Dict[str, Any]:
+        user_id = params.get('user') or None
+        if user_id is not None and user_id.isdigit():
+            user_id = int(user_id)
+        client = await self.get_client(get_profile_gifts.get_session_path(), get_profile_gifts.API_ID,
+                                       get_profile_gifts.API_HASH)
+        return await get_profile_gifts.collect_profile_gifts(
+            user_id,
+            background_update=params.get('background') == '1',
+            client=client,
+            incremental=params.get('full') != '1',
+            on_event=on_event
+        )
+
+    async def account_gifts(self, params: Dict[str, str]) -> Dict[str, Any]:
+        if not params.get('username'):
+            return {"success": False, "error": "Missing 'username' parameter"}
+        client = await self.get_client(get_account_gifts.SESSION_FILE, get_account_gifts.API_ID,
+                                       get_account_gifts.API_HASH)
+        return await get_account_gifts.collect_account_gifts(params['username'], client=client)
+
+    async def channel_gifts(self, params: Dict[str, str]) -> Dict[str, Any]:
+        if not params.get('username'):
+            return {"success": False, "error": "Missing 'username' parameter"}
+        client = await self.get_client(get_channel_gifts.SESSION_FILE, get_channel_gifts.API_ID,
+                                       get_channel_gifts.API_HASH)
+        return await get_channel_gifts.collect_channel_gifts(params['username'], client=client)
+
+    async def health(self, params: Dict[str, str]) -> Dict[str, Any]:
+        status = {
+            "success": True,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "requests_served": self.requests_served,
+            "requests_in_flight": len(self._inflight),
+            "telegram_clients": sum(1 for c in self._clients.values() if c.is_connected()),
+            "http": http_client.get_metrics(),
+        }
+        try:
+            from utils.global_price_cache import get_metrics
+            status["price_cache"] = get_metrics()
+        except ImportError:
+            pass
+        if get_profile_gifts.PORTAL_MARKET_API_AVAILABLE:
+            from services.portal_market_api import get_rate_limits
+            from services.portal_market_multi_account import get_multi_account_api
+            status["rate_limits"] = get_rate_limits()
+            status["portal_accounts"] = (await get_multi_account_api(self.gifts_dir)).get_account_stats()
+        return status
+
+    async def dispatch(self, path: str, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """Route one request; returns (HTTP status, JSON body)"""
+        handler = self.routes.get(path)
+        if handler is None:
+            return 404, {"success": False, "error": f"Unknown endpoint: {path}"}
+        if path == '/health':
+            return 200, await handler(params)
+
+        key = (path, json.dumps(params, sort_keys=True))
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(handler(params))
+            self._inflight[key] = task
+            task.add_done_callback(
+                lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None
+            )
+        # A client hanging up must not cancel work other requests are waiting on
+        result = await asyncio.shield(task)
+        self.requests_served += 1
+        return 200, result
+
+    async def stream_profile_gifts(self, params: Dict[str, str], writer: asyncio.StreamWriter):
+        """NDJSON response: the gift list, price updates as they resolve, then a summary record"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+
+        def write_record(record):
+            # Keep going if the client hangs up - the result still lands in the portfolio cache
+            if not writer.is_closing():
+                writer.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+
+        try:
+            output = await self.profile_gifts(params, on_event=write_record)
+        except Exception as e:
+            print(f"❌ /profile-gifts stream failed: {e}", file=sys.stderr)
+            output = {"success": False, "error": str(e)}
+        write_record(get_profile_gifts.summary_record(output))
+        self.requests_served += 1
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one HTTP/1.1 request and close the connection"""
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.LimitOverrunError:
+                head = b""
+            except asyncio.IncompleteReadError as e:
+                head = e.partial
+            if len(head) > MAX_REQUEST_SIZE or not head:
+                status, body = 400, {"success": False, "error": "Bad request"}
+            else:
+                parts = head.split(b"\r\n", 1)[0].decode("latin-1").split()
+                if len(parts) != 3:
+                    status, body = 400, {"success": False, "error": "Bad request"}
+                elif parts[0] != "GET":
+                    status, body = 405, {"success": False, "error": "Only GET is supported"}
+                else:
+                    url = urlsplit(parts[1])
+                    params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                    if url.path == '/profile-gifts' and params.pop('stream', None) == '1':
+                        await self.stream_profile_gifts(params, writer)
+                        return
+                    try:
+                        status, body = await self.dispatch(url.path, params)
+                    except Exception as e:
+                        print(f"❌ {url.path} failed: {e}", file=sys.stderr)
+                        status, body = 500, {"success": False, "error": str(e)}
+
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """Bind the Unix socket (replacing a stale one left by a crashed service)"""
+        if os.path.exists(self.socket_path):
+            try:
+                _, probe = await asyncio.open_unix_connection(self.socket_path)
+                probe.close()
+                raise RuntimeError(f"Portfolio service already running on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(
+            self.handle_connection, path=self.socket_path, limit=MAX_REQUEST_SIZE
+        )
+        os.chmod(self.socket_path, 0o600)
+        print(f"✅ Portfolio service listening on {self.socket_path}", file=sys.stderr)
+
+    async def close(self):
+        """Stop accepting requests and disconnect the Telegram clients"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for client in self._clients.values():
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+        self._clients.clear()
+        await http_client.close()
+        await portal_session.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    async def run(self):
+        """Serve until SIGINT/SIGTERM"""
+        await self.start()
+        await self.warm_up()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            await stop.wait()
+        finally:
+            print("🛑 Portfolio service stopping", file=sys.stderr)
+            await self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resident portfolio service (HTTP over a Unix socket)")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path")
+    args = parser.parse_args()
+
+    if not args.socket:
+        print("❌ No socket path configured (PORTFOLIO_SERVICE_SOCKET is empty)", file=sys.stderr)
+        sys.exit(1)
+    asyncio.run(PortfolioService(args.socket).run())
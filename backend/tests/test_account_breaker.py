@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test that failing Portal accounts trip their circuit breaker
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+import pytest
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+from services import portal_market_api
+from services.portal_market_api import PortalMarketAPI
+from services.portal_market_multi_account import AccountHealth, MultiAccountPortalMarketAPI
+
+
+class Account(PortalMarketAPI):
+    """Account whose searches fail, or find one gift at 5 TON"""
+
+    def __init__(self, session_name, error=None):
+        super().__init__(api_id=1, api_hash="hash", session_name=session_name)
+        self.error = error
+        self.searches = 0
+
+    async def search_gifts(self, **kwargs):
+        self.searches += 1
+        await asyncio.sleep(0.01)
+        if self.error:
+            raise self.error
+        return [SimpleNamespace(price=5.0)]
+
+    async def get_gift_floor_price(self, gift_name):
+        return None
+
+
+@pytest.fixture(autouse=True)
+def limiter_db(monkeypatch, tmp_path):
+    """Keep the scheduler's backoff lookups off the shared limiter database"""
+    limiter = portal_market_api._limiter
+    monkeypatch.setattr(limiter, "db_path", str(tmp_path / "bot_data.db"))
+    monkeypatch.setattr(limiter, "_conn", None)
+    monkeypatch.setattr(limiter, "_pending_successes", {})
+    yield limiter
+    if limiter._conn is not None:
+        limiter._conn.close()
+
+
+def _multi_account_api(*accounts):
+    api = MultiAccountPortalMarketAPI()
+    api.accounts = list(accounts)
+    api.health = {account.session_name: AccountHealth() for account in accounts}
+    api._initialized = True
+    return api
+
+
+def test_failing_account_opens_breaker():
+    """Failed lookups count as failures and open the breaker after the threshold"""
+    good, bad = Account("good"), Account("bad", error=Exception("timeout"))
+    api = _multi_account_api(good, bad)
+
+    async def run():
+        for _ in range(3):
+            try:
+                await api._run_on(bad, "get_gift_price", "Gift", model="model")
+                assert False, "expected the request error"
+            except Exception as e:
+                assert "timeout" in str(e)
+        return await asyncio.gather(*[api.get_gift_price("Gift", model="model") for _ in range(10)])
+
+    prices = asyncio.run(run())
+    stats = api.get_account_stats()
+    assert stats['bad']['state'] == AccountHealth.OPEN
+    assert stats['bad']['failures'] == 3
+    # With the breaker open, every later request goes to the healthy account
+    assert prices == [5.0] * 10
+    assert bad.searches == 3
+    assert stats['good']['state'] == AccountHealth.CLOSED
+    print("   ✅ 3 failures opened the breaker, healthy account took the rest")
+
+
+def test_parallel_fetch_routes_around_failures():
+    """fetch_prices_parallel stops sending work to an account once its breaker opens"""
+    good, bad = Account("good"), Account("bad", error=Exception("429 Too Many Requests"))
+    api = _multi_account_api(good, bad)
+    requests = [{"id": f"gift-{i}", "gift_name": "Gift", "model": "model"} for i in range(20)]
+
+    results = asyncio.run(api.fetch_prices_parallel(requests, max_concurrent=1))
+    assert len(results) == 20
+    assert api.health['bad'].state == AccountHealth.OPEN
+    assert bad.searches == api.health['bad'].failure_threshold
+    assert sum(1 for price in results.values() if price == 5.0) == 20 - bad.searches
+    print(f"   ✅ Breaker opened after {bad.searches} failures, {20 - bad.searches} gifts priced")
+
+
+def test_backoff_read_off_event_loop():
+    """Limiter blocks are read in a thread, so a held limiter lock doesn't stall the loop"""
+    api = _multi_account_api(Account("good"))
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.time())
+            await asyncio.sleep(0)
+
+    async def run():
+        portal_market_api._limiter.on_throttle("good", retry_after=30)
+        with portal_market_api._limiter._lock:
+            # Hold the limiter lock like a worker thread mid-transaction
+            task = asyncio.ensure_future(api._refresh_backoff())
+            await ticker()
+            assert not task.done()
+        await task
+
+    asyncio.run(run())
+    assert len(ticks) == 5
+    assert 29 < api._backoff_for(api.accounts[0]) <= 30
+    print("   ✅ Event loop kept running while the backoff was read")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing Portal account circuit breaker")
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test atomic first-solver detection for the daily game
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+from core.database import BotDatabase
+
+
+def test_concurrent_solvers():
+    """Only one concurrent solver is first and ranks are unique"""
+    db = BotDatabase(os.path.join(tempfile.mkdtemp(), "bot_data.db"))
+    results = []
+    
+    def solve(user_id):
+        results.append(db.solve_daily_question(user_id, "2025-01-01", "12:00", "answer"))
+    
+    threads = [threading.Thread(target=solve, args=(user_id,)) for user_id in range(1, 21)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sum(1 for _, is_first, _, _ in results if is_first) == 1
+    assert sorted(rank for _, _, rank, _ in results) == list(range(1, 21))
+    assert db.get_daily_game_solvers("2025-01-01", "12:00") == 20
+    print("   ✅ 20 concurrent solvers, exactly one first")
+
+
+def test_repeat_solve():
+    """A second answer from the same user is reported as already solved"""
+    db = BotDatabase(os.path.join(tempfile.mkdtemp(), "bot_data.db"))
+    assert db.solve_daily_question(1, "2025-01-01", "12:00", "answer") == (False, True, 1, 1)
+    assert db.solve_daily_question(2, "2025-01-01", "12:00", "answer") == (False, False, 2, 2)
+    assert db.solve_daily_question(1, "2025-01-01", "12:00", "answer") == (True, True, 1, 2)
+    
+    # Solves written by another process are picked up by the cached count
+    BotDatabase(db.db_path).record_daily_game_solve(3, "2025-01-01", "12:00", "answer")
+    assert db.get_daily_game_solvers("2025-01-01", "12:00") == 3
+    print("   ✅ Repeat solve and external writes handled")
+
+
+def test_duplicates_removed_before_unique_indexes():
+    """Duplicate solves from before the unique indexes are dropped, keeping the earliest"""
+    db_path = os.path.join(tempfile.mkdtemp(), "bot_data.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE daily_game_solves (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, date TEXT, time_slot TEXT,
+                answer TEXT, is_first_solver BOOLEAN DEFAULT 0, solved_at REAL DEFAULT 0
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO daily_game_solves (user_id, date, time_slot, answer, is_first_solver) VALUES (?, ?, ?, ?, ?)",
+            [(1, "2025-01-01", "12:00", "first", 1), (2, "2025-01-01", "12:00", "raced", 1),
+             (1, "2025-01-01", "12:00", "repeat", 0), (1, "2025-01-02", "12:00", "next day", 1)]
+        )
+
+    db = BotDatabase(db_path)
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT user_id, date, answer, is_first_solver FROM daily_game_solves ORDER BY id"
+        ).fetchall()
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert rows == [(1, "2025-01-01", "first", 1), (2, "2025-01-01", "raced", 0), (1, "2025-01-02", "next day", 1)]
+    assert {"idx_daily_game_solves_user_slot", "idx_daily_game_solves_first"} <= indexes
+    assert db.solve_daily_question(1, "2025-01-01", "12:00", "again") == (True, True, 1, 2)
+    print("   ✅ Duplicates removed and unique indexes created")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing daily game solve path")
+    test_concurrent_solvers()
+    test_repeat_solve()
+    test_duplicates_removed_before_unique_indexes()
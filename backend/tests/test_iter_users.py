@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test streaming user iteration for broadcasts and exports
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+from core.database import BotDatabase
+
+
+def _populate(db, count):
+    now = time.time()
+    with sqlite3.connect(db.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, username, created_at, last_activity, credits) VALUES (?, ?, ?, ?, 20)",
+            [(user_id, f"user{user_id}", now, now - user_id * 60) for user_id in range(1, count + 1)]
+        )
+
+
+def test_activity_during_iteration():
+    """Users who interact mid-iteration are still yielded exactly once"""
+    db = BotDatabase(os.path.join(tempfile.mkdtemp(), "bot_data.db"))
+    _populate(db, 250)
+
+    seen = []
+    for user in db.iter_users(batch_size=20):
+        seen.append(user['user_id'])
+        # Every few users, someone further down the list interacts with the bot
+        if len(seen) % 7 == 0:
+            db.get_user(251 - len(seen) // 7)
+            db.get_user(min(len(seen) + 30, 250))
+
+    assert sorted(seen) == list(range(1, 251))
+    assert len(seen) == len(set(seen))
+    print("   ✅ 250 users yielded once while last_activity changed")
+
+
+def test_active_since_filter():
+    """active_since filters users without affecting pagination"""
+    db = BotDatabase(os.path.join(tempfile.mkdtemp(), "bot_data.db"))
+    _populate(db, 100)
+    cutoff = time.time() - 50.5 * 60
+
+    seen = [user['user_id'] for user in db.iter_users(active_since=cutoff, batch_size=7)]
+    assert seen == list(range(1, 51))
+    print("   ✅ active_since keeps the 50 most recently active users")
+
+
+def test_count_and_list_wrappers():
+    """count_users filters by id list; the list wrappers keep most recently active first"""
+    db = BotDatabase(os.path.join(tempfile.mkdtemp(), "bot_data.db"))
+    _populate(db, 20)
+
+    assert db.count_users(user_ids={3, 7, 999}) == 2
+    assert db.count_users(user_ids=[]) == 0
+    assert db.count_users(days=1, user_ids={3, 7}) == 2
+    # user 1 was active most recently
+    assert [u['user_id'] for u in db.get_all_users()] == list(range(1, 21))
+    db.get_user(20)
+    assert db.get_all_users()[0]['user_id'] == 20
+    assert db.get_active_users(30)[0]['user_id'] == 20
+    print("   ✅ VIP-style count by id list, lists ordered by last activity")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing user iteration")
+    test_activity_during_iteration()
+    test_active_since_filter()
+    test_count_and_list_wrappers()
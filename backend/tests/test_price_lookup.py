@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Test that "no listing" and request failures are kept apart in price lookups
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+import pytest
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+from services.get_profile_gifts import resolve_price_with_retry
+from services.portal_market_api import PortalMarketAPI
+from services import portal_price_resolver
+from services.portal_price_resolver import CollectionPriceResolver
+from utils import global_price_cache
+
+
+class FakeApi:
+    """Portal API double: empty answers, or a failure on every request"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    async def _answer(self, value):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.error:
+            raise self.error
+        return value
+
+    async def get_filter_floors(self, gift_name):
+        return await self._answer(SimpleNamespace(models={}, backdrops={}))
+
+    async def search_gifts(self, **kwargs):
+        return await self._answer([])
+
+    async def get_gift_floor_price(self, gift_name):
+        return await self._answer(None)
+
+
+@pytest.fixture
+def price_cache(monkeypatch, tmp_path):
+    """global_price_cache on a temporary database, restored after the test"""
+    global_price_cache.close()
+    monkeypatch.setattr(global_price_cache, "DB_PATH", str(tmp_path / "bot_data.db"))
+    monkeypatch.setattr(global_price_cache, "_memory", OrderedDict())
+    yield global_price_cache
+    global_price_cache.close()
+
+
+def test_no_listing_is_negative(price_cache):
+    """An empty answer resolves to None at once and is stored as a negative entry"""
+    api = FakeApi()
+    price = asyncio.run(resolve_price_with_retry(
+        CollectionPriceResolver(api), "EmptyCollection", "model", "backdrop", base_delay=0.01
+    ))
+    assert price is None
+    assert api.calls == 2  # filterFloors + collection floor, no retries
+
+    price_cache.set_many([("emptycollection", "model", "backdrop", None)])
+    entries = price_cache.lookup_many([("emptycollection", "model", "backdrop")])
+    assert entries == {("emptycollection", "model", "backdrop"): (None, price_cache.NEGATIVE)}
+    print("   ✅ No listing -> None, cached as negative")
+
+
+def test_stale_memory_entry_refreshed_from_database(price_cache):
+    """A stale or negative entry in memory gives way to a newer row another process wrote"""
+    stale, negative = ("stalegift", "model", "backdrop"), ("missinggift", "model", "backdrop")
+    old = time.time() - price_cache.CACHE_TTL - 60
+    price_cache._remember(price_cache.get_cache_key(*stale), 1.0, old)
+    price_cache._remember(price_cache.get_cache_key(*negative), None, time.time() - 10)
+
+    # Another process refreshes both keys: only the shared table sees the new prices
+    with price_cache._conn_lock:
+        conn = price_cache._get_connection()
+        with conn:
+            conn.executemany("INSERT INTO global_price_cache (cache_key, price, cached_at) VALUES (?, ?, ?)", [
+                (price_cache.get_cache_key(*stale), 2.0, int(time.time())),
+                (price_cache.get_cache_key(*negative), 3.0, int(time.time())),
+            ])
+
+    entries = price_cache.lookup_many([stale, negative])
+    assert entries == {stale: (2.0, price_cache.FRESH), negative: (3.0, price_cache.FRESH)}
+
+    # Nothing newer in the database: the stale memory entry is still served
+    other = ("othergift", "model", None)
+    price_cache._remember(price_cache.get_cache_key(*other), 4.0, old)
+    assert price_cache.lookup_many([other]) == {other: (4.0, price_cache.STALE)}
+    print("   ✅ Stale/negative memory entries replaced by newer database rows")
+
+
+def test_renewed_lease_outlives_its_ttl(price_cache):
+    """A renewed lease keeps other processes off the key after the first TTL ran out"""
+    key = ("leasedgift", "model", "backdrop")
+    assert price_cache.acquire_leases([key], "fetcher", ttl=0.2) == {key}
+    assert price_cache.renew_leases([key], "fetcher") == 1
+    assert price_cache.renew_leases([key], "someone-else") == 0
+    time.sleep(0.3)
+    assert price_cache.acquire_leases([key], "other") == set()
+
+    # Without the renewal the key is taken over once the lease expires
+    price_cache.release_leases([key], "fetcher")
+    assert price_cache.acquire_leases([key], "fetcher", ttl=0.2) == {key}
+    time.sleep(0.3)
+    assert price_cache.acquire_leases([key], "other") == {key}
+    print("   ✅ Renewed lease held past its TTL, unrenewed one taken over")
+
+
+def test_transport_error_is_raised():
+    """Timeouts/429s are retried, then raised - never returned as "no listing" """
+    api = FakeApi(error=Exception("Failed to get filter floors: 429 Too Many Requests"))
+    try:
+        asyncio.run(resolve_price_with_retry(
+            CollectionPriceResolver(api), "FailingCollection", "model", None, base_delay=0.01
+        ))
+        assert False, "expected the transport error"
+    except Exception as e:
+        assert "429" in str(e)
+    assert api.calls == 3
+    # A failed index is not cached
+    assert "failingcollection" not in portal_price_resolver._collection_floors
+    print("   ✅ Transport error retried 3 times and raised")
+
+
+def test_shared_lookup_shares_error():
+    """Concurrent lookups of one key share a single request and all see its error"""
+    api = FakeApi(error=Exception("connection reset"))
+    resolver = CollectionPriceResolver(api)
+
+    async def run():
+        return await asyncio.gather(*[resolver.resolve("SharedCollection", "model") for _ in range(5)],
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, Exception) for result in results)
+    assert api.calls == 1
+    print("   ✅ 5 waiters, 1 request, 5 errors")
+
+
+def test_account_get_gift_price():
+    """PortalMarketAPI.get_gift_price raises on failures and returns None only for no listing"""
+
+    class Account(PortalMarketAPI):
+        def __init__(self, error=None):
+            super().__init__(api_id=1, api_hash="hash", session_name="test_session")
+            self.error = error
+
+        async def search_gifts(self, **kwargs):
+            if self.error:
+                raise self.error
+            return []
+
+        async def get_gift_floor_price(self, gift_name):
+            return None
+
+    assert asyncio.run(Account().get_gift_price("Gift", model="model", backdrop="backdrop")) is None
+    for model, backdrop in (("model", "backdrop"), ("model", None), (None, "Onyx Black")):
+        try:
+            asyncio.run(Account(Exception("timeout")).get_gift_price("Gift", model=model, backdrop=backdrop))
+            assert False, "expected the request error"
+        except Exception as e:
+            assert "timeout" in str(e)
+    print("   ✅ get_gift_price: None for no listing, raises on failure")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing price lookup errors vs. no listing")
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test the indexed stickers.tools pricing cache
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import pytest
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+from services import get_sticker_profile
+
+PAYLOAD = {
+    'collections': {
+        '1': {
+            'name': 'Pudgy Penguins',
+            'stickers': {
+                '10': {'name': 'Blue Pengu', 'init_price_usd': 5, 'current': {'price': {'floor': {'usd': 12.5}}}},
+                '11': {'name': 'blue pengu', 'init_price_usd': 9, 'current': {'price': {'floor': {'usd': 99}}}},
+                '12': {'name': 'Cool Pengu', 'init_price_usd': 3}
+            }
+        }
+    }
+}
+
+
+class PricingApi:
+    """Stand-in for get_pricing_data that counts stickers.tools requests"""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.payload
+
+
+@pytest.fixture
+def pricing_api(monkeypatch, tmp_path):
+    """Temporary pricing cache and a counting stickers.tools stand-in, restored after the test"""
+    api = PricingApi(PAYLOAD)
+    monkeypatch.setattr(get_sticker_profile, "PRICING_CACHE_DB", str(tmp_path / "bot_data.db"))
+    monkeypatch.setattr(get_sticker_profile, "pricing_index", None)
+    monkeypatch.setattr(get_sticker_profile, "pricing_index_at", 0.0)
+    monkeypatch.setattr(get_sticker_profile, "get_pricing_data", api)
+    return api
+
+
+def test_index_pricing_data():
+    """Names are lower-cased, the first sticker with a name wins, missing prices are 0"""
+    index = get_sticker_profile.index_pricing_data(PAYLOAD)
+    assert index == {'pudgy penguins': {'blue pengu': (5, 12.5), 'cool pengu': (3, 0)}}
+    print("   ✅ Pricing payload indexed by collection and sticker name")
+
+
+def test_pricing_index_reused(pricing_api):
+    """The index is fetched once per TTL, and later runs load it from the database"""
+    api = pricing_api
+    first = asyncio.run(get_sticker_profile.get_pricing_index())
+    again = asyncio.run(get_sticker_profile.get_pricing_index())
+    assert first is again
+    assert api.calls == 1
+
+    # A new process: nothing in memory, the stored index is still fresh
+    get_sticker_profile.pricing_index = None
+    stored = asyncio.run(get_sticker_profile.get_pricing_index())
+    assert stored == json.loads(json.dumps(first))
+    assert api.calls == 1
+    print("   ✅ One stickers.tools request per TTL, shared through the database")
+
+
+def test_stale_index_when_unreachable(pricing_api):
+    """Past the TTL the index is fetched again, and a stale one is used if that fails"""
+    api = pricing_api
+    asyncio.run(get_sticker_profile.get_pricing_index())
+    get_sticker_profile._save_pricing_index(time.time() - get_sticker_profile.PRICING_CACHE_TTL - 1,
+                                            get_sticker_profile.pricing_index)
+    get_sticker_profile.pricing_index = None
+    api.payload = None
+
+    index = asyncio.run(get_sticker_profile.get_pricing_index())
+    assert api.calls == 2
+    assert index['pudgy penguins']['blue pengu'] == [5, 12.5]
+    print("   ✅ Expired index refetched, stale copy served while stickers.tools is down")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing sticker pricing index")
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test token vault storage, expiry and refresh
+"""
+import asyncio
+import os
+import stat
+import sys
+import time
+import pytest
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+from utils import token_vault
+
+
+@pytest.fixture
+def vault(monkeypatch, tmp_path):
+    """token_vault on a temporary file, its module state restored after the test"""
+    monkeypatch.setattr(token_vault, "DB_PATH", str(tmp_path / "token_vault.db"))
+    monkeypatch.setattr(token_vault, "_conn", None)
+    monkeypatch.setattr(token_vault, "_memory", {})
+    monkeypatch.setattr(token_vault, "_inflight", {})
+    monkeypatch.setattr(token_vault, "_background", set())
+    yield token_vault
+    if token_vault._conn is not None:
+        token_vault._conn.close()
+
+
+class Login:
+    """Counts logins and hands out token-1, token-2, ..."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return f"token-{self.calls}"
+
+
+def test_vault_file_is_private(vault, monkeypatch, tmp_path):
+    """The vault file is created 0600, and an existing file is tightened to 0600"""
+    vault.store("mrkt", "secret", ttl=60)
+    assert stat.S_IMODE(os.stat(vault.DB_PATH).st_mode) == 0o600
+
+    vault._conn.close()
+    monkeypatch.setattr(vault, "_conn", None)
+    monkeypatch.setattr(vault, "DB_PATH", str(tmp_path / "existing.db"))
+    with open(vault.DB_PATH, "w"):
+        pass
+    os.chmod(vault.DB_PATH, 0o644)
+    vault.store("mrkt", "secret", ttl=60)
+    assert stat.S_IMODE(os.stat(vault.DB_PATH).st_mode) == 0o600
+    print("   ✅ Vault file is 0600")
+
+
+def test_expired_token_logs_in_again(vault):
+    """A stored token is reused until it expires, then fetch runs once"""
+    login = Login()
+
+    async def run():
+        first = await vault.get_token("quant", login, ttl=0.3)
+        again = await vault.get_token("quant", login, ttl=0.3)
+        await asyncio.sleep(0.35)
+        assert vault.load("quant") is None
+        # Concurrent callers share one login
+        after_expiry = await asyncio.gather(*[vault.get_token("quant", login, ttl=60) for _ in range(5)])
+        return first, again, after_expiry
+
+    first, again, after_expiry = asyncio.run(run())
+    assert first == again == "token-1"
+    assert after_expiry == ["token-2"] * 5
+    assert login.calls == 2
+    print("   ✅ Token reused until expiry, then one shared login")
+
+
+def test_refresh_ahead_in_background(vault):
+    """Past refresh_ahead the old token is returned and a new one is fetched in the background"""
+    login = Login()
+
+    async def run():
+        await vault.get_token("mrkt", login, ttl=1.0)
+        await asyncio.sleep(0.85)
+        # Callers that close what fetch needs opt out of background logins
+        assert await vault.get_token("mrkt", login, ttl=1.0, background_refresh=False) == "token-1"
+        assert not vault._background and login.calls == 1
+
+        token = await vault.get_token("mrkt", login, ttl=1.0)
+        # The task is kept referenced until it is done
+        assert len(vault._background) == 1
+        await asyncio.gather(*vault._background)
+        return token
+
+    assert asyncio.run(run()) == "token-1"
+    assert not vault._background
+    assert vault.load("mrkt").token == "token-2"
+    assert login.calls == 2
+    print("   ✅ Old token served while token-2 was fetched in the background")
+
+
+def test_vault_io_off_event_loop(vault):
+    """Vault reads, writes and leases run in threads, so a held vault lock doesn't stall the loop"""
+    login = Login()
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.time())
+            await asyncio.sleep(0)
+
+    async def run():
+        with vault._conn_lock:
+            # Hold the vault lock like a thread waiting on another process's write
+            task = asyncio.ensure_future(vault.get_token("stickerdom", login, ttl=60))
+            await ticker()
+            assert not task.done()
+        return await task
+
+    assert asyncio.run(run()) == "token-1"
+    assert len(ticks) == 5
+    print("   ✅ Event loop kept running while the vault waited on its lock")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing token vault")
+    sys.exit(pytest.main([__file__, "-q"]))
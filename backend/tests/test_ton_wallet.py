@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test the TON Center transaction hash lookup used after withdrawals
+"""
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+import pytest
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+# The wallet modules use flat imports (memo_system, transaction_tracker, address_utils)
+sys.path.insert(0, os.path.join(bot_root, 'core'))
+sys.path.insert(0, os.path.join(bot_root, 'utils'))
+pytest.importorskip("pytoniq")
+import ton_wallet
+from utils import http_client
+
+WALLET_ADDRESS = "UQBotWalletAddress"
+
+
+def _service():
+    service = ton_wallet.TONWalletService(mnemonic="word " * 24)
+    service.wallet = SimpleNamespace(address=SimpleNamespace(to_str=lambda **kwargs: WALLET_ADDRESS))
+    return service
+
+
+def _stub_get(monkeypatch, status, payload):
+    calls = []
+
+    async def get(url, **kwargs):
+        calls.append((url, kwargs))
+        return http_client.HttpResponse(status, {}, json.dumps(payload).encode(), url)
+
+    monkeypatch.setattr(http_client, "get", get)
+    return calls
+
+
+def test_real_hash_from_toncenter(monkeypatch):
+    """The latest wallet transaction's hash is returned, in either response shape"""
+    calls = _stub_get(monkeypatch, 200, {'transactions': [{'hash': 'abc123'}, {'hash': 'older'}]})
+    assert asyncio.run(_service()._get_real_transaction_hash("local")) == "abc123"
+    url, kwargs = calls[0]
+    assert url == "https://toncenter.com/api/v3/transactions"
+    assert kwargs['params']['account'] == WALLET_ADDRESS
+
+    _stub_get(monkeypatch, 200, {'transactions': [{'hash': {'hash': 'nested456'}}]})
+    assert asyncio.run(_service()._get_real_transaction_hash("local")) == "nested456"
+    print("   ✅ Real transaction hash read through http_client")
+
+
+def test_no_hash_on_error(monkeypatch):
+    """An error response or an empty history gives None"""
+    _stub_get(monkeypatch, 500, {})
+    assert asyncio.run(_service()._get_real_transaction_hash("local")) is None
+    _stub_get(monkeypatch, 200, {'transactions': []})
+    assert asyncio.run(_service()._get_real_transaction_hash("local")) is None
+    print("   ✅ No hash for an error or an empty history")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing TON transaction hash lookup")
+    sys.exit(pytest.main([__file__, "-q"]))
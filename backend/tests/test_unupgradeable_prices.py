@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test MRKT/Quant price fetching for unupgradeable gifts
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+import pytest
+bot_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, bot_root)
+pytest.importorskip("telethon")
+from services import get_unupgradeable_prices as prices
+from utils.gift_catalog import CatalogEntry, GiftCatalog
+
+BOOTS = "6001229799790478558"
+PEPE = "5936013938331222567"
+
+CATALOG = GiftCatalog({
+    BOOTS: CatalogEntry("Durov's Boots", 100, 0.0, "DurovsBoots", "Durov's Boots"),
+    PEPE: CatalogEntry("Plush Pepe", 100, 0.0, "PlushPepe", "Plush Pepe"),
+})
+
+
+@pytest.fixture
+def price_cache(monkeypatch, tmp_path):
+    """Price cache on a temporary database (no legacy JSON), restored after the test"""
+    monkeypatch.setattr(prices, "CACHE_DB_PATH", str(tmp_path / "bot_data.db"))
+    monkeypatch.setattr(prices, "CACHE_FILE", str(tmp_path / "unupgradeable_prices_cache.json"))
+    monkeypatch.setattr(prices, "_cache_conn", None)
+    monkeypatch.setattr(prices, "_memory_cache", {})
+    monkeypatch.setattr(prices, "_memory_loaded_at", 0.0)
+    monkeypatch.setattr(prices, "get_catalog", lambda: CATALOG)
+    yield prices
+    if prices._cache_conn is not None:
+        prices._cache_conn.close()
+
+
+def _new_process(module):
+    """Drop the connection and the in-process copy, as in a newly started process (the fixture restores them)"""
+    module._cache_conn.close()
+    module._cache_conn = None
+    module._memory_cache = {}
+    module._memory_loaded_at = 0.0
+
+
+def returns(result):
+    async def fetch(telegram_client, background_refresh=True):
+        return result
+    return fetch
+
+
+def raises(error):
+    async def fetch(telegram_client, background_refresh=True):
+        raise error
+    return fetch
+
+
+async def hangs(telegram_client, background_refresh=True):
+    await asyncio.sleep(30)
+
+
+def test_both_marketplaces_merged(price_cache, monkeypatch):
+    """MRKT names map to gift ids and win over Quant; both are written to the cache"""
+    monkeypatch.setattr(price_cache, "fetch_mrkt_prices", returns({"Durov's Boots": 900.0}))
+    monkeypatch.setattr(price_cache, "fetch_quant_prices", returns(({BOOTS: 800.0, PEPE: 5000.0}, {})))
+
+    final = asyncio.run(price_cache.fetch_unupgradeable_prices())
+    assert final == {BOOTS: 900.0, PEPE: 5000.0}
+    cache = price_cache.load_cache()
+    assert cache[BOOTS]['source'] == 'mrkt'
+    assert cache[PEPE]['source'] == 'quant'
+    print("   ✅ MRKT and Quant merged, MRKT preferred")
+
+
+def test_slow_marketplace_times_out(price_cache, monkeypatch):
+    """A marketplace past MARKET_FETCH_TIMEOUT is dropped; the other one's prices are used"""
+    monkeypatch.setattr(price_cache, "MARKET_FETCH_TIMEOUT", 0.2)
+    monkeypatch.setattr(price_cache, "fetch_mrkt_prices", hangs)
+    monkeypatch.setattr(price_cache, "fetch_quant_prices", returns(({PEPE: 5000.0}, {})))
+
+    start = time.time()
+    final = asyncio.run(price_cache.fetch_unupgradeable_prices())
+    assert time.time() - start < 2
+    assert final == {PEPE: 5000.0}
+    print("   ✅ Stuck MRKT fetch cut off at the deadline, Quant prices kept")
+
+
+def test_failed_marketplace_falls_back_to_cache(price_cache, monkeypatch):
+    """A failing marketplace doesn't fail the call: its gifts come from the cache"""
+    price_cache.save_cache({BOOTS: {'price': 700.0, 'timestamp': time.time(), 'source': 'mrkt'}})
+    monkeypatch.setattr(price_cache, "fetch_mrkt_prices", raises(Exception("502 Bad Gateway")))
+    monkeypatch.setattr(price_cache, "fetch_quant_prices", returns(({PEPE: 5000.0}, {})))
+
+    final = asyncio.run(price_cache.fetch_unupgradeable_prices())
+    assert final == {BOOTS: 700.0, PEPE: 5000.0}
+    print("   ✅ MRKT failure -> cached Boots price, live Quant prices")
+
+
+def test_older_upsert_keeps_newer_row(price_cache):
+    """A run that fetched earlier can't overwrite a price a later run already saved"""
+    now = time.time()
+    price_cache.save_cache({PEPE: {'price': 5000.0, 'timestamp': now, 'source': 'quant'}})
+    # A slower concurrent run, from its own connection, saves what it fetched a minute ago
+    other = sqlite3.connect(price_cache.CACHE_DB_PATH)
+    price_cache._upsert(other, {PEPE: {'price': 4000.0, 'timestamp': now - 60, 'source': 'mrkt'}})
+    other.close()
+    price_cache.save_cache({PEPE: {'price': 4500.0, 'timestamp': now - 30, 'source': 'mrkt'}})
+
+    assert price_cache.load_cache()[PEPE] == {'price': 5000.0, 'timestamp': now, 'source': 'quant'}
+    _new_process(price_cache)
+    assert price_cache.load_cache()[PEPE]['price'] == 5000.0
+    print("   ✅ Older upserts ignored, newest price kept")
+
+
+def test_legacy_json_imported_once(price_cache):
+    """The old JSON cache seeds an empty table once and is ignored after that"""
+    now = time.time()
+    with open(price_cache.CACHE_FILE, "w") as f:
+        json.dump({BOOTS: {'price': 700.0, 'timestamp': now, 'source': 'mrkt'}}, f)
+    assert price_cache.load_cache()[BOOTS]['price'] == 700.0
+
+    with open(price_cache.CACHE_FILE, "w") as f:
+        json.dump({BOOTS: {'price': 1.0, 'timestamp': now + 10, 'source': 'mrkt'}}, f)
+    _new_process(price_cache)
+    assert price_cache.load_cache()[BOOTS]['price'] == 700.0
+    print("   ✅ Legacy JSON imported into the empty table only")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing unupgradeable gift prices")
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""
+SQLite database locations shared by the backend processes
+"""
+
+# Deployed bot database, also opened by the Next.js frontend. Holds the price and
+# portfolio caches and the rate limiter state every process shares.
+SHARED_DB_PATH = '/root/01studio/CollectibleKIT/bot/bot_data.db'
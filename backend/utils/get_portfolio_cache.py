@@ -2,35 +2,198 @@
 """
 Helper functions for portfolio cache management
 Works with SQLite database to store/retrieve cached portfolio data
+
+Storage format (portfolio_auto_gifts_cache.gifts_data):
+- PAYLOAD_MAGIC + version byte + zlib-compressed JSON list of compact gift records.
+  A record holds the GIFT_FIELDS values in order; fragment URLs, links, supply and
+  display strings are rebuilt from them on read. Gifts that don't round-trip
+  exactly are stored as {"raw": gift}.
+- Legacy rows (and rows written by the Next.js side) are plain JSON text and are
+  still read as-is.
+Rows written here also get gift_count / nft_count columns and one
+portfolio_gift_holdings row per gift, so totals and single pages are read
+without decoding the whole payload.
 """
 import sqlite3
 import json
 import os
+import re
 import sys
 import time
-from typing import Optional, Dict, Any
+import zlib
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+from utils.db_paths import SHARED_DB_PATH
 
 # Database path (same as Next.js uses)
-DB_PATH = '/root/01studio/CollectibleKIT/bot/bot_data.db'
+DB_PATH = SHARED_DB_PATH
+
+# Seconds a gift price in the cached portfolio is reused by incremental refreshes
+PRICE_REFRESH_TTL = float(os.getenv("PORTFOLIO_PRICE_TTL", "600"))
+
+# Header of compact gifts_data payloads (followed by one version byte)
+PAYLOAD_MAGIC = b"PGC"
+PAYLOAD_VERSION = 1
+
+# Values kept per gift, in record order (version 1)
+GIFT_FIELDS = (
+    'slug', 'title', 'gift_id', 'num', 'pinned', 'is_upgraded', 'is_unupgradeable', 'is_unupgraded',
+    'model_name', 'model_rarity', 'backdrop_name', 'backdrop_rarity', 'pattern_name', 'pattern_rarity',
+    'availability_issued', 'availability_total', 'total_supply', 'price', 'price_updated_at'
+)
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio_auto_gifts_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL UNIQUE,
+            gifts_data TEXT NOT NULL,
+            total_value REAL NOT NULL,
+            cached_at REAL NOT NULL,
+            is_fetching INTEGER DEFAULT 0,
+            fetch_started_at INTEGER DEFAULT NULL
+        )
+    """)
+    # NULL when the row was last written by the Next.js side (plain JSON, no holdings)
+    for column in ('gift_count', 'nft_count'):
+        try:
+            conn.execute(f"ALTER TABLE portfolio_auto_gifts_cache ADD COLUMN {column} INTEGER DEFAULT NULL")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio_gift_holdings (
+            user_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            gift_key TEXT,
+            price REAL,
+            price_updated_at INTEGER,
+            record TEXT NOT NULL,
+            PRIMARY KEY (user_id, position)
+        ) WITHOUT ROWID
+    """)
+    return conn
+
+def _expand_gift(record) -> Dict[str, Any]:
+    """Rebuild the full gift dict (as produced by get_profile_gifts) from a compact record"""
+    if isinstance(record, dict):
+        return record['raw']
+    g = dict(zip(GIFT_FIELDS, record))
+    displays = {
+        attr: f"{g[f'{attr}_name']} {g[f'{attr}_rarity']}%" if g[f'{attr}_name'] is not None else 'N/A'
+        for attr in ('model', 'backdrop', 'pattern')
+    }
+    gift = {
+        'pinned': g['pinned'],
+        'is_upgraded': g['is_upgraded']
+    }
+    if g['is_upgraded']:
+        slug, num = g['slug'], g['num']
+        issued, total = g['availability_issued'], g['availability_total']
+        slug_lower = re.sub(r'\s+', '', slug.lower()) if slug != 'N/A' else ''
+        gift.update({
+            'slug': slug,
+            'title': g['title'],
+            'gift_id': g['gift_id'],
+            'num': num,
+            'fragment_url': f'https://nft.fragment.com/gift/{slug_lower}-{num}.medium.jpg' if slug != 'N/A' and num else None,
+            'fragment_link': f'https://t.me/nft/{slug}' if slug != 'N/A' else None,
+            'total_supply': f"{issued}/{total}" if issued is not None else 'N/A',
+            'availability_issued': issued,
+            'availability_total': total,
+            'model_name': g['model_name'],
+            'backdrop_name': g['backdrop_name'],
+            'pattern_name': g['pattern_name'],
+            'model_display': displays['model'],
+            'backdrop_display': displays['backdrop'],
+            'pattern_display': displays['pattern'],
+            'model_rarity': g['model_rarity'],
+            'backdrop_rarity': g['backdrop_rarity'],
+            'pattern_rarity': g['pattern_rarity'],
+            'price': g['price']
+        })
+    else:
+        gift_id = g['gift_id']
+        gift.update({
+            'slug': g['slug'],
+            'title': g['title'],
+            'gift_id': gift_id,
+            'num': g['num'],
+            'fragment_url': (
+                f'https://cdn.changes.tg/gifts/originals/{gift_id}/Original.png'
+                if gift_id and g['is_unupgradeable'] else None
+            ),
+            'fragment_link': None,
+            'total_supply': g['total_supply'],
+            'model_name': g['model_name'],
+            'backdrop_name': g['backdrop_name'],
+            'pattern_name': g['pattern_name'],
+            'model_display': displays['model'],
+            'backdrop_display': displays['backdrop'],
+            'pattern_display': displays['pattern'],
+            'price': g['price'],
+            'is_unupgradeable': g['is_unupgradeable'],
+            'is_unupgraded': g['is_unupgraded']
+        })
+    if g['price_updated_at'] is not None:
+        gift['price_updated_at'] = g['price_updated_at']
+    return gift
+
+def _compact_gift(gift: Dict[str, Any]):
+    """Compact record for a gift; falls back to {"raw": gift} if it wouldn't round-trip exactly"""
+    record = [gift.get(field) for field in GIFT_FIELDS]
+    if gift.get('is_upgraded'):
+        # Rebuilt from availability_issued / availability_total
+        record[GIFT_FIELDS.index('total_supply')] = None
+    try:
+        if _expand_gift(record) == gift:
+            return record
+    except Exception:
+        pass
+    return {'raw': gift}
+
+def encode_gifts(gifts: List[Dict[str, Any]]) -> Tuple[bytes, List[Any]]:
+    """
+    Encode a gift list for storage
+
+    Returns:
+        (gifts_data payload, compact record per gift)
+    """
+    records = [_compact_gift(gift) for gift in gifts]
+    body = json.dumps(records, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return PAYLOAD_MAGIC + bytes([PAYLOAD_VERSION]) + zlib.compress(body, 6), records
+
+def decode_gifts(gifts_data) -> List[Dict[str, Any]]:
+    """Decode gifts_data in either format (compact payload or legacy JSON text)"""
+    if isinstance(gifts_data, (bytes, bytearray, memoryview)):
+        gifts_data = bytes(gifts_data)
+        if gifts_data.startswith(PAYLOAD_MAGIC):
+            version = gifts_data[len(PAYLOAD_MAGIC)]
+            if version != PAYLOAD_VERSION:
+                raise ValueError(f"Unsupported portfolio payload version: {version}")
+            records = json.loads(zlib.decompress(gifts_data[len(PAYLOAD_MAGIC) + 1:]))
+            return [_expand_gift(record) for record in records]
+        gifts_data = gifts_data.decode('utf-8')
+    return json.loads(gifts_data)
 
 def get_cached_portfolio(user_id: int) -> Optional[Dict[str, Any]]:
     """Get cached portfolio for user"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = _connect()
         cursor = conn.cursor()
-        
+
         cursor.execute("""
             SELECT gifts_data, total_value, cached_at, is_fetching, fetch_started_at
             FROM portfolio_auto_gifts_cache
             WHERE user_id = ?
         """, (user_id,))
-        
+
         row = cursor.fetchone()
         conn.close()
-        
+
         if row:
             return {
-                'gifts': json.loads(row[0]),
+                'gifts': decode_gifts(row[0]),
                 'total_value': row[1],
                 'cached_at': row[2],
                 'is_fetching': bool(row[3]),
@@ -41,35 +204,99 @@ def get_cached_portfolio(user_id: int) -> Optional[Dict[str, Any]]:
         print(f"Error getting cached portfolio: {e}", file=sys.stderr)
         return None
 
+def get_portfolio_totals(user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Totals and status of a cached portfolio, without reading the gift list
+
+    Returns:
+        {'total_value', 'gift_count', 'nft_count', 'cached_at', 'is_fetching', 'fetch_started_at'}
+        (counts are None for rows last written by the Next.js side), or None
+    """
+    try:
+        conn = _connect()
+        row = conn.execute("""
+            SELECT total_value, gift_count, nft_count, cached_at, is_fetching, fetch_started_at
+            FROM portfolio_auto_gifts_cache
+            WHERE user_id = ?
+        """, (user_id,)).fetchone()
+        conn.close()
+
+        if row:
+            return {
+                'total_value': row[0],
+                'gift_count': row[1],
+                'nft_count': row[2],
+                'cached_at': row[3],
+                'is_fetching': bool(row[4]),
+                'fetch_started_at': row[5]
+            }
+        return None
+    except Exception as e:
+        print(f"Error getting portfolio totals: {e}", file=sys.stderr)
+        return None
+
+def get_cached_gifts_page(user_id: int, page: int = 0, page_size: int = 50) -> Optional[List[Dict[str, Any]]]:
+    """
+    One page of the cached gift list (same order as the full list)
+
+    Args:
+        user_id: Telegram user ID
+        page: Zero-based page number
+        page_size: Gifts per page
+
+    Returns:
+        The gifts on that page, or None if nothing is cached
+    """
+    try:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT gift_count FROM portfolio_auto_gifts_cache WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            conn.close()
+            return None
+        if row[0] is None:
+            # Written by the Next.js side - no holdings rows, slice the full list
+            conn.close()
+            gifts = get_cached_portfolio(user_id)['gifts']
+            return gifts[page * page_size:(page + 1) * page_size]
+
+        rows = conn.execute("""
+            SELECT record FROM portfolio_gift_holdings
+            WHERE user_id = ? AND position >= ? AND position < ?
+            ORDER BY position
+        """, (user_id, page * page_size, (page + 1) * page_size)).fetchall()
+        conn.close()
+        return [_expand_gift(json.loads(record)) for (record,) in rows]
+    except Exception as e:
+        print(f"Error getting cached gifts page: {e}", file=sys.stderr)
+        return None
+
 def set_cached_portfolio(user_id: int, gifts: list, total_value: float, is_fetching: bool = False):
     """Save portfolio to cache"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Create table if not exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS portfolio_auto_gifts_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL UNIQUE,
-                gifts_data TEXT NOT NULL,
-                total_value REAL NOT NULL,
-                cached_at REAL NOT NULL,
-                is_fetching INTEGER DEFAULT 0,
-                fetch_started_at INTEGER DEFAULT NULL
-            )
-        """)
-        
-        # Insert or update
+        payload, records = encode_gifts(gifts)
         fetch_started_at = int(time.time() * 1000) if is_fetching else None
-        cursor.execute("""
-            INSERT OR REPLACE INTO portfolio_auto_gifts_cache 
-            (user_id, gifts_data, total_value, cached_at, is_fetching, fetch_started_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, json.dumps(gifts), total_value, int(time.time() * 1000), 
-              1 if is_fetching else 0, fetch_started_at))
-        
-        conn.commit()
+        nft_count = sum(1 for gift in gifts if gift.get('is_upgraded'))
+
+        conn = _connect()
+        with conn:
+            # Insert or update, and replace the holdings rows in the same transaction
+            conn.execute("""
+                INSERT OR REPLACE INTO portfolio_auto_gifts_cache
+                (user_id, gifts_data, total_value, cached_at, is_fetching, fetch_started_at, gift_count, nft_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, sqlite3.Binary(payload), total_value, int(time.time() * 1000),
+                  1 if is_fetching else 0, fetch_started_at, len(gifts), nft_count))
+            conn.execute("DELETE FROM portfolio_gift_holdings WHERE user_id = ?", (user_id,))
+            conn.executemany("""
+                INSERT INTO portfolio_gift_holdings (user_id, position, gift_key, price, price_updated_at, record)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (user_id, position, gift_key(gift), gift.get('price'), gift.get('price_updated_at'),
+                 json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+                for position, (gift, record) in enumerate(zip(gifts, records))
+            ])
         conn.close()
         return True
     except Exception as e:
@@ -113,3 +340,57 @@ def is_fetching(user_id: int) -> bool:
     except Exception:
         return False
 
+
+def gift_key(gift: Dict[str, Any]) -> Optional[str]:
+    """Identity used to diff a portfolio against its cached copy: slug for NFTs, gift id otherwise"""
+    if gift.get('slug'):
+        return gift['slug']
+    if gift.get('gift_id') is not None:
+        return f"id:{gift['gift_id']}"
+    return None
+
+def get_fresh_prices(user_id: int, max_age: float = PRICE_REFRESH_TTL) -> Tuple[Dict[str, Tuple[float, int]], Set[str]]:
+    """
+    Prices from the cached portfolio that are still fresh enough to reuse
+
+    Args:
+        user_id: Telegram user ID
+        max_age: Seconds a gift price stays valid after it was fetched
+
+    Returns:
+        ({gift_key: (price, price_updated_at_ms)} for fresh prices, every gift_key in the cache)
+    """
+    if not user_id:
+        return {}, set()
+
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT gift_count FROM portfolio_auto_gifts_cache WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return {}, set()
+        if row[0] is not None:
+            # Holdings rows carry everything needed - no payload decode
+            holdings = conn.execute("""
+                SELECT gift_key, price, price_updated_at FROM portfolio_gift_holdings WHERE user_id = ?
+            """, (user_id,)).fetchall()
+        else:
+            cached = get_cached_portfolio(user_id)
+            holdings = [
+                (gift_key(gift), gift.get('price'), gift.get('price_updated_at'))
+                for gift in (cached['gifts'] if cached else [])
+            ]
+    finally:
+        conn.close()
+
+    cutoff = int((time.time() - max_age) * 1000)
+    fresh = {}
+    cached_keys = set()
+    for key, price, updated_at in holdings:
+        if key is None:
+            continue
+        cached_keys.add(key)
+        if price is not None and updated_at and updated_at >= cutoff:
+            fresh[key] = (price, updated_at)
+    return fresh, cached_keys
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Static gift catalog (clean_unique_gifts.json), loaded once per process
+The JSON is parsed into compact per-gift records plus lookup indexes and
+reloaded only when the file's mtime/size change. Parsed records are also kept in
+a binary sidecar (marshal), so a fresh process skips the JSON parse as long as
+the catalog hasn't changed since the sidecar was written.
+"""
+import json
+import marshal
+import os
+import sys
+import threading
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+# Quant static export with gift ids, names, supplies and floor prices
+CATALOG_FILE = os.getenv(
+    "GIFT_CATALOG_FILE", '/root/01studio/CollectibleKIT/mrktandquantomapi/quant/clean_unique_gifts.json'
+)
+
+# Pre-parsed copy of the catalog; set to "" to always parse the JSON
+SIDECAR_FILE = os.getenv("GIFT_CATALOG_SIDECAR", '/root/01studio/CollectibleKIT/bot/gift_catalog.idx')
+
+# Bump when the record layout changes; marshal data is also tied to the Python version
+SIDECAR_VERSION = 1
+
+# One record per gift id (all values plain str/int/float)
+CatalogEntry = namedtuple('CatalogEntry', ['name', 'supply', 'floor', 'short_name', 'full_name'])
+
+
+class GiftCatalog:
+    """Parsed catalog with id and name indexes"""
+
+    def __init__(self, entries: Dict[str, CatalogEntry]):
+        """
+        Initialize catalog
+
+        Args:
+            entries: gift id (str) -> CatalogEntry
+        """
+        self.entries = entries
+        # Lower-cased short and full names -> gift id (full names win on clashes)
+        self.name_to_id: Dict[str, str] = {}
+        for gift_id, entry in entries.items():
+            for name in (entry.short_name, entry.full_name):
+                if name:
+                    self.name_to_id[name.lower()] = gift_id
+        self.names: Dict[str, str] = {gift_id: entry.name for gift_id, entry in entries.items()}
+        # Only listed gifts (floor > 0)
+        self.floor_prices: Dict[str, float] = {
+            gift_id: entry.floor for gift_id, entry in entries.items() if entry.floor > 0
+        }
+
+    def get(self, gift_id) -> Optional[CatalogEntry]:
+        """Record for a gift id (int or str), or None"""
+        return self.entries.get(str(gift_id))
+
+    def id_for_name(self, name: str) -> Optional[str]:
+        """Gift id for a short or full gift name (case-insensitive), or None"""
+        return self.name_to_id.get(name.strip().lower()) if name else None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+_EMPTY = GiftCatalog({})
+
+_catalog: Optional[GiftCatalog] = None
+_catalog_stamp: Optional[Tuple[int, int]] = None
+_lock = threading.Lock()
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse(path: str) -> Dict[str, tuple]:
+    """gift id -> record tuple, from the JSON catalog"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    records = {}
+    for item in data:
+        if not item.get('id'):
+            continue
+        gift_id = str(item['id'])
+        short_name = item.get('short_name') or ''
+        full_name = item.get('full_name') or ''
+        name = full_name or short_name or item.get('name') or f"Gift {gift_id}"
+        # Floor can be in 'floor_price' or 'price'
+        floor = _to_float(item['floor_price']) if item.get('floor_price') else _to_float(item.get('price'))
+        records[gift_id] = (name, item.get('supply'), floor, short_name, full_name)
+    return records
+
+
+def _read_sidecar(stamp: Tuple[int, int]) -> Optional[Dict[str, tuple]]:
+    if not SIDECAR_FILE:
+        return None
+    try:
+        with open(SIDECAR_FILE, 'rb') as f:
+            header, records = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if header != (SIDECAR_VERSION, tuple(sys.version_info[:2]), stamp):
+        return None
+    return records
+
+
+def _write_sidecar(stamp: Tuple[int, int], records: Dict[str, tuple]):
+    if not SIDECAR_FILE:
+        return
+    tmp_path = f"{SIDECAR_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            marshal.dump(((SIDECAR_VERSION, tuple(sys.version_info[:2]), stamp), records), f)
+        os.replace(tmp_path, SIDECAR_FILE)
+    except OSError as e:
+        print(f"⚠️ Could not write gift catalog sidecar: {e}", file=sys.stderr)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def get_catalog() -> GiftCatalog:
+    """
+    Get the gift catalog, reloading it if the JSON file changed
+
+    Returns:
+        The current GiftCatalog (empty if the file can't be read and nothing was loaded before)
+    """
+    global _catalog, _catalog_stamp
+    try:
+        st = os.stat(CATALOG_FILE)
+    except OSError as e:
+        if _catalog is None:
+            print(f"⚠️ Gift catalog not available: {e}", file=sys.stderr)
+            _catalog = _EMPTY
+        return _catalog
+    stamp = (st.st_mtime_ns, st.st_size)
+    if _catalog is not None and stamp == _catalog_stamp:
+        return _catalog
+
+    with _lock:
+        if _catalog is not None and stamp == _catalog_stamp:
+            return _catalog
+        records = _read_sidecar(stamp)
+        if records is None:
+            try:
+                records = _parse(CATALOG_FILE)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not load gift catalog: {e}", file=sys.stderr)
+                if _catalog is None:
+                    _catalog = _EMPTY
+                return _catalog
+            _write_sidecar(stamp, records)
+        _catalog = GiftCatalog({gift_id: CatalogEntry._make(record) for gift_id, record in records.items()})
+        _catalog_stamp = stamp
+        return _catalog
+
+
+def get_floor_prices() -> Dict[str, float]:
+    """gift id -> static floor price for every listed gift (shared dict - copy before modifying)"""
+    return get_catalog().floor_prices
+
+
+def get_entry(gift_id) -> Optional[CatalogEntry]:
+    """Catalog record for a gift id, or None"""
+    return get_catalog().get(gift_id)
+
+
+if __name__ == "__main__":
+    catalog = get_catalog()
+    print(json.dumps({
+        "file": CATALOG_FILE,
+        "gifts": len(catalog),
+        "listed": len(catalog.floor_prices)
+    }, indent=2))
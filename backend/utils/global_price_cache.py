@@ -2,19 +2,101 @@
 """
 Global price cache - shared across all users
 Saves API calls when multiple users have same gifts
+
+Two tiers: an in-process LRU in front of the shared SQLite table. Entries are
+fresh for CACHE_TTL and may still be served as stale (while the caller refreshes
+them) until STALE_TTL. "No listing found" results are kept as negative entries
+for NEGATIVE_TTL so missing combos are not re-queried on every portfolio load.
+
+Processes fetching the same prices at once coordinate through a lease table:
+the lease holder fetches a key, everyone else waits for it to land in the cache.
 """
+import asyncio
 import sqlite3
 import json
 import os
+import threading
 import time
-from typing import Optional, Tuple
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.db_paths import SHARED_DB_PATH
 
-# Database path
-DB_PATH = '/root/01studio/CollectibleKIT/bot/bot_data.db'
+# Database path (the shared bot database)
+DB_PATH = SHARED_DB_PATH
 
 # Cache TTL: 10 minutes
 CACHE_TTL = 600  # 10 minutes in seconds
 
+# Stale window: prices up to 1 hour old are served while being refreshed
+STALE_TTL = 3600
+
+# Negative entries ("no listing found") expire quickly so new listings show up
+NEGATIVE_TTL = 120
+
+# Max entries kept in the in-process LRU tier
+MEMORY_CACHE_SIZE = 10000
+
+# Entry states returned by lookup_many()
+FRESH = "fresh"
+STALE = "stale"
+NEGATIVE = "negative"
+
+# Seconds a fetch lease is held before other processes may take the key over
+LEASE_TTL = 30
+
+# Seconds between cache polls while waiting on another process's lease
+LEASE_POLL_INTERVAL = 0.25
+
+# Max keys per IN (...) query (stays under SQLITE_MAX_VARIABLE_NUMBER on old builds)
+QUERY_CHUNK_SIZE = 500
+
+# One connection per process, opened lazily; the table is created once on open
+_conn: Optional[sqlite3.Connection] = None
+_conn_lock = threading.Lock()
+
+# In-process LRU tier: cache_key -> (price or None for negative entries, cached_at)
+_memory: "OrderedDict[str, Tuple[Optional[float], float]]" = OrderedDict()
+
+_metrics = {'memory_hits': 0, 'db_hits': 0, 'stale_hits': 0, 'negative_hits': 0, 'misses': 0}
+
+def _get_connection() -> sqlite3.Connection:
+    """Return the persistent cache connection (caller must hold _conn_lock)"""
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS global_price_cache (
+                cache_key TEXT PRIMARY KEY,
+                price REAL NOT NULL,
+                cached_at INTEGER NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS global_price_cache_misses (
+                cache_key TEXT PRIMARY KEY,
+                cached_at INTEGER NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS price_fetch_leases (
+                cache_key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+        _conn = conn
+    return _conn
+
+def close():
+    """Close the persistent connection (it is reopened on next use)"""
+    global _conn
+    with _conn_lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
 def normalize_attr(attr):
     """Normalize attribute name for consistent caching"""
     if attr is None:
@@ -28,74 +110,327 @@ def get_cache_key(gift_name: str, model: Optional[str], backdrop: Optional[str])
     normalized_backdrop = normalize_attr(backdrop)
     return f"{normalized_gift}|{normalized_model}|{normalized_backdrop}"
 
-def get_cached_price(gift_name: str, model: Optional[str], backdrop: Optional[str]) -> Optional[float]:
-    """Get price from global cache if valid"""
+def _entry_state(price: Optional[float], cached_at: float, now: float) -> Optional[str]:
+    """State of a cached entry at `now`, or None once it has fully expired"""
+    age = now - cached_at
+    if price is None:
+        return NEGATIVE if age < NEGATIVE_TTL else None
+    if age < CACHE_TTL:
+        return FRESH
+    if age < STALE_TTL:
+        return STALE
+    return None
+
+def _remember(cache_key: str, price: Optional[float], cached_at: float):
+    """Store an entry in the LRU tier (caller must hold _conn_lock)"""
+    _memory[cache_key] = (price, cached_at)
+    _memory.move_to_end(cache_key)
+    while len(_memory) > MEMORY_CACHE_SIZE:
+        _memory.popitem(last=False)
+
+def _count(state: str, tier: str):
+    if state == STALE:
+        _metrics['stale_hits'] += 1
+    elif state == NEGATIVE:
+        _metrics['negative_hits'] += 1
+    else:
+        _metrics[f'{tier}_hits'] += 1
+
+def lookup_many(keys: Iterable[Tuple[str, Optional[str], Optional[str]]], record_metrics: bool = True) -> Dict[Tuple[str, Optional[str], Optional[str]], Tuple[Optional[float], str]]:
+    """
+    Look up many (gift_name, model, backdrop) keys in both tiers
+    (record_metrics=False keeps polling lookups out of the hit/miss counters)
+
+    Returns:
+        Dictionary mapping each cached key to (price, state), where state is FRESH,
+        STALE or NEGATIVE (price is None). Keys with no usable entry are left out.
+    """
+    by_cache_key: Dict[str, List[Tuple[str, Optional[str], Optional[str]]]] = {}
+    for key in keys:
+        by_cache_key.setdefault(get_cache_key(*key), []).append(key)
+    if not by_cache_key:
+        return {}
+
+    now = time.time()
+    entries: Dict[str, Tuple[Optional[float], str]] = {}
+    # Stale or negative memory entries: another process may have refreshed them,
+    # so they are only used if the database has nothing newer
+    fallback: Dict[str, Tuple[Optional[float], float]] = {}
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Ensure table exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS global_price_cache (
-                cache_key TEXT PRIMARY KEY,
-                price REAL NOT NULL,
-                cached_at INTEGER NOT NULL
-            )
-        """)
-        
-        cache_key = get_cache_key(gift_name, model, backdrop)
-        cursor.execute("""
-            SELECT price, cached_at FROM global_price_cache WHERE cache_key = ?
-        """, (cache_key,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            price, cached_at = row
-            age = time.time() - cached_at
-            if age < CACHE_TTL:
-                return float(price)
-            # Cache expired
-            return None
-        return None
+        with _conn_lock:
+            pending = []
+            for cache_key in by_cache_key:
+                entry = _memory.get(cache_key)
+                state = _entry_state(*entry, now) if entry else None
+                if state is None:
+                    pending.append(cache_key)
+                    continue
+                _memory.move_to_end(cache_key)
+                if state != FRESH:
+                    fallback[cache_key] = entry
+                    pending.append(cache_key)
+                    continue
+                entries[cache_key] = (entry[0], state)
+                if record_metrics:
+                    _count(state, 'memory')
+
+            if pending:
+                conn = _get_connection()
+                queries = (
+                    ("SELECT cache_key, price, cached_at FROM global_price_cache", now - STALE_TTL),
+                    ("SELECT cache_key, NULL, cached_at FROM global_price_cache_misses", now - NEGATIVE_TTL),
+                )
+                for query, min_cached_at in queries:
+                    for i in range(0, len(pending), QUERY_CHUNK_SIZE):
+                        chunk = [k for k in pending[i:i + QUERY_CHUNK_SIZE] if k not in entries]
+                        if not chunk:
+                            continue
+                        placeholders = ",".join("?" * len(chunk))
+                        rows = conn.execute(
+                            f"{query} WHERE cache_key IN ({placeholders}) AND cached_at > ?",
+                            (*chunk, min_cached_at)
+                        ).fetchall()
+                        for cache_key, price, cached_at in rows:
+                            price = float(price) if price is not None else None
+                            state = _entry_state(price, cached_at, now)
+                            if state is None or cached_at <= fallback.get(cache_key, (None, 0))[1]:
+                                continue
+                            _remember(cache_key, price, cached_at)
+                            entries[cache_key] = (price, state)
+                            if record_metrics:
+                                _count(state, 'db')
+
+            for cache_key, (price, cached_at) in fallback.items():
+                if cache_key not in entries:
+                    state = _entry_state(price, cached_at, now)
+                    entries[cache_key] = (price, state)
+                    if record_metrics:
+                        _count(state, 'memory')
+
+            if record_metrics:
+                _metrics['misses'] += len(by_cache_key) - len(entries)
     except Exception:
-        return None
+        for cache_key, (price, cached_at) in fallback.items():
+            entries.setdefault(cache_key, (price, _entry_state(price, cached_at, now)))
 
-def set_cached_price(gift_name: str, model: Optional[str], backdrop: Optional[str], price: float):
-    """Save price to global cache"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
+    found = {}
+    for cache_key, entry in entries.items():
+        for key in by_cache_key[cache_key]:
+            found[key] = entry
+    return found
+
+def get_many(keys: Iterable[Tuple[str, Optional[str], Optional[str]]], allow_stale: bool = False) -> Dict[Tuple[str, Optional[str], Optional[str]], float]:
+    """
+    Look up many (gift_name, model, backdrop) keys at once
+
+    Returns:
+        Dictionary mapping each requested key that has a fresh cached price (or a
+        stale one, with allow_stale) to that price
+    """
+    allowed = (FRESH, STALE) if allow_stale else (FRESH,)
+    return {key: price for key, (price, state) in lookup_many(keys).items() if state in allowed}
+
+def set_many(items: Iterable[Tuple[str, Optional[str], Optional[str], Optional[float]]]) -> bool:
+    """
+    Save many (gift_name, model, backdrop, price) entries in one transaction
+
+    A price of None records a negative ("no listing found") entry.
+    """
+    cached_at = int(time.time())
+    prices = []
+    misses = []
+    for gift_name, model, backdrop, price in items:
         cache_key = get_cache_key(gift_name, model, backdrop)
-        cached_at = int(time.time())
-        
-        cursor.execute("""
-            INSERT OR REPLACE INTO global_price_cache (cache_key, price, cached_at)
-            VALUES (?, ?, ?)
-        """, (cache_key, price, cached_at))
-        
-        conn.commit()
-        conn.close()
+        if price is None:
+            misses.append((cache_key, cached_at))
+        else:
+            prices.append((cache_key, float(price), cached_at))
+    if not prices and not misses:
+        return True
+    try:
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                if prices:
+                    conn.executemany("""
+                        INSERT OR REPLACE INTO global_price_cache (cache_key, price, cached_at)
+                        VALUES (?, ?, ?)
+                    """, prices)
+                    conn.executemany(
+                        "DELETE FROM global_price_cache_misses WHERE cache_key = ?",
+                        [(cache_key,) for cache_key, _, _ in prices]
+                    )
+                if misses:
+                    conn.executemany("""
+                        INSERT OR REPLACE INTO global_price_cache_misses (cache_key, cached_at)
+                        VALUES (?, ?)
+                    """, misses)
+            for cache_key, price, _ in prices:
+                _remember(cache_key, price, cached_at)
+            for cache_key, _ in misses:
+                _remember(cache_key, None, cached_at)
         return True
     except Exception:
         return False
 
+def acquire_leases(keys: Iterable[Tuple[str, Optional[str], Optional[str]]], owner: str, ttl: float = LEASE_TTL) -> Set[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Take fetch leases on keys no other process is currently fetching
+
+    Returns:
+        The subset of keys now leased to `owner`. On any database error every key
+        is returned, so callers fall back to fetching everything themselves.
+    """
+    keys = list(keys)
+    by_cache_key: Dict[str, List[Tuple[str, Optional[str], Optional[str]]]] = {}
+    for key in keys:
+        by_cache_key.setdefault(get_cache_key(*key), []).append(key)
+    if not by_cache_key:
+        return set()
+
+    now = time.time()
+    try:
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                conn.execute("DELETE FROM price_fetch_leases WHERE expires_at < ?", (now,))
+                conn.executemany("""
+                    INSERT OR IGNORE INTO price_fetch_leases (cache_key, owner, expires_at)
+                    VALUES (?, ?, ?)
+                """, [(cache_key, owner, now + ttl) for cache_key in by_cache_key])
+                held = set()
+                cache_keys = list(by_cache_key)
+                for i in range(0, len(cache_keys), QUERY_CHUNK_SIZE):
+                    chunk = cache_keys[i:i + QUERY_CHUNK_SIZE]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = conn.execute(f"""
+                        SELECT cache_key FROM price_fetch_leases
+                        WHERE cache_key IN ({placeholders}) AND owner = ?
+                    """, (*chunk, owner)).fetchall()
+                    held.update(row[0] for row in rows)
+    except Exception:
+        return set(keys)
+    return {key for cache_key in held for key in by_cache_key[cache_key]}
+
+def release_leases(keys: Iterable[Tuple[str, Optional[str], Optional[str]]], owner: str):
+    """Release fetch leases held by `owner`"""
+    rows = [(get_cache_key(*key), owner) for key in keys]
+    if not rows:
+        return
+    try:
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                conn.executemany("DELETE FROM price_fetch_leases WHERE cache_key = ? AND owner = ?", rows)
+    except Exception:
+        pass
+
+def renew_leases(keys: Iterable[Tuple[str, Optional[str], Optional[str]]], owner: str, ttl: float = LEASE_TTL) -> int:
+    """
+    Push back the expiry of fetch leases `owner` still holds, so a fetch running
+    longer than the TTL keeps its keys
+
+    Returns:
+        Number of leases renewed (0 on a database error)
+    """
+    rows = [(time.time() + ttl, get_cache_key(*key), owner) for key in keys]
+    if not rows:
+        return 0
+    try:
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                before = conn.total_changes
+                conn.executemany("UPDATE price_fetch_leases SET expires_at = ? WHERE cache_key = ? AND owner = ?", rows)
+                return conn.total_changes - before
+    except Exception:
+        return 0
+
+def _leased_elsewhere(cache_keys: List[str], owner: str) -> Set[str]:
+    """Cache keys with a live lease held by another owner"""
+    now = time.time()
+    leased = set()
+    with _conn_lock:
+        conn = _get_connection()
+        for i in range(0, len(cache_keys), QUERY_CHUNK_SIZE):
+            chunk = cache_keys[i:i + QUERY_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(f"""
+                SELECT cache_key FROM price_fetch_leases
+                WHERE cache_key IN ({placeholders}) AND owner != ? AND expires_at >= ?
+            """, (*chunk, owner, now)).fetchall()
+            leased.update(row[0] for row in rows)
+    return leased
+
+async def wait_for_entries(keys: Iterable[Tuple[str, Optional[str], Optional[str]]], owner: str,
+                           timeout: float = LEASE_TTL) -> Tuple[Dict[Tuple[str, Optional[str], Optional[str]], Tuple[Optional[float], str]], List[Tuple[str, Optional[str], Optional[str]]]]:
+    """
+    Wait for keys leased by other processes to be written to the cache
+
+    Returns:
+        (entries, unresolved): fresh or negative entries that showed up, and keys
+        whose lease was released or expired without a result (or timed out) - the
+        caller should fetch those itself.
+    """
+    pending = list(dict.fromkeys(keys))
+    entries = {}
+    unresolved = []
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+        await asyncio.sleep(LEASE_POLL_INTERVAL)
+        found = {k: e for k, e in lookup_many(pending, record_metrics=False).items() if e[1] != STALE}
+        entries.update(found)
+        pending = [k for k in pending if k not in found]
+        if not pending:
+            break
+        try:
+            leased = _leased_elsewhere([get_cache_key(*k) for k in pending], owner)
+        except Exception:
+            break
+        # Lease gone and still no entry: the other process failed, fetch it ourselves
+        unresolved.extend(k for k in pending if get_cache_key(*k) not in leased)
+        pending = [k for k in pending if get_cache_key(*k) in leased]
+    return entries, unresolved + pending
+
+def get_metrics() -> Dict[str, Any]:
+    """Hit/miss/stale counters for this process, with the overall hit ratio"""
+    with _conn_lock:
+        metrics = dict(_metrics)
+        metrics['memory_entries'] = len(_memory)
+    lookups = metrics['memory_hits'] + metrics['db_hits'] + metrics['stale_hits'] + metrics['negative_hits'] + metrics['misses']
+    metrics['hit_ratio'] = round((lookups - metrics['misses']) / lookups, 3) if lookups else 0.0
+    return metrics
+
+def reset_metrics():
+    """Reset the hit/miss counters"""
+    with _conn_lock:
+        for name in _metrics:
+            _metrics[name] = 0
+
+def get_cached_price(gift_name: str, model: Optional[str], backdrop: Optional[str]) -> Optional[float]:
+    """Get price from global cache if valid"""
+    key = (gift_name, model, backdrop)
+    return get_many([key]).get(key)
+
+def set_cached_price(gift_name: str, model: Optional[str], backdrop: Optional[str], price: float):
+    """Save price to global cache"""
+    return set_many([(gift_name, model, backdrop, price)])
+
 def cleanup_expired_cache():
-    """Remove expired cache entries"""
+    """Remove expired cache entries (past the stale window, and expired negative entries)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        expired_before = int(time.time()) - CACHE_TTL
-        cursor.execute("""
-            DELETE FROM global_price_cache WHERE cached_at < ?
-        """, (expired_before,))
-        
-        conn.commit()
-        conn.close()
+        now = int(time.time())
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                conn.execute("""
+                    DELETE FROM global_price_cache WHERE cached_at < ?
+                """, (now - STALE_TTL,))
+                conn.execute("""
+                    DELETE FROM global_price_cache_misses WHERE cached_at < ?
+                """, (now - NEGATIVE_TTL,))
+            for cache_key in [k for k, (price, cached_at) in _memory.items() if _entry_state(price, cached_at, now) is None]:
+                del _memory[cache_key]
         return True
     except Exception:
         return False
-
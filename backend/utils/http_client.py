@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Shared async HTTP client for outbound API calls (TON Center, MRKT, Stickerdom,
+stickers.tools, t.me)
+One pooled aiohttp session per event loop: keep-alive connections, per-host
+connection limits, DNS caching, consistent timeouts, retries with exponential
+backoff for idempotent requests, and per-host latency metrics. Without aiohttp
+the requests are sent through one pooled requests.Session in a worker thread.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# Seconds per request (connect + response) unless the caller passes a timeout
+DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+
+# Pool limits: open connections in total and per host
+CONNECTION_LIMIT = 100
+PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "10"))
+
+# Seconds resolved addresses and idle keep-alive connections are kept
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+
+# Retries for GET/HEAD (other methods are not retried unless the caller asks)
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF = 0.5  # seconds, doubled per attempt, with jitter
+MAX_RETRY_AFTER = 10.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# One session per event loop (a session can't be shared between loops), with a stop
+# future and the task that closes the session once close() sets the future or
+# asyncio.run() cancels the loop's remaining tasks
+_sessions: Dict[asyncio.AbstractEventLoop, Tuple[Any, asyncio.Future, asyncio.Task]] = {}
+
+# Fallback transport when aiohttp is missing
+_requests_session = None
+_requests_lock = threading.Lock()
+
+# host -> counters; latency in ms
+_metrics: Dict[str, Dict[str, float]] = {}
+_metrics_lock = threading.Lock()
+
+
+class HttpResponse:
+    """Fully read response"""
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, url: str):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.url = url
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def text(self, encoding: str = 'utf-8') -> str:
+        return self.body.decode(encoding, errors='replace')
+
+    def json(self) -> Any:
+        """Decoded JSON body (raises ValueError if the body isn't JSON)"""
+        return json.loads(self.body)
+
+
+async def _close_on_shutdown(session, stop: asyncio.Future):
+    try:
+        await stop
+    finally:
+        await session.close()
+
+
+def _get_session():
+    """Pooled aiohttp session for the running loop"""
+    loop = asyncio.get_running_loop()
+    entry = _sessions.get(loop)
+    if entry is None or entry[0].closed:
+        for old_loop in [l for l in _sessions if l.is_closed()]:
+            del _sessions[old_loop]
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=PER_HOST_LIMIT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        stop = loop.create_future()
+        entry = (session, stop, loop.create_task(_close_on_shutdown(session, stop)))
+        _sessions[loop] = entry
+    return entry[0]
+
+
+def _get_requests_session():
+    global _requests_session
+    with _requests_lock:
+        if _requests_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=CONNECTION_LIMIT, pool_maxsize=PER_HOST_LIMIT)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _requests_session = session
+        return _requests_session
+
+
+def _record(host: str, latency: float, ok: bool, retried: bool):
+    with _metrics_lock:
+        m = _metrics.setdefault(host, {'requests': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        m['requests'] += 1
+        m['errors'] += 0 if ok else 1
+        m['retries'] += 1 if retried else 0
+        m['total_ms'] += latency * 1000
+        m['max_ms'] = max(m['max_ms'], latency * 1000)
+
+
+async def _send(method: str, url: str, timeout: float, **kwargs) -> HttpResponse:
+    if AIOHTTP_AVAILABLE:
+        async with _get_session().request(
+            method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+        ) as response:
+            body = await response.read()
+            return HttpResponse(response.status, dict(response.headers), body, str(response.url))
+
+    def send():
+        response = _get_requests_session().request(method, url, timeout=timeout, **kwargs)
+        return HttpResponse(response.status_code, dict(response.headers), response.content, response.url)
+
+    return await asyncio.to_thread(send)
+
+
+def _retry_delay(attempt: int, response: Optional[HttpResponse]) -> float:
+    if response is not None:
+        try:
+            return min(float(response.headers.get('Retry-After')), MAX_RETRY_AFTER)
+        except (TypeError, ValueError):
+            pass
+    return RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
+
+async def request(
+    method: str,
+    url: str,
+    timeout: float = DEFAULT_TIMEOUT,
+    retries: Optional[int] = None,
+    **kwargs
+) -> HttpResponse:
+    """
+    Send a request over the shared connection pool
+
+    Args:
+        method: HTTP method
+        url: Absolute URL
+        timeout: Seconds per attempt
+        retries: Extra attempts on connection errors, timeouts and 429/5xx responses
+            (default: DEFAULT_RETRIES for GET/HEAD, 0 otherwise)
+        **kwargs: params, headers, json or data
+
+    Returns:
+        HttpResponse (any status; the last one if retries ran out)
+
+    Raises:
+        The transport error of the last attempt if no response was received
+    """
+    method = method.upper()
+    if retries is None:
+        retries = DEFAULT_RETRIES if method in ('GET', 'HEAD') else 0
+    host = urlsplit(url).netloc
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await _send(method, url, timeout, **kwargs)
+        except Exception as e:
+            _record(host, time.perf_counter() - started, False, attempt > 0)
+            if attempt >= retries or isinstance(e, asyncio.CancelledError):
+                raise
+        else:
+            ok = response.status not in RETRY_STATUSES
+            _record(host, time.perf_counter() - started, ok, attempt > 0)
+            if ok or attempt >= retries:
+                return response
+        await asyncio.sleep(_retry_delay(attempt, response))
+        attempt += 1
+
+
+async def get(url: str, **kwargs) -> HttpResponse:
+    """GET over the shared pool (see request())"""
+    return await request('GET', url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> HttpResponse:
+    """POST over the shared pool (see request())"""
+    return await request('POST', url, **kwargs)
+
+
+def get_metrics() -> Dict[str, Dict[str, Any]]:
+    """Request, error and retry counts with average/max latency per host"""
+    with _metrics_lock:
+        return {
+            host: {
+                'requests': int(m['requests']),
+                'errors': int(m['errors']),
+                'retries': int(m['retries']),
+                'avg_ms': round(m['total_ms'] / m['requests'], 1) if m['requests'] else 0.0,
+                'max_ms': round(m['max_ms'], 1)
+            }
+            for host, m in _metrics.items()
+        }
+
+
+async def close():
+    """Close the running loop's session now (asyncio.run() also closes it on exit)"""
+    entry = _sessions.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        _, stop, closer = entry
+        # Let the closer close the session (once, even if it hasn't started yet)
+        if not stop.done():
+            stop.set_result(None)
+        await closer
+
+
+if __name__ == "__main__":
+    async def main():
+        response = await get(sys.argv[1] if len(sys.argv) > 1 else "https://toncenter.com/api/v2/getMasterchainInfo")
+        print(response.status, response.text()[:200])
+        await close()
+        print(json.dumps(get_metrics(), indent=2))
+
+    asyncio.run(main())
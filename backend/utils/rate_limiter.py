@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Adaptive token-bucket rate limiter shared across processes
+Bucket state lives in SQLite, so every bot / API / get_profile_gifts.py process
+draws from the same per-account budget. Rates adapt with AIMD: each success adds a
+little, each 429 halves the rate and blocks the account for Retry-After seconds.
+Token takes run in a worker thread and carry the successes observed since the
+previous take, so a request costs one transaction and never blocks the event loop.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    from utils.db_paths import SHARED_DB_PATH
+except ImportError:  # run as a script from utils/
+    from db_paths import SHARED_DB_PATH
+
+# Bucket state lives in the shared bot database (same file as the price caches)
+DB_PATH = SHARED_DB_PATH
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets with AIMD rate adaptation, stored in SQLite"""
+
+    def __init__(
+        self,
+        scope: str,
+        initial_rate: float = 3.0,
+        min_rate: float = 0.5,
+        max_rate: float = 10.0,
+        burst: float = 3.0,
+        increase_step: float = 0.2,
+        decrease_factor: float = 0.5,
+        db_path: str = DB_PATH
+    ):
+        """
+        Initialize limiter
+
+        Args:
+            scope: Prefix for bucket keys (e.g. "portal")
+            initial_rate: Requests per second for a new bucket
+            min_rate: Lowest rate AIMD may back off to
+            max_rate: Highest rate AIMD may grow to
+            burst: Bucket capacity (max requests sent back to back)
+            increase_step: Additive increase, spread over ~one second of successes
+            decrease_factor: Multiplicative decrease applied on a 429
+            db_path: SQLite file holding the shared bucket state
+        """
+        self.scope = scope
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Successes not yet written, applied with the key's next token take
+        self._pending_successes: Dict[Optional[str], int] = {}
+        self._pending_lock = threading.Lock()
+        # Per-process fallback when the shared state can't be reached
+        self._fallback_last: Dict[str, float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                    bucket TEXT PRIMARY KEY,
+                    rate REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0,
+                    last_decrease_at REAL NOT NULL DEFAULT 0,
+                    successes INTEGER NOT NULL DEFAULT 0,
+                    throttles INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _bucket(self, key: Optional[str]) -> str:
+        return f"{self.scope}:{key or 'global'}"
+
+    def _update(self, key: Optional[str], apply) -> Any:
+        """Run `apply(state, now)` on a bucket inside one IMMEDIATE transaction"""
+        bucket = self._bucket(key)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("""
+                    SELECT rate, tokens, updated_at, blocked_until, last_decrease_at, successes, throttles
+                    FROM rate_limit_buckets WHERE bucket = ?
+                """, (bucket,)).fetchone()
+                now = time.time()
+                if row:
+                    state = dict(zip(
+                        ('rate', 'tokens', 'updated_at', 'blocked_until', 'last_decrease_at', 'successes', 'throttles'),
+                        row
+                    ))
+                else:
+                    state = {'rate': self.initial_rate, 'tokens': self.burst, 'updated_at': now,
+                             'blocked_until': 0.0, 'last_decrease_at': 0.0, 'successes': 0, 'throttles': 0}
+                # Refill for the time elapsed since the last update
+                state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated_at']) * state['rate'])
+                state['updated_at'] = now
+
+                result = apply(state, now)
+
+                conn.execute("""
+                    INSERT OR REPLACE INTO rate_limit_buckets
+                        (bucket, rate, tokens, updated_at, blocked_until, last_decrease_at, successes, throttles)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (bucket, state['rate'], state['tokens'], state['updated_at'], state['blocked_until'],
+                      state['last_decrease_at'], state['successes'], state['throttles']))
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _increase(self, state: Dict[str, Any], successes: int):
+        """Additive increase for `successes` successful requests"""
+        for _ in range(successes):
+            state['rate'] = min(self.max_rate, state['rate'] + self.increase_step / state['rate'])
+        state['successes'] += successes
+
+    def _try_take(self, key: Optional[str]) -> float:
+        """Take one token if available; returns 0, or the seconds to wait before retrying"""
+        with self._pending_lock:
+            successes = self._pending_successes.pop(key, 0)
+
+        def apply(state, now):
+            self._increase(state, successes)
+            if now < state['blocked_until']:
+                return state['blocked_until'] - now
+            if state['tokens'] >= 1:
+                state['tokens'] -= 1
+                return 0.0
+            return (1 - state['tokens']) / state['rate']
+        return self._update(key, apply)
+
+    async def acquire(self, key: Optional[str] = None):
+        """Wait until `key` may send one request"""
+        while True:
+            try:
+                wait = await asyncio.to_thread(self._try_take, key)
+            except Exception:
+                # Shared state unavailable - fall back to a fixed per-process interval
+                interval = 1.0 / self.initial_rate
+                wait = self._fallback_last.get(key, 0) + interval - time.time()
+                if wait <= 0:
+                    self._fallback_last[key] = time.time()
+                    return
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def on_success(self, key: Optional[str] = None):
+        """Additive increase after a successful request (written with the key's next acquire)"""
+        with self._pending_lock:
+            self._pending_successes[key] = self._pending_successes.get(key, 0) + 1
+
+    def on_throttle(self, key: Optional[str] = None, retry_after: Optional[float] = None):
+        """Multiplicative decrease after a 429, and block the key for Retry-After seconds
+        Written immediately (429s are rare), so other processes back off at once.
+        """
+        with self._pending_lock:
+            successes = self._pending_successes.pop(key, 0)
+
+        def apply(state, now):
+            self._increase(state, successes)
+            # Several in-flight requests usually fail together; back off once per second
+            if now - state['last_decrease_at'] >= 1.0:
+                state['rate'] = max(self.min_rate, state['rate'] * self.decrease_factor)
+                state['last_decrease_at'] = now
+            state['tokens'] = 0.0
+            pause = retry_after if retry_after is not None else 1.0 / state['rate']
+            state['blocked_until'] = max(state['blocked_until'], now + pause)
+            state['throttles'] += 1
+        try:
+            self._update(key, apply)
+        except Exception:
+            pass
+
+    def get_rates(self) -> Dict[str, Dict[str, Any]]:
+        """Current rate, tokens and throttle counts for every bucket in this scope"""
+        try:
+            with self._lock:
+                rows = self._connect().execute("""
+                    SELECT bucket, rate, tokens, updated_at, blocked_until, successes, throttles
+                    FROM rate_limit_buckets WHERE bucket LIKE ?
+                """, (f"{self.scope}:%",)).fetchall()
+        except Exception:
+            return {}
+        now = time.time()
+        rates = {}
+        for bucket, rate, tokens, updated_at, blocked_until, successes, throttles in rows:
+            rates[bucket.split(":", 1)[1]] = {
+                'rate': round(rate, 3),
+                'tokens': round(min(self.burst, tokens + (now - updated_at) * rate), 2),
+                'blocked_for': round(max(blocked_until - now, 0.0), 2),
+                'successes': successes,
+                'throttles': throttles
+            }
+        return rates
+
+
+if __name__ == "__main__":
+    import sys
+
+    scope = sys.argv[1] if len(sys.argv) > 1 else "portal"
+    print(json.dumps(TokenBucketLimiter(scope).get_rates(), indent=2))
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Shared auth-token vault (MRKT, Quant, Stickerdom, Portal)
+Marketplace credentials (JWTs, Telegram webview initData) are persisted in SQLite
+with their expiry, so every process reuses them instead of doing a webview request
+and an auth POST on each run. Tokens are refreshed in the background once
+REFRESH_AHEAD of their lifetime has passed, and refreshes are serialized across
+processes with a lease: one process logs in, the others wait for its token.
+"""
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+# Credentials get their own file, readable and writable by the owner only
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'token_vault.db')
+FILE_MODE = 0o600
+
+# Fraction of a token's lifetime after which it is refreshed in the background
+REFRESH_AHEAD = 0.8
+
+# Seconds a refresh lease is held (webview + auth round trips) before others take over
+LEASE_TTL = 60
+
+# Seconds between polls while another process is refreshing
+LEASE_POLL_INTERVAL = 0.5
+
+# A stored credential; times are Unix seconds
+TokenEntry = namedtuple('TokenEntry', ['token', 'created_at', 'expires_at'])
+
+# One connection per process, opened lazily
+_conn: Optional[sqlite3.Connection] = None
+_conn_lock = threading.Lock()
+
+# In-process copy of every entry this process has read or written
+_memory: Dict[Tuple[str, str], TokenEntry] = {}
+
+# Refreshes in flight in this process, so concurrent callers share one login
+_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+# Background refreshes, referenced until done so they aren't garbage collected mid-login
+_background: Set[asyncio.Task] = set()
+
+# Lease owner id for this process
+_owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Return the vault connection (caller must hold _conn_lock)"""
+    global _conn
+    if _conn is None:
+        # Create the file 0600 (SQLite gives its journal the same mode), and tighten an existing one
+        os.close(os.open(DB_PATH, os.O_RDWR | os.O_CREAT, FILE_MODE))
+        os.chmod(DB_PATH, FILE_MODE)
+        conn = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS auth_tokens (
+                provider TEXT NOT NULL,
+                account TEXT NOT NULL,
+                token TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (provider, account)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS auth_token_leases (
+                provider TEXT NOT NULL,
+                account TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (provider, account)
+            )
+        """)
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def jwt_expiry(token: str) -> Optional[float]:
+    """The `exp` claim of a JWT (without verifying it), or None if the token isn't a JWT"""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def load(provider: str, account: str = 'default') -> Optional[TokenEntry]:
+    """
+    Get a stored token that hasn't expired yet
+
+    Args:
+        provider: e.g. "mrkt", "quant", "stickerdom", "portal"
+        account: Account the token belongs to (one provider may have several)
+
+    Returns:
+        TokenEntry, or None if there is no valid token
+    """
+    key = (provider, account)
+    now = time.time()
+    entry = _memory.get(key)
+    if entry and entry.expires_at > now:
+        return entry
+    try:
+        with _conn_lock:
+            row = _get_connection().execute("""
+                SELECT token, created_at, expires_at FROM auth_tokens WHERE provider = ? AND account = ?
+            """, key).fetchone()
+    except Exception as e:
+        print(f"⚠️ Token vault read failed: {e}", file=sys.stderr)
+        return None
+    if not row or row[2] <= now:
+        _memory.pop(key, None)
+        return None
+    entry = TokenEntry(*row)
+    _memory[key] = entry
+    return entry
+
+
+def store(provider: str, token: str, ttl: float, account: str = 'default') -> TokenEntry:
+    """
+    Save a freshly obtained token
+
+    Args:
+        provider: Provider name
+        token: The credential
+        ttl: Seconds the token is used for (capped by a JWT's own `exp`)
+        account: Account the token belongs to
+
+    Returns:
+        The stored TokenEntry
+    """
+    now = time.time()
+    expires_at = now + ttl
+    exp = jwt_expiry(token)
+    if exp is not None:
+        expires_at = min(expires_at, exp)
+    entry = TokenEntry(token, now, expires_at)
+    _memory[(provider, account)] = entry
+    try:
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO auth_tokens (provider, account, token, created_at, expires_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (provider, account, token, now, expires_at))
+    except Exception as e:
+        print(f"⚠️ Token vault write failed: {e}", file=sys.stderr)
+    return entry
+
+
+def invalidate(provider: str, account: str = 'default'):
+    """Drop a token the provider rejected (e.g. after a 401)"""
+    _memory.pop((provider, account), None)
+    try:
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                conn.execute("DELETE FROM auth_tokens WHERE provider = ? AND account = ?", (provider, account))
+    except Exception as e:
+        print(f"⚠️ Token vault delete failed: {e}", file=sys.stderr)
+
+
+def _acquire_lease(key: Tuple[str, str]) -> bool:
+    """Take the refresh lease for a token; True if this process holds it (or the DB is unusable)"""
+    now = time.time()
+    try:
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                conn.execute("DELETE FROM auth_token_leases WHERE expires_at < ?", (now,))
+                conn.execute("""
+                    INSERT OR IGNORE INTO auth_token_leases (provider, account, owner, expires_at)
+                    VALUES (?, ?, ?, ?)
+                """, (*key, _owner, now + LEASE_TTL))
+                row = conn.execute(
+                    "SELECT owner FROM auth_token_leases WHERE provider = ? AND account = ?", key
+                ).fetchone()
+        return row is not None and row[0] == _owner
+    except Exception:
+        return True
+
+
+def _release_lease(key: Tuple[str, str]):
+    try:
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                conn.execute(
+                    "DELETE FROM auth_token_leases WHERE provider = ? AND account = ? AND owner = ?", (*key, _owner)
+                )
+    except Exception:
+        pass
+
+
+async def _load_async(key: Tuple[str, str]) -> Optional[TokenEntry]:
+    """load() with the database read in a thread (it may wait up to 10s on another process's lock)"""
+    entry = _memory.get(key)
+    if entry and entry.expires_at > time.time():
+        return entry
+    return await asyncio.to_thread(load, *key)
+
+
+async def _store_async(key: Tuple[str, str], token: Optional[str], ttl: float) -> Optional[TokenEntry]:
+    """store() a new token from a thread, or None if the login returned nothing"""
+    if not token:
+        return None
+    return await asyncio.to_thread(store, key[0], token, ttl, key[1])
+
+
+async def _refresh(key: Tuple[str, str], fetch: Callable[[], Awaitable[Optional[str]]], ttl: float,
+                   seen_created_at: float) -> Optional[TokenEntry]:
+    deadline = time.time() + LEASE_TTL
+    while True:
+        if await asyncio.to_thread(_acquire_lease, key):
+            try:
+                # Another process may have logged in while we waited for the lease
+                _memory.pop(key, None)
+                entry = await _load_async(key)
+                if entry and entry.created_at > seen_created_at:
+                    return entry
+                return await _store_async(key, await fetch(), ttl)
+            finally:
+                await asyncio.to_thread(_release_lease, key)
+        if time.time() >= deadline:
+            # Lease holder is stuck - log in ourselves
+            return await _store_async(key, await fetch(), ttl)
+        await asyncio.sleep(LEASE_POLL_INTERVAL)
+
+
+async def refresh(provider: str, fetch: Callable[[], Awaitable[Optional[str]]], ttl: float,
+                  account: str = 'default', seen_created_at: float = 0.0) -> Optional[TokenEntry]:
+    """
+    Log in again, once across all processes and concurrent callers
+
+    Args:
+        provider: Provider name
+        fetch: Coroutine function doing the actual login; returns the token or None
+        ttl: Seconds a new token is used for
+        account: Account the token belongs to
+        seen_created_at: created_at of the token the caller wants replaced; a token
+            stored after it by another process is returned instead of logging in again
+
+    Returns:
+        The new TokenEntry, or None if the login failed
+    """
+    key = (provider, account)
+    task = _inflight.get(key)
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(_refresh(key, fetch, ttl, seen_created_at))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+    return await asyncio.shield(task)
+
+
+def _refresh_in_background(provider: str, fetch, ttl: float, account: str, seen_created_at: float):
+    key = (provider, account)
+    task = _inflight.get(key)
+    if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+        return
+
+    async def run():
+        try:
+            await refresh(provider, fetch, ttl, account, seen_created_at)
+        except Exception as e:
+            print(f"⚠️ Background {provider} token refresh failed: {e}", file=sys.stderr)
+
+    task = asyncio.ensure_future(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def get_token(provider: str, fetch: Callable[[], Awaitable[Optional[str]]], ttl: float,
+                    account: str = 'default', refresh_ahead: float = REFRESH_AHEAD,
+                    background_refresh: bool = True) -> Optional[str]:
+    """
+    Get a valid token, logging in only when there is none
+
+    Args:
+        provider: Provider name
+        fetch: Coroutine function doing the actual login (webview + auth); returns the token or None
+        ttl: Seconds a new token is used for (capped by a JWT's own `exp`)
+        account: Account the token belongs to
+        refresh_ahead: Fraction of the lifetime after which the token is refreshed in the background
+        background_refresh: False if `fetch` uses something the caller closes before returning
+            (e.g. its own Telegram client); the token is then only renewed once it has expired
+
+    Returns:
+        The token, or None if there is none and the login failed
+    """
+    entry = await _load_async((provider, account))
+    if entry:
+        lifetime = entry.expires_at - entry.created_at
+        if background_refresh and time.time() >= entry.created_at + lifetime * refresh_ahead:
+            _refresh_in_background(provider, fetch, ttl, account, entry.created_at)
+        return entry.token
+    entry = await refresh(provider, fetch, ttl, account)
+    return entry.token if entry else None
+
+
+def get_status() -> Dict[str, Dict[str, Any]]:
+    """Age and remaining lifetime of every stored token (never the tokens themselves)"""
+    try:
+        with _conn_lock:
+            rows = _get_connection().execute(
+                "SELECT provider, account, created_at, expires_at FROM auth_tokens"
+            ).fetchall()
+    except Exception:
+        return {}
+    now = time.time()
+    return {
+        f"{provider}:{account}": {
+            'age': round(now - created_at, 1),
+            'expires_in': round(expires_at - now, 1)
+        }
+        for provider, account, created_at, expires_at in rows
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(get_status(), indent=2))
@@ -16,7 +16,7 @@ export async function GET(request: NextRequest) {
       );
     }
 
-    const cachedData = await db.getAutoGiftsCache(user.id);
+    const cachedData = await db.getAutoGiftsCacheInfo(user.id);
     const isFetching = await db.isPortfolioFetching(user.id);
     const cacheAge = cachedData ? Date.now() - cachedData.cachedAt : Infinity;
 
@@ -301,11 +301,17 @@ export class DailyGameService {
       // Don't add rewards here - let recordGameWin handle it
       // This prevents double crediting
 
-      // Record game completion for task tracking
+      // Record game completion for task tracking (checked, ranked and inserted atomically)
+      let isFirstSolver = false;
       if (userId > 0) {
         const timeSlot = gameType === 'emoji' ? 'morning' : 'afternoon';
-        await db.createDailyGameSolve(userId, today, timeSlot, answer, false);
-        console.log(`📝 Recorded game completion: ${timeSlot} game for user ${userId}`);
+        const solve = await db.solveDailyQuestion(userId, today, timeSlot, answer);
+        if (solve && !solve.alreadySolved) {
+          isFirstSolver = solve.isFirstSolver;
+          console.log(`📝 Recorded game completion: ${timeSlot} game for user ${userId} (solver #${solve.rank})`);
+        } else if (solve) {
+          console.log(`📝 ${timeSlot} game completion already recorded for user ${userId}`);
+        }
       }
 
       // Increment global solve counter
@@ -316,7 +322,7 @@ export class DailyGameService {
       return {
         success: true,
         correct: true,
-        is_first_solver: false, // Random games don't have first solver concept
+        is_first_solver: isFirstSolver, // First to solve today's slot
         reward: 1 // 1 credit per win
       };
 
@@ -1,6 +1,96 @@
 import sqlite3 from 'sqlite3';
 import { promisify } from 'util';
 import path from 'path';
+import zlib from 'zlib';
+
+// Compact portfolio_auto_gifts_cache.gifts_data written by backend/utils/get_portfolio_cache.py:
+// "PGC" + version byte + zlib-compressed JSON list of records (GIFT_FIELDS values, or { raw: gift })
+const PORTFOLIO_PAYLOAD_MAGIC = Buffer.from('PGC');
+const PORTFOLIO_PAYLOAD_VERSION = 1;
+const PORTFOLIO_GIFT_FIELDS = [
+  'slug', 'title', 'gift_id', 'num', 'pinned', 'is_upgraded', 'is_unupgradeable', 'is_unupgraded',
+  'model_name', 'model_rarity', 'backdrop_name', 'backdrop_rarity', 'pattern_name', 'pattern_rarity',
+  'availability_issued', 'availability_total', 'total_supply', 'price', 'price_updated_at'
+];
+
+function expandPortfolioGift(record: any): any {
+  if (!Array.isArray(record)) {
+    return record.raw;
+  }
+  const g: any = {};
+  PORTFOLIO_GIFT_FIELDS.forEach((field, i) => { g[field] = record[i] ?? null; });
+  const display = (attr: string) => g[`${attr}_name`] !== null ? `${g[`${attr}_name`]} ${formatRarity(g[`${attr}_rarity`])}%` : 'N/A';
+  const gift: any = { pinned: g.pinned, is_upgraded: g.is_upgraded };
+  if (g.is_upgraded) {
+    const slug = g.slug;
+    const slugLower = slug !== 'N/A' ? slug.toLowerCase().replace(/\s+/g, '') : '';
+    Object.assign(gift, {
+      slug,
+      title: g.title,
+      gift_id: g.gift_id,
+      num: g.num,
+      fragment_url: slug !== 'N/A' && g.num ? `https://nft.fragment.com/gift/${slugLower}-${g.num}.medium.jpg` : null,
+      fragment_link: slug !== 'N/A' ? `https://t.me/nft/${slug}` : null,
+      total_supply: g.availability_issued !== null ? `${g.availability_issued}/${g.availability_total}` : 'N/A',
+      availability_issued: g.availability_issued,
+      availability_total: g.availability_total,
+      model_name: g.model_name,
+      backdrop_name: g.backdrop_name,
+      pattern_name: g.pattern_name,
+      model_display: display('model'),
+      backdrop_display: display('backdrop'),
+      pattern_display: display('pattern'),
+      model_rarity: g.model_rarity,
+      backdrop_rarity: g.backdrop_rarity,
+      pattern_rarity: g.pattern_rarity,
+      price: g.price
+    });
+  } else {
+    Object.assign(gift, {
+      slug: g.slug,
+      title: g.title,
+      gift_id: g.gift_id,
+      num: g.num,
+      fragment_url: g.gift_id && g.is_unupgradeable ? `https://cdn.changes.tg/gifts/originals/${g.gift_id}/Original.png` : null,
+      fragment_link: null,
+      total_supply: g.total_supply,
+      model_name: g.model_name,
+      backdrop_name: g.backdrop_name,
+      pattern_name: g.pattern_name,
+      model_display: display('model'),
+      backdrop_display: display('backdrop'),
+      pattern_display: display('pattern'),
+      price: g.price,
+      is_unupgradeable: g.is_unupgradeable,
+      is_unupgraded: g.is_unupgraded
+    });
+  }
+  if (g.price_updated_at !== null) {
+    gift.price_updated_at = g.price_updated_at;
+  }
+  return gift;
+}
+
+// Python prints whole floats as "12.0", JS as "12"
+function formatRarity(rarity: number): string {
+  return Number.isInteger(rarity) ? rarity.toFixed(1) : String(rarity);
+}
+
+// Decode gifts_data in either format (compact payload or plain JSON text)
+function decodePortfolioGifts(giftsData: Buffer | string): any[] {
+  if (Buffer.isBuffer(giftsData)) {
+    if (giftsData.subarray(0, PORTFOLIO_PAYLOAD_MAGIC.length).equals(PORTFOLIO_PAYLOAD_MAGIC)) {
+      const version = giftsData[PORTFOLIO_PAYLOAD_MAGIC.length];
+      if (version !== PORTFOLIO_PAYLOAD_VERSION) {
+        throw new Error(`Unsupported portfolio payload version: ${version}`);
+      }
+      const records = JSON.parse(zlib.inflateSync(giftsData.subarray(PORTFOLIO_PAYLOAD_MAGIC.length + 1)).toString('utf8'));
+      return records.map(expandPortfolioGift);
+    }
+    giftsData = giftsData.toString('utf8');
+  }
+  return JSON.parse(giftsData);
+}
 
 // Database interface
 export interface User {
@@ -149,6 +239,8 @@ export interface FeedEvent {
 class DatabaseService {
   private db!: sqlite3.Database;
   private dbPath: string;
+  // Tail of the queue of immediateTransaction() calls on this connection
+  private transactionQueue: Promise<unknown> = Promise.resolve();
 
   constructor() {
     // Use the same database as the bot
@@ -164,6 +256,8 @@ class DatabaseService {
           console.log('✅ Database connected successfully');
         }
       });
+      // Wait for write locks held by the bot instead of failing with SQLITE_BUSY
+      this.db.configure('busyTimeout', 30000);
       this.initDatabase();
     } catch (error) {
       console.error('❌ Database initialization error:', error);
@@ -198,6 +292,26 @@ class DatabaseService {
     });
   }
 
+  // Run `work` in one BEGIN IMMEDIATE transaction. The write lock serializes it against
+  // the bot's processes; the queue keeps concurrent requests on this shared connection
+  // from opening overlapping transactions.
+  private immediateTransaction<T>(work: () => Promise<T>): Promise<T> {
+    const run = async (): Promise<T> => {
+      await this.dbRun('BEGIN IMMEDIATE');
+      try {
+        const result = await work();
+        await this.dbRun('COMMIT');
+        return result;
+      } catch (error) {
+        await this.dbRun('ROLLBACK').catch(() => undefined);
+        throw error;
+      }
+    };
+    const result = this.transactionQueue.then(run, run);
+    this.transactionQueue = result.catch(() => undefined);
+    return result;
+  }
+
   private async initDatabase(): Promise<void> {    
     try {
       // Users table
@@ -912,21 +1026,49 @@ class DatabaseService {
   }
 
   // Daily game methods
-  async createDailyGameSolve(
+  // Check, rank and record a correct answer atomically (same rules as the bot's
+  // BotDatabase.solve_daily_question): one solve per user per slot, one first solver
+  async solveDailyQuestion(
     userId: number,
     date: string,
     timeSlot: string,
-    answer: string,
-    isFirstSolver: boolean = false
-  ): Promise<boolean> {    try {
-      await this.dbRun(
-        'INSERT INTO daily_game_solves (user_id, date, time_slot, answer, is_first_solver, solved_at) VALUES (?, ?, ?, ?, ?, ?)',
-        [userId, date, timeSlot, answer, isFirstSolver, Date.now()]
-      );
-      return true;
+    answer: string
+  ): Promise<{ alreadySolved: boolean; isFirstSolver: boolean; rank: number; totalSolvers: number } | null> {
+    try {
+      return await this.immediateTransaction(async () => {
+        const existing = await this.dbGet(
+          'SELECT id, is_first_solver FROM daily_game_solves WHERE user_id = ? AND date = ? AND time_slot = ?',
+          [userId, date, timeSlot]
+        );
+        const countRow = await this.dbGet(
+          'SELECT COUNT(*) as count FROM daily_game_solves WHERE date = ? AND time_slot = ?',
+          [date, timeSlot]
+        );
+        const solvers: number = countRow?.count || 0;
+
+        if (existing) {
+          const rankRow = await this.dbGet(
+            'SELECT COUNT(*) as count FROM daily_game_solves WHERE date = ? AND time_slot = ? AND id <= ?',
+            [date, timeSlot, existing.id]
+          );
+          return {
+            alreadySolved: true,
+            isFirstSolver: !!existing.is_first_solver,
+            rank: rankRow?.count || 0,
+            totalSolvers: solvers
+          };
+        }
+
+        const isFirstSolver = solvers === 0;
+        await this.dbRun(
+          'INSERT INTO daily_game_solves (user_id, date, time_slot, answer, is_first_solver, solved_at) VALUES (?, ?, ?, ?, ?, ?)',
+          [userId, date, timeSlot, answer, isFirstSolver ? 1 : 0, Date.now()]
+        );
+        return { alreadySolved: false, isFirstSolver, rank: solvers + 1, totalSolvers: solvers + 1 };
+      });
     } catch (error) {
-      console.error('Error creating daily game solve:', error);
-      return false;
+      console.error('Error recording daily game solve:', error);
+      return null;
     }
   }
 
@@ -2014,7 +2156,7 @@ class DatabaseService {
       
       if (row) {
         return {
-          gifts: JSON.parse(row.gifts_data),
+          gifts: decodePortfolioGifts(row.gifts_data),
           totalValue: row.total_value,
           cachedAt: row.cached_at,
           isFetching: row.is_fetching === 1,
@@ -2028,6 +2170,29 @@ class DatabaseService {
     }
   }
 
+  // Status of the cached portfolio without reading the gift list
+  async getAutoGiftsCacheInfo(userId: number): Promise<{ totalValue: number; cachedAt: number; isFetching?: boolean; fetchStartedAt?: number } | null> {
+    try {
+      const row = await this.dbGet(
+        `SELECT total_value, cached_at, is_fetching, fetch_started_at FROM portfolio_auto_gifts_cache WHERE user_id = ?`,
+        [userId]
+      ) as any;
+
+      if (row) {
+        return {
+          totalValue: row.total_value,
+          cachedAt: row.cached_at,
+          isFetching: row.is_fetching === 1,
+          fetchStartedAt: row.fetch_started_at || null
+        };
+      }
+      return null;
+    } catch (error) {
+      console.error('Error getting auto gifts cache info:', error);
+      return null;
+    }
+  }
+
   async setAutoGiftsCache(userId: number, gifts: any[], totalValue: number, isFetching: boolean = false): Promise<boolean> {
     try {
       await this.dbRun(